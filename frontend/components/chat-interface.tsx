@@ -60,14 +60,16 @@ export function ChatInterface({ token, selectedDocuments, onClearChat }: ChatInt
   const fetchChatHistory = async () => {
     setIsLoadingHistory(true)
     try {
-      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/chat/all`, {
+      // Most recent page of messages (newest first; parseChatHistory restores the order)
+      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/chat/all?limit=100&fields=History,SessionId`, {
         headers: {
           Authorization: `Bearer ${token}`,
         },
       })
 
       if (response.ok) {
-        const chatHistory: ChatHistoryItem[] = await response.json()
+        const page = await response.json()
+        const chatHistory: ChatHistoryItem[] = page.items
         const parsedMessages = parseChatHistory(chatHistory)
         setMessages(parsedMessages)
       }
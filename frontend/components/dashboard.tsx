@@ -9,12 +9,14 @@ import { ConfirmationModal } from "@/components/confirmation-modal"
 
 interface Document {
   _id: string
-  user_id: string
+  user_id?: string
   doc_id: string
   file_name: string
   embedding_status: string
 }
 
+const DOCUMENTS_PAGE_SIZE = 50
+
 interface DashboardProps {
   token: string
   onLogout: () => void
@@ -24,22 +26,32 @@ export function Dashboard({ token, onLogout }: DashboardProps) {
   const [documents, setDocuments] = useState<Document[]>([])
   const [selectedDocuments, setSelectedDocuments] = useState<string[]>([])
   const [isLoading, setIsLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
   const [showLogoutConfirm, setShowLogoutConfirm] = useState(false)
   const [showClearChatConfirm, setShowClearChatConfirm] = useState(false)
   const [chatKey, setChatKey] = useState(0) // Key to force chat interface re-render
 
+  const fetchDocumentsPage = async (cursor: string | null) => {
+    // The endpoint is cursor-paginated, newest first
+    const params = new URLSearchParams({ limit: String(DOCUMENTS_PAGE_SIZE) })
+    if (cursor) params.set("cursor", cursor)
+    const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/documents/documents?${params}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    })
+    if (!response.ok) return null
+    return (await response.json()) as { items: Document[]; next_cursor: string | null }
+  }
+
   const fetchDocuments = async () => {
+    // First page only; older documents are loaded on demand
     try {
-      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/documents/documents`, {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
-      })
-
-      if (response.ok) {
-        const docs = await response.json()
-        setDocuments(docs)
-      }
+      const page = await fetchDocumentsPage(null)
+      if (!page) return
+      setDocuments(page.items)
+      setNextCursor(page.next_cursor)
     } catch (error) {
       console.error("Failed to fetch documents:", error)
     } finally {
@@ -47,6 +59,24 @@ export function Dashboard({ token, onLogout }: DashboardProps) {
     }
   }
 
+  const loadMoreDocuments = async () => {
+    if (!nextCursor || isLoadingMore) return
+    setIsLoadingMore(true)
+    try {
+      const page = await fetchDocumentsPage(nextCursor)
+      if (!page) return
+      setDocuments((prev) => {
+        const loaded = new Set(prev.map((doc) => doc.doc_id))
+        return [...prev, ...page.items.filter((doc) => !loaded.has(doc.doc_id))]
+      })
+      setNextCursor(page.next_cursor)
+    } catch (error) {
+      console.error("Failed to load more documents:", error)
+    } finally {
+      setIsLoadingMore(false)
+    }
+  }
+
   const handleDeleteChatHistory = async () => {
     try {
       const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/chat/delete`, {
@@ -137,6 +167,9 @@ export function Dashboard({ token, onLogout }: DashboardProps) {
           onDocumentUpload={fetchDocuments}
           token={token}
           isLoading={isLoading}
+          hasMore={nextCursor !== null}
+          isLoadingMore={isLoadingMore}
+          onLoadMore={loadMoreDocuments}
         />
         <ChatInterface
           key={chatKey} // Force re-render when chat is cleared
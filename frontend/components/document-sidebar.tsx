@@ -13,7 +13,7 @@ import { ConfirmationModal } from "@/components/confirmation-modal" // Import Co
 
 interface Document {
   _id: string
-  user_id: string
+  user_id?: string
   doc_id: string
   file_name: string
   embedding_status: string
@@ -27,6 +27,9 @@ interface DocumentSidebarProps {
   onDocumentUpload: () => void
   token: string
   isLoading: boolean
+  hasMore: boolean
+  isLoadingMore: boolean
+  onLoadMore: () => void
 }
 
 export function DocumentSidebar({
@@ -37,6 +40,9 @@ export function DocumentSidebar({
   onDocumentUpload,
   token,
   isLoading,
+  hasMore,
+  isLoadingMore,
+  onLoadMore,
 }: DocumentSidebarProps) {
   const [isUploadModalOpen, setIsUploadModalOpen] = useState(false)
   const [hoveredDoc, setHoveredDoc] = useState<string | null>(null)
@@ -105,7 +111,7 @@ export function DocumentSidebar({
             variant="secondary"
             className="bg-blue-500/20 text-blue-300 border-blue-500/50 px-3 py-1 font-medium"
           >
-            {documents.length}
+            {hasMore ? `${documents.length}+` : documents.length}
           </Badge>
         </div>
         <Button
@@ -247,6 +253,19 @@ export function DocumentSidebar({
                 </Card>
               )
             })}
+
+            {/* Older documents are loaded a page at a time */}
+            {hasMore && (
+              <Button
+                onClick={onLoadMore}
+                disabled={isLoadingMore}
+                variant="ghost"
+                className="w-full text-slate-400 hover:text-white hover:bg-slate-700/50 transition-colors duration-200"
+              >
+                {isLoadingMore ? <Loader2 className="h-4 w-4 mr-2 animate-spin" /> : null}
+                {isLoadingMore ? "Loading..." : "Load more"}
+              </Button>
+            )}
           </div>
         )}
       </div>
@@ -1,7 +1,14 @@
 # JWT token creation and decoding utilities
+import hashlib
+import time
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 from app.config import settings
+from app.core import metrics
+from app.database.embedding_cache import LRUCache
+
+# Verified payloads by token digest: repeat calls skip the signature check, `exp` is still enforced
+_verified_tokens = LRUCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
 
 # Create a JWT access token for a given user_id
 def create_access_token(user_id: str) -> str:
@@ -14,12 +21,22 @@ def create_access_token(user_id: str) -> str:
 
 # Decode and validate a JWT token
 def decode_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    payload = _verified_tokens.get(key)
+    if payload is not None:
+        if payload.get("exp", 0) <= time.time():
+            raise ValueError("Token expired")
+        metrics.count("token_cache_hits")
+        return payload
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         # Token has expired
         raise ValueError("Token expired")
-    except jwt.InvalidTokenError:
+    except jwt.JWTError:
         # Token is invalid
-        raise ValueError("Invalid token")
\ No newline at end of file
+        raise ValueError("Invalid token")
+    metrics.count("token_cache_misses")
+    if settings.AUTH_TOKEN_CACHE_SIZE > 0:
+        _verified_tokens.set(key, payload)
+    return payload
\ No newline at end of file
@@ -0,0 +1,70 @@
+# Password hashing off the event loop: bcrypt is deliberately slow, so hash/verify run in a
+# bounded executor (threads, or processes for multi-core hosts) behind an admission queue
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from passlib.context import CryptContext
+from app.config import settings
+from app.core import metrics
+from app.core.concurrency import AdmissionController
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if settings.AUTH_HASH_BACKEND == "process":
+                # spawn: never fork a process that already runs client threads
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.AUTH_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                # bcrypt releases the GIL while hashing, so threads use several cores too
+                _executor = ThreadPoolExecutor(max_workers=settings.AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return pwd_context.verify(password, hashed)
+
+
+# One hash per executor worker at a time; bursts wait in the queue (429/503 once it is full)
+password_admission = AdmissionController(
+    max_concurrency=settings.AUTH_HASH_WORKERS,
+    max_queue=settings.AUTH_HASH_MAX_QUEUE,
+    queue_timeout=settings.AUTH_HASH_QUEUE_TIMEOUT
+)
+metrics.registry.register_stats("password_hashing", password_admission.stats)
+
+
+async def _run(stage: str, func, *args):
+    async with password_admission.slot():
+        with metrics.span(stage):
+            return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run("auth.hash", _hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run("auth.verify", _verify, password, hashed)
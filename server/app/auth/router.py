@@ -1,25 +1,29 @@
 # FastAPI router for authentication endpoints (register, login)
 from fastapi import APIRouter, HTTPException
 from app.auth.handler import create_access_token
-from app.database.mongo import MongoDB
-from passlib.context import CryptContext
+from app.auth.passwords import hash_password, verify_password
+from app.database.mongo import AsyncMongoDB
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 @router.post("/register")
 async def register(email: str, password: str):
     # Register a new user if email not already used
-    if MongoDB.find_user(email):
+    if await AsyncMongoDB.find_user(email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    hashed = await hash_password(password)
+    try:
+        user_id = await AsyncMongoDB.insert_user({"email": email, "password": hashed})
+    except DuplicateKeyError:
+        # Concurrent registration with the same email (unique index on users.email)
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed = pwd_context.hash(password)
-    user_id = MongoDB.insert_user({"email": email, "password": hashed})
     return {"access_token": create_access_token(str(user_id))}
 
 @router.post("/login")
 async def login(email: str, password: str):
     # Authenticate user and return JWT if credentials are valid
-    user = MongoDB.find_user(email)
-    if not user or not pwd_context.verify(password, user["password"]):
+    user = await AsyncMongoDB.find_user(email)
+    if not user or not await verify_password(password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     return {"access_token": create_access_token(str(user["_id"]))}
\ No newline at end of file
@@ -1,17 +1,94 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     MONGO_URI: str
     MONGO_DB: str
-    PINECONE_API_KEY: str
-    PINECONE_ENV: str
-    PINECONE_INDEX: str
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    PINECONE_API_KEY: str = ""  # required with the pinecone backend
+    PINECONE_ENV: str = ""
+    PINECONE_INDEX: str = ""
+    VECTOR_STORE_BACKEND: str = "pinecone"  # pinecone | local (memory-mapped index on this host)
+    VECTOR_STORE_PATH: str = "/tmp/studyai_vectors"  # directory used by the local backend
+    VECTOR_STORE_MAX_OPEN_NAMESPACES: int = 256  # local backend: user namespaces kept open per process (LRU)
     GEMINI_API_KEY: str
     GEMINI_MODEL: str = "gemini-2.0-pro" 
     GEMINI_EMBEDDING_MODEL: str = "models/embedding-001"
+    EMBEDDING_CACHE_SIZE: int = 10000  # in-process entries (LRU)
+    EMBEDDING_CACHE_TTL: int = 7 * 24 * 3600  # seconds
+    EMBEDDING_CACHE_BACKEND: str = "memory"  # memory | mongo | disk (shared across workers)
+    EMBEDDING_CACHE_PATH: str = "/tmp/studyai_embeddings.sqlite3"  # used by the disk backend
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # minimum cosine similarity to reuse an answer
+    ANSWER_CACHE_TTL: int = 24 * 3600  # seconds
+    ANSWER_CACHE_MAX_CANDIDATES: int = 200  # most recent answers compared per lookup
+    ANSWER_CACHE_SHARED: bool = True  # reuse answers across users whose documents have identical content
+    SEARCH_TOP_K: int = 10  # chunks returned to the agent per search
+    MULTI_SEARCH_MAX_QUERIES: int = 5  # sub-queries accepted by one search_documents_multi call
+    MULTI_SEARCH_TOP_K: int = 5  # chunks per sub-query
+    CONTEXT_TOKEN_BUDGET: int = 2500  # max tokens of retrieved context per search
+    CONTEXT_CHARS_PER_TOKEN: int = 4  # token estimate used for the budget
+    CONTEXT_MAX_OVERLAP: int = 250  # chars checked for overlap when merging adjacent chunks (>= chunk_overlap)
+    HYBRID_SEARCH_ENABLED: bool = True  # fuse BM25 keyword matches with vector matches
+    HYBRID_CANDIDATES: int = 20  # matches taken from each retriever before fusion
+    HYBRID_RRF_K: int = 60  # reciprocal rank fusion constant
+    LEXICAL_MAX_CANDIDATES: int = 2000  # keyword-matching chunks scored per search
+    MEMORY_WINDOW_TURNS: int = 6  # most recent exchanges sent verbatim
+    MEMORY_TOKEN_BUDGET: int = 2000  # cap on the verbatim window
+    MEMORY_SUMMARY_BATCH: int = 20  # messages folded into the summary per LLM call
+    MEMORY_SUMMARY_MAX_WORDS: int = 250
+    MEMORY_SUMMARY_MAX_LINE_CHARS: int = 2000  # per message, when summarizing
+    MEMORY_SUMMARY_MODEL: Optional[str] = None  # defaults to GEMINI_MODEL
+    INGEST_WORKERS: int = 2  # concurrent ingestion jobs per worker process
+    INGEST_RUN_IN_API: bool = False  # also run an ingestion worker pool inside the API process
+    INGEST_MAX_JOBS_PER_USER: int = 1  # running jobs per user across all workers
+    INGEST_MAX_ATTEMPTS: int = 5
+    INGEST_RETRY_BASE_DELAY: float = 5.0  # seconds, doubled on every attempt
+    INGEST_RETRY_MAX_DELAY: float = 300.0
+    INGEST_LEASE_SECONDS: int = 300  # a running job without a heartbeat this long is requeued
+    INGEST_POLL_INTERVAL: float = 1.0  # seconds between queue polls when idle
+    INGEST_PARSE_PROCESSES: int = 2  # PDF parsing processes per ingestion worker (0 = parse in-thread)
+    INGEST_PAGES_PER_TASK: int = 8  # pages extracted per parse task
+    INGEST_EMBED_BATCH_SIZE: int = 100  # chunks per embedding request
+    INGEST_EMBED_CONCURRENCY: int = 4  # embedding requests in flight (adaptive, halves on 429)
+    INGEST_UPSERT_BATCH_SIZE: int = 100  # vectors per vector store upsert
+    INGEST_UPSERT_CONCURRENCY: int = 4  # upsert requests in flight
+    INGEST_BATCH_MAX_RETRIES: int = 5  # retries of a single failed batch before the job fails
+    INGEST_BATCH_RETRY_DELAY: float = 1.0  # seconds, doubled on every batch retry
+    INGEST_DEDUP_WAIT: float = 10.0  # seconds to wait when identical content is being ingested by another job
+    INGEST_SPOOL_DIR: str  # uploaded PDFs wait here until ingested; must be shared by the API and all workers
+    DOWNLOAD_MAX_BYTES: int = 100 * 1024 * 1024  # larger URL downloads fail the document
+    DOWNLOAD_TIMEOUT: float = 300.0  # seconds for a whole URL download (retried later)
+    DOWNLOAD_CONNECT_TIMEOUT: float = 10.0
+    DOWNLOAD_READ_TIMEOUT: float = 30.0  # seconds without receiving any data
+    DOWNLOAD_MAX_CONNECTIONS: int = 20  # pooled HTTP connections per process
+    DOWNLOAD_MAX_REDIRECTS: int = 5  # redirects followed per download, each checked like the submitted URL
+    DOWNLOAD_ALLOW_PRIVATE_HOSTS: bool = False  # allow hosts resolving to private/loopback addresses (development only)
+    DOWNLOAD_CACHE_TTL: int = 30 * 24 * 3600  # seconds a URL's ETag/Last-Modified are kept for revalidation
+    PAGE_DEFAULT_LIMIT: int = 50  # items per page on listing endpoints
+    PAGE_MAX_LIMIT: int = 200
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
     EXPIRATION_TIME: int = 2  # days
+    AUTH_TOKEN_CACHE_SIZE: int = 10000  # verified tokens kept per worker (0 = verify every call)
+    AUTH_TOKEN_CACHE_TTL: int = 300  # seconds before a cached token is verified again
+    AUTH_HASH_BACKEND: str = "thread"  # thread | process (bcrypt hashing executor)
+    AUTH_HASH_WORKERS: int = 2  # concurrent password hashes per worker
+    AUTH_HASH_MAX_QUEUE: int = 64  # logins/registrations allowed to wait before 429
+    AUTH_HASH_QUEUE_TIMEOUT: float = 10.0  # seconds to wait for a hashing slot before 503
+    CHAT_MAX_CONCURRENCY: int = 8  # agent runs executing at once per worker
+    CHAT_MAX_QUEUE: int = 32  # requests allowed to wait for a slot before 429
+    CHAT_QUEUE_TIMEOUT: float = 30.0  # seconds to wait for a slot before 503
+    APP_HOST: str = "0.0.0.0"  # python -m app.serve
+    APP_PORT: int = 8000
+    APP_WORKERS: Optional[int] = None  # API worker processes (defaults to the CPU count)
+    STARTUP_WARMUP: bool = True  # create clients and build the agent before serving
+    STARTUP_WARMUP_EMBEDDING: bool = True  # also send one embedding request (opens the API connection)
+    READY_CHECK_TIMEOUT: float = 2.0  # seconds for the MongoDB ping of GET /ready
+    METRICS_ENABLED: bool = True  # serve GET /metrics (Prometheus text format) and time every request
+    METRICS_MULTIPROCESS_DIR: Optional[str] = None  # snapshots shared by the API workers (set by python -m app.serve)
+    METRICS_SNAPSHOT_INTERVAL: float = 5.0  # seconds between a worker's snapshots in multiprocess mode
 
     class Config:
         env_file = ".env"
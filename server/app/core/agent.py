@@ -1,59 +1,24 @@
 # Agent creation logic for conversational AI with document search and MongoDB-backed memory
+import logging
+import threading
+import time
+from langchain_core.callbacks import AsyncCallbackHandler
 from langchain.agents import AgentExecutor, Tool, create_tool_calling_agent
+from langchain_core.tools import StructuredTool
 from langchain_google_genai import ChatGoogleGenerativeAI
-from app.core.tools import search_documents
+from functools import partial
+from pydantic import BaseModel, Field
+from app.core.tools import search_documents, search_documents_multi
 from app.config import settings
 from langchain.chains.conversation.memory import ConversationBufferMemory
-from langchain_mongodb.chat_message_histories import MongoDBChatMessageHistory
+from app.core.memory import WindowedChatHistory
+from app.core import metrics
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 
+logger = logging.getLogger(__name__)
 
-def create_agent(user_id=None, doc_ids=None):
-    # Initialize the language model (LLM)
-    model = ChatGoogleGenerativeAI(
-        model=settings.GEMINI_MODEL,
-        google_api_key=settings.GEMINI_API_KEY,
-        temperature=0.3
-    )
-
-    # Tool wrapper to inject user_id and doc_ids into search
-    def search_documents_user(query: str):
-        inputs = {"query": query, "user_id": user_id}
-        # If doc_ids are provided, the agent MUST search these specific documents
-        if doc_ids:
-            inputs["doc_ids"] = doc_ids
-        return search_documents.invoke(inputs)
-
-    # Define tools available to the agent
-    tools = [
-        Tool(
-            name="search_documents",
-            func=search_documents_user,
-            description="Retrieve relevant document chunks based on user query. Use strategic search terms and consider multiple search angles for complex questions."
-        )
-    ]
-
-    llm_with_tools = model.bind_tools(tools)
-
-    # Set up MongoDB-backed conversation memory
-    message_history = MongoDBChatMessageHistory(
-        connection_string=settings.MONGO_URI,
-        session_id=str(user_id),
-        database_name=settings.MONGO_DB,
-        collection_name="chat_histories"
-    )
-
-    memory = ConversationBufferMemory(
-        chat_memory=message_history,
-        memory_key="chat_history",
-        return_messages=True
-    )
-
-    # Prompt template for agent reasoning and response formatting
-    prompt = ChatPromptTemplate.from_messages([
-        (
-            "system",
-            f"""You are an advanced AI research assistant with sophisticated reasoning capabilities. Your goal is to provide the most accurate, helpful, and comprehensive responses possible through intelligent tool usage and multi-step reasoning.
+# System prompt for agent reasoning and response formatting
+SYSTEM_PROMPT = """You are an advanced AI research assistant with sophisticated reasoning capabilities. Your goal is to provide the most accurate, helpful, and comprehensive responses possible through intelligent tool usage and multi-step reasoning.
 
             **IMPORTANT:** If `doc_ids` are provided, you MUST search these specific documents. Do not answer from general knowledge or other sources unless you have searched these documents first.
 
@@ -72,11 +37,12 @@ def create_agent(user_id=None, doc_ids=None):
                 - For analysis requiring evidence → Use search_documents  
                 - For creative/general knowledge tasks → Consider if documents add value
             - **Multiple search approach:** For complex queries, consider different search terms or angles
+            - **Several searches at once:** When a question needs more than one search, use `search_documents_multi` with all sub-queries in a single call instead of calling `search_documents` repeatedly
 
             3. **INTELLIGENT SEARCH TECHNIQUES:**
             - Use targeted, specific search terms rather than the entire user query
-            - For multi-part questions, break down into focused searches
-            - If initial search yields poor results, try alternative search terms
+            - For multi-part questions, break down into focused sub-queries and send them together via `search_documents_multi`
+            - If initial search yields poor results, try alternative search terms (several phrasings can go into one `search_documents_multi` call)
             - Consider synonyms, related concepts, or different phrasings
 
             4. **RESPONSE SYNTHESIS:**
@@ -111,22 +77,176 @@ def create_agent(user_id=None, doc_ids=None):
 
             Remember: You're not just retrieving information - you're intelligently reasoning about what information to find, how to find it, and how to present it most helpfully to the user.
             """
-        ),
-        ("placeholder", "{chat_history}"),
-        ("human", "{input}"),
-        MessagesPlaceholder("agent_scratchpad")
-    ])
-
-    # Build and return the agent executor
-    agent = create_tool_calling_agent(llm_with_tools, tools, prompt=prompt)
-    agent_executor = AgentExecutor(
-        agent=agent, 
-        tools=tools, 
-        memory=memory, 
-        verbose=True, 
-        return_intermediate_steps=True,
-        max_iterations=3,  # Allow multiple reasoning steps
-        early_stopping_method="generate"  # Continue until a good answer is found
-    )
-
-    return agent_executor
\ No newline at end of file
+
+
+# Shared search tool bound to one request's scope (user_id and doc_ids). AgentExecutor
+# runs tools without the run config, so the scope cannot travel through `configurable`.
+async def search_documents_scoped(query: str, scope: dict):
+    inputs = {"query": query, "user_id": scope.get("user_id")}
+    # If doc_ids are provided, the agent MUST search these specific documents
+    if scope.get("doc_ids"):
+        inputs["doc_ids"] = scope["doc_ids"]
+    return await search_documents.ainvoke(inputs)
+
+
+# Fan-out variant: several sub-queries answered by one tool step
+class MultiSearchInput(BaseModel):
+    queries: list[str] = Field(description="Focused sub-queries, searched together")
+
+
+async def search_documents_multi_scoped(queries: list[str], scope: dict):
+    inputs = {"queries": queries, "user_id": scope.get("user_id")}
+    if scope.get("doc_ids"):
+        inputs["doc_ids"] = scope["doc_ids"]
+    return await search_documents_multi.ainvoke(inputs)
+
+
+class AgentMetricsCallback(AsyncCallbackHandler):
+    """Times every LLM call (one per agent iteration) and tool run, and counts tokens."""
+
+    def __init__(self):
+        self._runs = {}  # run_id -> (stage, start)
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._runs[run_id] = ("agent.llm", time.perf_counter())
+
+    async def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._runs.pop(run_id, None)
+        if started:
+            metrics.observe(started[0], time.perf_counter() - started[1])
+        metrics.count("llm_calls")
+        for generation in (response.generations[0] if response.generations else []):
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            metrics.count("llm_input_tokens", usage.get("input_tokens", 0))
+            metrics.count("llm_output_tokens", usage.get("output_tokens", 0))
+
+    async def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._runs[run_id] = (f"agent.tool.{(serialized or {}).get('name', 'unknown')}", time.perf_counter())
+
+    async def on_tool_end(self, output, *, run_id, **kwargs):
+        started = self._runs.pop(run_id, None)
+        if started:
+            metrics.observe(started[0], time.perf_counter() - started[1])
+        metrics.count("tool_calls")
+
+    async def on_llm_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
+
+    async def on_tool_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
+
+
+agent_metrics = AgentMetricsCallback()
+
+
+class AgentFactory:
+    """
+    Process-wide agent factory. The model, tool definitions and prompt are built once;
+    each request only binds its session memory and search scope.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agent = None
+        self._tools = None
+        self.build_seconds = 0.0
+        self.requests = 0
+        self.bind_seconds_total = 0.0
+
+    def _build(self):
+        # Initialize the language model (LLM)
+        start = time.perf_counter()
+        model = ChatGoogleGenerativeAI(
+            model=settings.GEMINI_MODEL,
+            google_api_key=settings.GEMINI_API_KEY,
+            temperature=0.3
+        )
+
+        # Define tools available to the agent
+        tools = [
+            Tool(
+                name="search_documents",
+                func=None,
+                coroutine=search_documents_scoped,
+                description="Retrieve relevant document chunks based on user query. Use strategic search terms and consider multiple search angles for complex questions."
+            ),
+            StructuredTool(
+                coroutine=search_documents_multi_scoped,
+                args_schema=MultiSearchInput,
+                name="search_documents_multi",
+                description="Retrieve relevant document chunks for several focused sub-queries (2-5) in one step. Prefer this over repeated search_documents calls for multi-part questions or when trying alternative phrasings; results are grouped by sub-query without duplicates."
+            )
+        ]
+
+        llm_with_tools = model.bind_tools(tools)
+
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", SYSTEM_PROMPT),
+            ("placeholder", "{chat_history}"),
+            ("human", "{input}"),
+            MessagesPlaceholder("agent_scratchpad")
+        ])
+
+        self._agent = create_tool_calling_agent(llm_with_tools, tools, prompt=prompt)
+        self._tools = tools
+        self.build_seconds = time.perf_counter() - start
+        logger.info("Agent components built in %.1f ms (paid once per process)", self.build_seconds * 1000)
+
+    def history(self, user_id) -> WindowedChatHistory:
+        # MongoDB-backed conversation history: recent window plus rolling summary
+        return WindowedChatHistory(session_id=str(user_id))
+
+    def warm(self):
+        # Build the shared components now (startup) instead of on the first request
+        if self._agent is None:
+            with self._lock:
+                if self._agent is None:
+                    self._build()
+
+    def create(self, user_id=None, doc_ids=None):
+        self.warm()
+
+        start = time.perf_counter()
+
+        memory = ConversationBufferMemory(
+            chat_memory=self.history(user_id),
+            memory_key="chat_history",
+            return_messages=True
+        )
+
+        # Per-request copies of the tools, bound to this request's search scope
+        scope = {"user_id": user_id, "doc_ids": doc_ids}
+        tools = [t.model_copy(update={"coroutine": partial(t.coroutine, scope=scope)}) for t in self._tools]
+
+        agent_executor = AgentExecutor(
+            agent=self._agent,
+            tools=tools,
+            memory=memory,
+            verbose=False,  # structured timings instead: app.core.metrics
+            return_intermediate_steps=True,
+            max_iterations=3,  # Allow multiple reasoning steps
+            early_stopping_method="generate"  # Continue until a good answer is found
+        )
+
+        self.requests += 1
+        self.bind_seconds_total += time.perf_counter() - start
+        # Runtime callbacks are inherited by the nested LLM and tool runs
+        return agent_executor.with_config(callbacks=[agent_metrics])
+
+    def stats(self) -> dict:
+        # Per-request setup saved = one-time build cost minus the remaining per-request bind cost
+        avg_bind = self.bind_seconds_total / self.requests if self.requests else 0.0
+        return {
+            "requests": self.requests,
+            "build_ms": round(self.build_seconds * 1000, 3),
+            "avg_bind_ms": round(avg_bind * 1000, 3),
+            "saved_ms_per_request": round(max(self.build_seconds - avg_bind, 0.0) * 1000, 3)
+        }
+
+
+agent_factory = AgentFactory()
+
+
+def create_agent(user_id=None, doc_ids=None):
+    # Bind a ready-to-run agent executor for one request
+    return agent_factory.create(user_id=user_id, doc_ids=doc_ids)
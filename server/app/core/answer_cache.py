@@ -0,0 +1,123 @@
+# Semantic answer cache: reuse answers to near-identical questions over the same document set.
+# Answers are keyed per user and, in a shared tier, on the content hashes of the searched
+# documents, so users who uploaded the same files also share answers. Only answers generated
+# without any earlier conversation are shared: the prompt holds no other user's chat history.
+from datetime import datetime, timezone
+from typing import List, Optional
+import numpy as np
+from app.config import settings
+from app.database.mongo import AsyncMongoDB, db
+
+
+class AnswerCache:
+    # Indexes (TTL on created_at, user_id/scope and content lookups) are created at startup by AsyncMongoDB.ensure_indexes
+    def __init__(self, collection, threshold: float, max_candidates: int, shared: bool = True):
+        self.collection = collection
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _scope(doc_ids: Optional[List[str]]) -> str:
+        # Questions over "all my documents" and over a specific selection never share answers
+        return "all" if not doc_ids else ",".join(sorted(doc_ids))
+
+    @staticmethod
+    async def _content_hashes(user_id: str, doc_ids: Optional[List[str]]) -> Optional[List[str]]:
+        # Sorted content hashes of the searched documents; None when the scope cannot be shared
+        # (no documents, or legacy documents without a content hash)
+        scope = await AsyncMongoDB.get_search_scope(user_id, doc_ids)
+        if not scope or any(not d.get("content_hash") for d in scope):
+            return None
+        return sorted({d["content_hash"] for d in scope})
+
+    async def _best_match(self, user_id: str, doc_ids: Optional[List[str]], vector: List[float]):
+        query = {"user_id": user_id, "scope": self._scope(doc_ids)}
+        if self.shared:
+            content_hashes = await self._content_hashes(user_id, doc_ids)
+            if content_hashes:
+                query = {"$or": [query, {"content_key": ",".join(content_hashes)}]}
+        candidates = await self.collection.find(
+            query, {"user_id": 1, "vector": 1, "answer": 1, "tool_calls": 1}
+        ).sort("created_at", -1).limit(self.max_candidates).to_list(length=None)
+        if not candidates:
+            return None
+
+        # Cosine similarity of the query against every candidate in one shot
+        matrix = np.asarray([c["vector"] for c in candidates], dtype=np.float32)
+        query = np.asarray(vector, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        scores = matrix @ query / np.where(norms == 0, 1.0, norms)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        hit = candidates[best]
+        return {
+            "answer": hit["answer"],
+            "tool_calls": hit.get("tool_calls", []),
+            "similarity": float(scores[best]),
+            "shared": hit.get("user_id") != user_id
+        }
+
+    async def lookup(self, user_id: str, doc_ids: Optional[List[str]], vector: List[float]) -> Optional[dict]:
+        hit = await self._best_match(user_id, doc_ids, vector)
+        if hit:
+            self.hits += 1
+            self.shared_hits += hit.pop("shared")
+        else:
+            self.misses += 1
+        return hit
+
+    async def store(self, user_id: str, doc_ids: Optional[List[str]], query: str,
+                    vector: List[float], answer: str, tool_calls: list, shareable: bool = False):
+        # shareable: the answer was generated with an empty chat history
+        content_hashes = await self._content_hashes(user_id, doc_ids) if self.shared and shareable else None
+        await self.collection.insert_one({
+            "user_id": user_id,
+            "scope": self._scope(doc_ids),
+            "doc_ids": sorted(doc_ids) if doc_ids else [],
+            "content_key": ",".join(content_hashes) if content_hashes else None,
+            "content_hashes": content_hashes or [],
+            "query": query,
+            "vector": vector,
+            "answer": answer,
+            "tool_calls": tool_calls,
+            "created_at": datetime.now(timezone.utc)
+        })
+
+    async def invalidate_document(self, user_id: str, doc_id: str, content_hash: Optional[str] = None) -> int:
+        # Drop answers that referenced this document, plus every "all documents" answer
+        # for the user since that scope's content has changed. With a content hash (the content
+        # was just embedded), shared answers of any user over that content go as well.
+        query = {"user_id": user_id, "$or": [{"doc_ids": doc_id}, {"scope": "all"}]}
+        if content_hash:
+            query = {"$or": [query, {"content_hashes": content_hash}]}
+        result = await self.collection.delete_many(query)
+        return result.deleted_count
+
+    async def invalidate_user(self, user_id: str) -> int:
+        # Drop every cached answer of a user (all of their documents were deleted)
+        result = await self.collection.delete_many({"user_id": user_id})
+        return result.deleted_count
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.ANSWER_CACHE_ENABLED,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+answer_cache = AnswerCache(
+    db.answer_cache,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    max_candidates=settings.ANSWER_CACHE_MAX_CANDIDATES,
+    shared=settings.ANSWER_CACHE_SHARED
+)
@@ -0,0 +1,61 @@
+# Admission control for expensive request paths: bounded concurrency with a wait queue
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from app.config import settings
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        # Reject straight away (429) when every slot is busy and the queue is full
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests in progress, please retry shortly",
+                headers={"Retry-After": "1"}
+            )
+
+        # Wait in the queue for a free slot, giving up (503) after the timeout
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is overloaded, please retry later",
+                headers={"Retry-After": str(int(self.queue_timeout))}
+            )
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue
+        }
+
+
+# Shared limiter for agent-backed chat requests
+chat_admission = AdmissionController(
+    max_concurrency=settings.CHAT_MAX_CONCURRENCY,
+    max_queue=settings.CHAT_MAX_QUEUE,
+    queue_timeout=settings.CHAT_QUEUE_TIMEOUT
+)
@@ -0,0 +1,143 @@
+# Content-addressed PDF store: chunk vectors are keyed by the file's SHA-256 and stored once per
+# user namespace, shared by all of that user's documents with identical content
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from pymongo import ReturnDocument
+from app.config import settings
+from app.database.mongo import db
+
+
+def sha256_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_blob_id(user_id: str, content_hash: str) -> str:
+    return f"{user_id}:{content_hash}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ContentStore:
+    """
+    One record per (user, content hash) in `content_blobs`:
+    status pending -> ingesting -> complete (or failed), `refs` lists the user's documents using it.
+    Records written before per-user namespaces are keyed by the bare hash, with "user:doc" refs;
+    the namespace migration converts them.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def acquire(self, user_id: str, content_hash: str, namespace: str, doc_id: str) -> dict:
+        # Idempotently add a reference (retries never double count); creates the record if new
+        now = _now()
+        return await self.collection.find_one_and_update(
+            {"_id": content_blob_id(user_id, content_hash)},
+            {
+                "$addToSet": {"refs": doc_id},
+                "$setOnInsert": {
+                    "user_id": user_id,
+                    "content_hash": content_hash,
+                    "namespace": namespace,
+                    "status": "pending",
+                    "chunk_count": None,
+                    "created_at": now
+                },
+                "$set": {"updated_at": now}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def find_complete(self, content_hash: str) -> Optional[dict]:
+        # Any namespace that already holds the vectors of this content (to copy instead of re-embedding)
+        return await self.collection.find_one({"content_hash": content_hash, "status": "complete"})
+
+    async def is_referenced(self, content_hash: str) -> bool:
+        # Whether any user still holds this content (pre-namespace records are keyed by the hash)
+        return await self.collection.find_one(
+            {"$or": [{"content_hash": content_hash}, {"_id": content_hash}]}, {"_id": 1}
+        ) is not None
+
+    async def claim_ingestion(self, blob_id: str, job_id: str) -> bool:
+        # Only one job embeds a given content; a stale claim (expired lease) can be taken over
+        now = _now()
+        result = await self.collection.update_one(
+            {
+                "_id": blob_id,
+                "$or": [
+                    {"status": {"$in": ["pending", "failed"]}},
+                    {"status": "ingesting", "ingesting_job": job_id},
+                    {"status": "ingesting", "lease_until": {"$lt": now}}
+                ]
+            },
+            {"$set": {
+                "status": "ingesting",
+                "ingesting_job": job_id,
+                "lease_until": now + timedelta(seconds=settings.INGEST_LEASE_SECONDS),
+                "updated_at": now
+            }}
+        )
+        return result.modified_count > 0
+
+    async def extend_claim(self, blob_id: str, job_id: str):
+        # Heartbeat of the job holding the claim; no-op once the claim is released
+        now = _now()
+        await self.collection.update_one(
+            {"_id": blob_id, "status": "ingesting", "ingesting_job": job_id},
+            {"$set": {"lease_until": now + timedelta(seconds=settings.INGEST_LEASE_SECONDS), "updated_at": now}}
+        )
+
+    async def mark_complete(self, blob_id: str, chunk_count: int, page_count: int):
+        await self.collection.update_one(
+            {"_id": blob_id},
+            {
+                "$set": {"status": "complete", "chunk_count": chunk_count, "page_count": page_count, "updated_at": _now()},
+                "$unset": {"ingesting_job": "", "lease_until": ""}
+            }
+        )
+
+    async def mark_failed(self, blob_id: str):
+        await self.collection.update_one(
+            {"_id": blob_id, "status": "ingesting"},
+            {"$set": {"status": "failed", "updated_at": _now()}, "$unset": {"ingesting_job": "", "lease_until": ""}}
+        )
+
+    async def release(self, blob_id: str, ref: str) -> Optional[dict]:
+        """
+        Drop a reference. When it was the last one, the record is marked `deleting` and
+        returned so the caller can remove the vectors, then call `finish_purge`.
+        """
+        await self.collection.update_one({"_id": blob_id}, {"$pull": {"refs": ref}})
+        return await self.collection.find_one_and_update(
+            {"_id": blob_id, "refs": {"$size": 0}, "status": {"$ne": "deleting"}},
+            {"$set": {"status": "deleting", "updated_at": _now()}}
+        )
+
+    async def exists(self, blob_id: str) -> bool:
+        return await self.collection.find_one({"_id": blob_id}, {"_id": 1}) is not None
+
+    async def finish_purge(self, blob_id: str):
+        result = await self.collection.delete_one({"_id": blob_id, "refs": {"$size": 0}})
+        if result.deleted_count == 0:
+            # Re-referenced while its vectors were being removed: it must be ingested again
+            await self.collection.update_one(
+                {"_id": blob_id, "status": "deleting"},
+                {"$set": {"status": "pending", "chunk_count": None, "updated_at": _now()}}
+            )
+
+    async def drop_user(self, user_id: str) -> List[str]:
+        # Remove all of a user's records (their namespace is dropped as a whole); returns the hashes
+        hashes = await self.collection.distinct("content_hash", {"user_id": user_id})
+        await self.collection.delete_many({"user_id": user_id})
+        return hashes
+
+
+content_store = ContentStore(db.content_blobs)
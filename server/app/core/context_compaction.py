@@ -0,0 +1,138 @@
+# Compaction of retrieved chunks before they reach the LLM: drops repeated text, merges
+# neighbouring chunks of the same document, enforces a token budget and tags each block with
+# a short source reference
+import hashlib
+import math
+import re
+import threading
+from typing import Dict, List, Optional
+from app.config import settings
+
+MIN_OVERLAP = 20
+
+
+def estimate_tokens(text: str) -> int:
+    # Cheap estimate (no local tokenizer for Gemini); only used for budgeting and reporting
+    return math.ceil(len(text) / settings.CONTEXT_CHARS_PER_TOKEN)
+
+
+def chunk_position(chunk: dict):
+    # (source, index) for content-addressed IDs "<hash>#<i>"; legacy random IDs have no position
+    source, _, index = chunk["id"].rpartition("#")
+    if source and index.isdigit():
+        return source, int(index)
+    return chunk["metadata"].get("doc_id") or chunk["id"], None
+
+
+def merge_overlap(first: str, second: str, max_overlap: int) -> str:
+    # Chunks are split with overlap: drop the longest prefix of `second` that ends `first`
+    # (short matches are coincidences, not overlap)
+    for size in range(min(len(first), len(second), max_overlap), MIN_OVERLAP - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + "\n" + second
+
+
+class ContextCompactor:
+    """Turns ranked chunks into compact, source-tagged context blocks within a token budget."""
+
+    def __init__(self, token_budget: int, max_overlap: int):
+        self.token_budget = token_budget
+        self.max_overlap = max_overlap
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.raw_tokens = 0
+        self.compact_tokens = 0
+
+    def compact(self, chunks: List[dict], sources: Dict[str, str], token_budget: Optional[int] = None) -> tuple:
+        """
+        chunks: ranked best first, each {"id", "text", "metadata"}; sources maps content hash or
+        doc_id to a file name. Returns (context string, report dict).
+        """
+        budget = token_budget or self.token_budget
+        raw = sum(estimate_tokens(c["text"]) for c in chunks)
+
+        # Drop exact repeats (same text under another ID)
+        unique, seen = [], set()
+        for chunk in chunks:
+            digest = hashlib.sha1(re.sub(r"\s+", " ", chunk["text"]).strip().encode("utf-8")).digest()
+            if digest not in seen:
+                seen.add(digest)
+                unique.append(chunk)
+
+        # Merge runs of consecutive chunks of the same source; a block ranks like its best chunk
+        blocks = {}
+        for rank, chunk in enumerate(unique):
+            source, index = chunk_position(chunk)
+            blocks.setdefault(source, []).append((index if index is not None else math.inf, rank, chunk))
+        merged = []
+        for source, items in blocks.items():
+            items.sort(key=lambda item: (item[0], item[1]))
+            run = None
+            for index, rank, chunk in items:
+                page = chunk["metadata"].get("page")
+                if run and index != math.inf and index == run["last"] + 1:
+                    run["text"] = merge_overlap(run["text"], chunk["text"], self.max_overlap)
+                    run["last"] = index
+                    run["rank"] = min(run["rank"], rank)
+                    if page is not None:
+                        run["pages"].add(page)
+                    continue
+                run = {"source": source, "text": chunk["text"], "last": index, "rank": rank,
+                       "pages": {page} if page is not None else set()}
+                merged.append(run)
+        merged.sort(key=lambda block: block["rank"])
+
+        # Fill the budget in rank order; the last block that does not fit is truncated
+        parts, used, tag_numbers = [], 0, {}
+        for block in merged:
+            number = tag_numbers.setdefault(block["source"], len(tag_numbers) + 1)
+            tag = f"[S{number}: {sources.get(block['source'], 'document')}{self._pages(block['pages'])}]"
+            cost = estimate_tokens(tag) + estimate_tokens(block["text"])
+            remaining = budget - used
+            if cost > remaining:
+                keep = (remaining - estimate_tokens(tag)) * settings.CONTEXT_CHARS_PER_TOKEN
+                if keep >= 200:
+                    parts.append(f"{tag}\n{block['text'][:keep].rstrip()} ...")
+                    used = budget
+                break
+            parts.append(f"{tag}\n{block['text']}")
+            used += cost
+
+        context = "\n\n".join(parts)
+        compacted = estimate_tokens(context)
+        with self._lock:
+            self.queries += 1
+            self.raw_tokens += raw
+            self.compact_tokens += compacted
+        return context, {"chunks": len(chunks), "blocks": len(parts), "tokens": compacted, "tokens_saved": max(raw - compacted, 0)}
+
+    @staticmethod
+    def _pages(pages: set) -> str:
+        if not pages:
+            return ""
+        low, high = min(pages), max(pages)
+        return f" p.{low}" if low == high else f" p.{low}-{high}"
+
+    def stats(self) -> dict:
+        saved = max(self.raw_tokens - self.compact_tokens, 0)
+        return {
+            "queries": self.queries,
+            "token_budget": self.token_budget,
+            "raw_tokens": self.raw_tokens,
+            "compact_tokens": self.compact_tokens,
+            "tokens_saved": saved,
+            "avg_tokens_saved_per_query": round(saved / self.queries, 1) if self.queries else 0.0
+        }
+
+
+def source_names(scope: list) -> Dict[str, str]:
+    # Source key (content hash, or doc_id for legacy documents) -> file name for tags
+    names = {}
+    for doc in scope:
+        key = doc.get("content_hash") or doc["doc_id"]
+        names.setdefault(key, doc.get("file_name") or "document")
+    return names
+
+
+context_compactor = ContextCompactor(settings.CONTEXT_TOKEN_BUDGET, max_overlap=settings.CONTEXT_MAX_OVERLAP)
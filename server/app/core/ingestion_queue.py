@@ -0,0 +1,186 @@
+# Durable MongoDB-backed ingestion job queue with leases, retries and per-user fairness
+import random
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from pymongo import ReturnDocument
+from app.config import settings
+from app.database.mongo import db
+
+
+class PermanentIngestionError(Exception):
+    """Raised for failures that retrying cannot fix (corrupt PDF, 4xx download, ...)."""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class IngestionQueue:
+    # Indexes on (status, next_run_at), (user_id, status) and doc_id are created at startup
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def enqueue(self, user_id: str, doc_id: str, file_name: str, source: dict) -> str:
+        # source is {"type": "file", "name": <file in the spool directory>, "content_hash": ...} or {"type": "url", "url": ...}
+        now = _now()
+        result = await self.collection.insert_one({
+            "user_id": user_id,
+            "doc_id": doc_id,
+            "file_name": file_name,
+            "source": source,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": settings.INGEST_MAX_ATTEMPTS,
+            "next_run_at": now,
+            "progress": {"pages_parsed": 0, "chunks_total": 0, "chunks_embedded": 0, "vectors_upserted": 0},
+            "created_at": now,
+            "updated_at": now
+        })
+        return str(result.inserted_id)
+
+    async def claim(self, worker_id: str) -> Optional[dict]:
+        # Fairness: serve users with the fewest running jobs first, skipping users at their cap
+        now = _now()
+        ready = {"status": "queued", "next_run_at": {"$lte": now}}
+        users = await self.collection.distinct("user_id", ready)
+        if not users:
+            return None
+
+        running = {}
+        async for row in self.collection.aggregate([
+            {"$match": {"status": "running"}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+        ]):
+            running[row["_id"]] = row["count"]
+
+        random.shuffle(users)  # break ties so no user is always first
+        for user_id in sorted(users, key=lambda u: running.get(u, 0)):
+            if running.get(user_id, 0) >= settings.INGEST_MAX_JOBS_PER_USER:
+                continue
+            job = await self.collection.find_one_and_update(
+                {**ready, "user_id": user_id},
+                {
+                    "$set": {
+                        "status": "running",
+                        "worker_id": worker_id,
+                        "lease_until": now + timedelta(seconds=settings.INGEST_LEASE_SECONDS),
+                        "updated_at": now
+                    },
+                    "$inc": {"attempts": 1}
+                },
+                sort=[("next_run_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if job:
+                return job
+        return None
+
+    @staticmethod
+    def _owned(job: dict) -> dict:
+        # Only the worker holding a job may update it: once its lease expired and the reaper
+        # requeued or failed the job, late writes from the old worker match nothing
+        return {"_id": job["_id"], "status": "running", "worker_id": job["worker_id"]}
+
+    async def update_progress(self, job: dict, fields: Optional[dict] = None) -> bool:
+        # Record stage progress and extend the lease; without fields this is the plain heartbeat.
+        # Returns False when the job is no longer held by this worker.
+        now = _now()
+        update = {f"progress.{k}": v for k, v in (fields or {}).items()}
+        update.update({
+            "lease_until": now + timedelta(seconds=settings.INGEST_LEASE_SECONDS),
+            "updated_at": now
+        })
+        result = await self.collection.update_one(self._owned(job), {"$set": update})
+        return result.matched_count > 0
+
+    async def complete(self, job: dict, metrics: Optional[dict] = None) -> bool:
+        result = await self.collection.update_one(
+            self._owned(job),
+            {
+                "$set": {"status": "complete", "metrics": metrics or {}, "updated_at": _now()},
+                "$unset": {"lease_until": "", "error": ""}
+            }
+        )
+        return result.matched_count > 0
+
+    async def fail(self, job: dict, error: str, permanent: bool = False) -> bool:
+        # Reschedule with exponential backoff; returns True when the job will be retried.
+        # A job this worker no longer holds is left alone and reported as retried, so the
+        # caller keeps its input file and does not fail the document.
+        now = _now()
+        if not permanent and job["attempts"] < job["max_attempts"]:
+            delay = min(
+                settings.INGEST_RETRY_BASE_DELAY * 2 ** (job["attempts"] - 1),
+                settings.INGEST_RETRY_MAX_DELAY
+            )
+            await self.collection.update_one(
+                self._owned(job),
+                {
+                    "$set": {
+                        "status": "queued",
+                        "error": error,
+                        "next_run_at": now + timedelta(seconds=delay),
+                        "updated_at": now
+                    },
+                    "$unset": {"lease_until": "", "worker_id": ""}
+                }
+            )
+            return True
+        result = await self.collection.update_one(
+            self._owned(job),
+            {"$set": {"status": "failed", "error": error, "updated_at": now}, "$unset": {"lease_until": ""}}
+        )
+        return result.matched_count == 0
+
+    async def defer(self, job: dict, seconds: float):
+        # Put a job back without consuming an attempt (e.g. waiting on another job's work)
+        now = _now()
+        await self.collection.update_one(
+            self._owned(job),
+            {
+                "$set": {"status": "queued", "next_run_at": now + timedelta(seconds=seconds), "updated_at": now},
+                "$inc": {"attempts": -1},
+                "$unset": {"lease_until": "", "worker_id": ""}
+            }
+        )
+
+    async def requeue_expired(self) -> Tuple[int, List[dict]]:
+        # Jobs whose worker died (lease expired) go back to the queue, unless that was their last
+        # attempt: those fail, so a job that keeps killing its worker is not retried forever.
+        # Returns the number of requeued jobs and the failed jobs.
+        now = _now()
+        requeued, failed = 0, []
+        expired = {"status": "running", "lease_until": {"$lt": now}}
+        for job in await self.collection.find(expired).to_list(length=None):
+            if job["attempts"] >= job["max_attempts"]:
+                job["error"] = f"Lease expired on attempt {job['attempts']} of {job['max_attempts']}"
+                update = {"$set": {"status": "failed", "error": job["error"], "updated_at": now}}
+            else:
+                update = {"$set": {"status": "queued", "next_run_at": now, "updated_at": now}}
+            update["$unset"] = {"lease_until": "", "worker_id": ""}
+            # Re-checked per job: a heartbeat may have renewed the lease in the meantime
+            result = await self.collection.update_one({**expired, "_id": job["_id"]}, update)
+            if not result.modified_count:
+                continue
+            if update["$set"]["status"] == "failed":
+                failed.append(job)
+            else:
+                requeued += 1
+        return requeued, failed
+
+    async def cancel(self, user_id: str, doc_id: Optional[str] = None):
+        # Drop pending work for a deleted document (all of the user's documents without doc_id)
+        query = {"user_id": user_id, "status": "queued"}
+        if doc_id is not None:
+            query["doc_id"] = doc_id
+        await self.collection.update_many(query, {"$set": {"status": "cancelled", "updated_at": _now()}})
+
+    async def latest(self, user_id: str, doc_id: str) -> Optional[dict]:
+        # Most recent job for a document
+        return await self.collection.find_one(
+            {"user_id": user_id, "doc_id": doc_id},
+            sort=[("created_at", -1)]
+        )
+
+
+ingestion_queue = IngestionQueue(db.ingestion_jobs)
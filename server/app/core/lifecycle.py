@@ -0,0 +1,78 @@
+# Process lifecycle: measured startup (indexes, client creation, optional warmup), readiness
+# state for GET /ready and orderly shutdown of the clients this process created
+import asyncio
+import logging
+import os
+import time
+from app.config import settings
+from app.core import metrics
+from app.core.spool import check_spool_dir
+from app.database import lazy
+from app.database.mongo import AsyncMongoDB, close_clients, db
+from app.database.pinecone_utils import embeddings, vector_store
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    def __init__(self):
+        self.ready = False
+        self.startup_seconds = None
+        self.steps = {}  # startup step -> ms, or the error it failed with
+
+    async def _step(self, name: str, func, *args, required: bool = False):
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+            if asyncio.iscoroutine(result):
+                await result
+            self.steps[name] = round((time.perf_counter() - start) * 1000, 2)
+        except Exception as e:
+            if required:
+                raise
+            # A client that fails to warm up is created again on first use
+            self.steps[name] = f"failed: {e}"
+            logger.warning("Warmup step %s failed: %s", name, e)
+
+    async def startup(self):
+        start = time.perf_counter()
+        # Make sure all MongoDB indexes exist before serving traffic
+        await self._step("mongo_indexes", AsyncMongoDB.ensure_indexes, required=True)
+        # Uploads are handed to the ingestion workers through the shared spool directory
+        await self._step("spool_dir", check_spool_dir, required=True)
+        if settings.STARTUP_WARMUP:
+            from app.core.agent import agent_factory
+            await self._step("vector_store", asyncio.to_thread, vector_store.resolve)
+            await self._step("embeddings", asyncio.to_thread, embeddings.resolve)
+            if settings.STARTUP_WARMUP_EMBEDDING:
+                # Opens the connection to the embedding API (TLS, auth) before the first query
+                await self._step("embedding_request", embeddings.aembed_documents, ["warmup"])
+            await self._step("agent", asyncio.to_thread, agent_factory.warm)
+        self.startup_seconds = time.perf_counter() - start
+        self.ready = True
+        logger.info("Worker %d ready in %.2fs %s", os.getpid(), self.startup_seconds, self.steps)
+
+    async def shutdown(self):
+        self.ready = False
+        close_clients()
+
+    async def check(self) -> dict:
+        # Readiness: startup finished and MongoDB answers (everything else degrades per request)
+        checks = {"startup": "ok" if self.ready else "pending"}
+        try:
+            await asyncio.wait_for(db.command("ping"), timeout=settings.READY_CHECK_TIMEOUT)
+            checks["mongo"] = "ok"
+        except Exception as e:
+            checks["mongo"] = f"failed: {str(e) or type(e).__name__}"
+        return checks
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "startup_seconds": round(self.startup_seconds, 3) if self.startup_seconds is not None else None,
+            **lazy.init_stats()
+        }
+
+
+lifecycle = Lifecycle()
+metrics.registry.register_stats("app", lifecycle.stats)
@@ -0,0 +1,214 @@
+# Bounded chat memory: the newest turns verbatim plus a rolling summary of everything older,
+# folded in incrementally in the background
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, messages_from_dict
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_mongodb.chat_message_histories import MongoDBChatMessageHistory
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.core.context_compaction import estimate_tokens
+from app.core import metrics
+from app.database.mongo import client, db, sync_db
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """Progressively summarize the conversation between a user and a document research assistant.
+Extend the current summary with the new lines and return only the new summary.
+Keep facts, decisions, names, document references and user preferences that later questions may rely on.
+Stay under {max_words} words.
+
+Current summary:
+{summary}
+
+New lines:
+{lines}
+
+New summary:"""
+
+
+class WindowedChatHistory(MongoDBChatMessageHistory):
+    """
+    Same storage as MongoDBChatMessageHistory (one document per message in `chat_histories`),
+    but reads only the newest messages not yet covered by the session's summary in
+    `chat_summaries`, trimmed to MEMORY_TOKEN_BUDGET and preceded by the summary itself.
+    """
+
+    def __init__(self, session_id: str):
+        super().__init__(
+            connection_string=None,
+            client=client,
+            session_id=session_id,
+            database_name=settings.MONGO_DB,
+            collection_name="chat_histories",
+            create_index=False  # indexes are managed once, not per request
+        )
+        self.max_messages = settings.MEMORY_WINDOW_TURNS * 2
+
+    def _window_query(self, summary: Optional[dict]) -> dict:
+        query = {self.session_id_key: self.session_id}
+        if summary and summary.get("covered_until"):
+            query["_id"] = {"$gt": summary["covered_until"]}
+        return query
+
+    def _assemble(self, summary: Optional[dict], docs: List[dict]) -> tuple:
+        # docs: newest first, one more than the window so a backlog can be detected.
+        # Returns (messages, fold_before): fold_before is the _id of the oldest message kept when
+        # older unsummarized messages were left out (window or token budget), else None
+        backlog = len(docs) > self.max_messages
+        docs = list(reversed(docs[:self.max_messages]))
+        window = len(docs)
+        messages = messages_from_dict([json.loads(d[self.history_key]) for d in docs])
+
+        # Drop the oldest turns beyond the token budget (the last exchange is always kept)
+        used = sum(estimate_tokens(str(m.content)) for m in messages)
+        while len(messages) > 2 and used > settings.MEMORY_TOKEN_BUDGET:
+            used -= estimate_tokens(str(messages.pop(0).content))
+            docs.pop(0)
+        # Start the window on a user turn
+        while messages and not isinstance(messages[0], HumanMessage):
+            messages.pop(0)
+            docs.pop(0)
+        fold_before = docs[0]["_id"] if docs and (backlog or len(docs) < window) else None
+
+        if summary and summary.get("summary"):
+            messages.insert(0, SystemMessage(content=f"Summary of the earlier conversation:\n{summary['summary']}"))
+        return messages, fold_before
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        summary = sync_db.chat_summaries.find_one({"_id": self.session_id})
+        docs = list(
+            self.collection.find(self._window_query(summary)).sort("_id", -1).limit(self.max_messages + 1)
+        )
+        return self._assemble(summary, docs)[0]
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        with metrics.span("memory.load"):
+            summary = await db.chat_summaries.find_one({"_id": self.session_id})
+            docs = await db.chat_histories.find(self._window_query(summary)).sort("_id", -1).limit(
+                self.max_messages + 1
+            ).to_list(length=None)
+            messages, fold_before = self._assemble(summary, docs)
+        if fold_before is not None:
+            # Turns have aged out of the window or the token budget: fold them into the summary
+            # off the request path
+            memory_summarizer.schedule(self.session_id, fold_before)
+        return messages
+
+    async def aadd_messages(self, messages: List[BaseMessage]):
+        with metrics.span("memory.save"):
+            await super().aadd_messages(messages)
+
+
+class MemorySummarizer:
+    """
+    Folds messages older than the window, or older than the oldest message the token budget
+    kept, into `chat_summaries`, at most one task per session.
+    """
+
+    def __init__(self, keep_messages: int, batch_size: int):
+        self.keep_messages = keep_messages
+        self.batch_size = batch_size
+        self._model = None
+        self._tasks = {}
+        self._fold_before = {}  # session -> _id of the oldest message the last read kept
+        self.runs = 0
+        self.messages_folded = 0
+        self.failures = 0
+
+    def schedule(self, session_id: str, fold_before=None):
+        if fold_before is not None:
+            self._fold_before[session_id] = max(fold_before, self._fold_before.get(session_id, fold_before))
+        task = self._tasks.get(session_id)
+        if task is None or task.done():
+            self._tasks[session_id] = asyncio.create_task(self._run(session_id))
+
+    def _get_model(self):
+        if self._model is None:
+            self._model = ChatGoogleGenerativeAI(
+                model=settings.MEMORY_SUMMARY_MODEL or settings.GEMINI_MODEL,
+                google_api_key=settings.GEMINI_API_KEY,
+                temperature=0
+            )
+        return self._model
+
+    async def _run(self, session_id: str):
+        metrics.detach_request()  # started from a request, but not part of it
+        self.runs += 1
+        try:
+            while await self._fold_once(session_id):
+                pass
+        except Exception:
+            self.failures += 1
+            logger.exception("Chat summary update failed for session %s", session_id)
+        finally:
+            self._tasks.pop(session_id, None)
+            self._fold_before.pop(session_id, None)
+
+    async def _fold_once(self, session_id: str) -> bool:
+        # Fold the oldest batch of messages that are outside the verbatim window or that the
+        # token budget left out of it
+        summary = await db.chat_summaries.find_one({"_id": session_id}) or {}
+        query = {"SessionId": session_id}
+        if summary.get("covered_until"):
+            query["_id"] = {"$gt": summary["covered_until"]}
+        foldable = await db.chat_histories.count_documents(query) - self.keep_messages
+        fold_before = self._fold_before.get(session_id)
+        if fold_before is not None:
+            trimmed = {"SessionId": session_id, "_id": {**query.get("_id", {}), "$lt": fold_before}}
+            foldable = max(foldable, await db.chat_histories.count_documents(trimmed))
+        if foldable <= 0:
+            return False
+
+        batch = min(foldable, self.batch_size)
+        docs = await db.chat_histories.find(query).sort("_id", 1).limit(batch).to_list(length=None)
+        lines = []
+        for message in messages_from_dict([json.loads(d["History"]) for d in docs]):
+            speaker = "User" if isinstance(message, HumanMessage) else "Assistant"
+            lines.append(f"{speaker}: {str(message.content)[:settings.MEMORY_SUMMARY_MAX_LINE_CHARS]}")
+        with metrics.span("memory.summarize"):
+            response = await self._get_model().ainvoke(SUMMARY_PROMPT.format(
+                max_words=settings.MEMORY_SUMMARY_MAX_WORDS,
+                summary=summary.get("summary") or "(none)",
+                lines="\n".join(lines)
+            ))
+
+        # Optimistic update: another worker may have folded the same messages meanwhile
+        try:
+            result = await db.chat_summaries.update_one(
+                {"_id": session_id, "covered_until": summary.get("covered_until")},
+                {
+                    "$set": {
+                        "summary": str(response.content).strip(),
+                        "covered_until": docs[-1]["_id"],
+                        "updated_at": datetime.now(timezone.utc)
+                    },
+                    "$inc": {"messages": len(docs)}
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        if result.modified_count == 0 and result.upserted_id is None:
+            return False
+        self.messages_folded += len(docs)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "window_messages": self.keep_messages,
+            "running": sum(1 for t in self._tasks.values() if not t.done()),
+            "runs": self.runs,
+            "messages_folded": self.messages_folded,
+            "failures": self.failures
+        }
+
+
+memory_summarizer = MemorySummarizer(
+    keep_messages=settings.MEMORY_WINDOW_TURNS * 2,
+    batch_size=settings.MEMORY_SUMMARY_BATCH
+)
@@ -0,0 +1,355 @@
+# In-process metrics: stage timings, counters and component stats in the Prometheus text
+# format (GET /metrics), plus optional per-request breakdowns collected through a context
+# variable (the `timings` field of chat responses). Values are per process unless the workers
+# share a snapshot directory (multiprocess mode, see Registry.enable_multiprocess).
+import glob
+import json
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+PREFIX = "studyai"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    @staticmethod
+    def merge(total: dict, snapshot: list):
+        for key, value in snapshot:
+            total[tuple(key)] = total.get(tuple(key), 0) + value
+
+    def render(self, values: Optional[dict] = None) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        if values is None:
+            values = dict((tuple(k), v) for k, v in self.snapshot())
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(dict(zip(self.labelnames, key)))} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._series: Dict[tuple, list] = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(key), list(series)] for key, series in self._series.items()]
+
+    @staticmethod
+    def merge(total: dict, snapshot: list):
+        for key, series in snapshot:
+            current = total.get(tuple(key))
+            total[tuple(key)] = series if current is None else [a + b for a, b in zip(current, series)]
+
+    def render(self, values: Optional[dict] = None) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        if values is None:
+            values = dict((tuple(k), s) for k, s in self.snapshot())
+        for key, series in sorted(values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': _number(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(labels)} {series[-1]}")
+        return lines
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._stats: Dict[str, Callable[[], dict]] = {}
+        self.multiprocess_dir: Optional[str] = None
+        self._writer: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, component: str, stats: Callable[[], dict]):
+        # Numeric fields of a component's stats() are exported as gauges at scrape time
+        self._stats[component] = stats
+
+    def _gauges(self) -> Dict[str, float]:
+        gauges = {}
+        for component, stats in self._stats.items():
+            try:
+                values = stats()
+            except Exception:
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    gauges[_metric_name(f"{PREFIX}_{component}_{key}")] = value
+        return gauges
+
+    # --- multiprocess mode ---
+
+    def enable_multiprocess(self, directory: str, interval: float = 5.0):
+        """
+        Share metrics between the worker processes of one server: every worker writes a snapshot
+        to `directory` every `interval` seconds (and when it serves /metrics), and /metrics in
+        any worker sums the counters and histograms of all of them, including workers that have
+        exited. Component stats are exported per live worker, labelled by pid.
+        """
+        self.multiprocess_dir = directory
+        os.makedirs(directory, exist_ok=True)
+        self._stop.clear()
+        self._writer = threading.Thread(target=self._write_loop, args=(interval,), name="metrics-snapshot", daemon=True)
+        self._writer.start()
+
+    def close(self):
+        # Final snapshot so an exiting worker's counts stay in the totals
+        if self.multiprocess_dir:
+            self._stop.set()
+            self.write_snapshot()
+
+    def _write_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.write_snapshot()
+            except Exception:
+                pass
+
+    def write_snapshot(self):
+        pid = os.getpid()
+        path = os.path.join(self.multiprocess_dir, f"metrics-{pid}.json")
+        data = {"pid": pid, "metrics": {m.name: m.snapshot() for m in self._metrics}, "gauges": self._gauges()}
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _render_multiprocess(self) -> list:
+        self.write_snapshot()
+        totals = {m.name: {} for m in self._metrics}
+        gauges: Dict[str, Dict[int, float]] = {}
+        for path in glob.glob(os.path.join(self.multiprocess_dir, "metrics-*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for metric in self._metrics:
+                metric.merge(totals[metric.name], data["metrics"].get(metric.name, []))
+            if _alive(data["pid"]):
+                for name, value in data["gauges"].items():
+                    gauges.setdefault(name, {})[data["pid"]] = value
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(totals[metric.name]))
+        for name, values in gauges.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f"{name}{_labels({'pid': pid})} {_number(value)}" for pid, value in sorted(values.items()))
+        return lines
+
+    def render(self) -> str:
+        if self.multiprocess_dir:
+            return "\n".join(self._render_multiprocess()) + "\n"
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, value in self._gauges().items():
+            lines.extend([f"# TYPE {name} gauge", f"{name} {_number(value)}"])
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+STAGE_SECONDS = registry.histogram("stage_seconds", "Time spent per processing stage", ["stage"])
+EVENTS = registry.counter("events_total", "Counted events (LLM calls, tokens, chunks retrieved)", ["event"])
+HTTP_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+
+
+class RequestTimings:
+    """Spans (aggregated by stage name) and counters of one request; safe to fill from threads."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: Dict[str, list] = {}  # stage -> [count, seconds]
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, stage: str, seconds: float):
+        with self._lock:
+            span = self.spans.setdefault(stage, [0, 0.0])
+            span[0] += 1
+            span[1] += seconds
+
+    def add(self, name: str, value: float):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+                "spans": {s: {"count": c, "ms": round(t * 1000, 2)} for s, (c, t) in self.spans.items()},
+                "counters": dict(self.counters)
+            }
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def track_request(timings: Optional[RequestTimings] = None):
+    # Collect spans and counters of everything awaited (or run via asyncio.to_thread) inside
+    timings = timings or RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def attach_request() -> RequestTimings:
+    # Like track_request, for the rest of the current context (e.g. a streamed response)
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def detach_request():
+    # For background tasks started from a request: stop attributing their work to it
+    _current.set(None)
+
+
+def observe(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _current.get()
+    if timings is not None:
+        timings.add_span(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def count(event: str, value: float = 1):
+    EVENTS.inc(value, event=event)
+    record(event, value)
+
+
+def record(name: str, value: float = 1):
+    # Per-request only, for values a component already exports through its stats()
+    timings = _current.get()
+    if timings is not None and value:
+        timings.add(name, value)
+
+
+def _route_template(scope) -> str:
+    # The matched route's template, e.g. /documents/document/{doc_id}, so label values stay bounded.
+    # FastAPI releases that no longer copy the routes of included routers keep the prefixed
+    # template in their effective route context; earlier ones set route.path with the prefix
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    effective = scope.get("fastapi", {}).get("effective_route_context")
+    return getattr(effective, "path", None) or route.path
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route template (bounded label values)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_SECONDS.observe(
+                time.perf_counter() - start, method=scope["method"], route=_route_template(scope), status=status
+            )
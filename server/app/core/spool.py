@@ -0,0 +1,64 @@
+# Upload spool: uploaded PDFs wait in INGEST_SPOOL_DIR until an ingestion worker picks them up.
+# The API and every ingestion worker must see the same directory (a shared volume when they run
+# on different hosts). Jobs reference spooled files by name, so the volume may be mounted at a
+# different path on each host; check_spool_dir() verifies at startup that it really is shared.
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from app.config import settings
+from app.database.mongo import db
+
+logger = logging.getLogger(__name__)
+
+MARKER_FILE = ".studyai-spool"
+
+
+class SpoolDirError(RuntimeError):
+    pass
+
+
+def spool_path(name: str) -> str:
+    # Local path of a spooled file; names never contain directories
+    return os.path.join(settings.INGEST_SPOOL_DIR, os.path.basename(name))
+
+
+def _read_or_create_marker(directory: str) -> str:
+    # The first process to start writes a random id; link() publishes it atomically, so a
+    # concurrent starter either wins or reads the complete winner's id
+    path = os.path.join(directory, MARKER_FILE)
+    if not os.path.exists(path):
+        tmp = os.path.join(directory, f"{MARKER_FILE}.{uuid.uuid4().hex}")
+        with open(tmp, "w") as f:
+            f.write(uuid.uuid4().hex)
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp)
+    with open(path) as f:
+        return f.read().strip()
+
+
+async def check_spool_dir():
+    # Fails startup unless the spool directory is writable and holds the marker recorded in
+    # MongoDB by the first process of this deployment
+    directory = settings.INGEST_SPOOL_DIR
+    if not os.path.isdir(directory) or not os.access(directory, os.W_OK | os.X_OK):
+        raise SpoolDirError(f"INGEST_SPOOL_DIR {directory} is not a writable directory")
+    marker = await asyncio.to_thread(_read_or_create_marker, directory)
+    record = await db.runtime_state.find_one_and_update(
+        {"_id": "ingest_spool"},
+        {"$setOnInsert": {"marker": marker, "created_at": datetime.now(timezone.utc)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    if record["marker"] != marker:
+        raise SpoolDirError(
+            f"INGEST_SPOOL_DIR {directory} is not the spool directory of the other API and ingestion "
+            f"processes ({MARKER_FILE} differs): mount the same shared volume on every host"
+        )
+    logger.info("Spool directory %s verified", directory)
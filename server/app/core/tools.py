@@ -1,30 +1,165 @@
-# Tool for searching relevant document chunks using Pinecone and user context
-from typing import Annotated, Optional
+# Tool for searching relevant document chunks (vector + keyword retrieval) using user context
+import asyncio
+from typing import Annotated, Dict, List, Optional
 from langchain.tools import tool
 from langchain_core.tools import InjectedToolArg
-from app.database.pinecone_utils import embeddings, index
+from langchain_core.callbacks import adispatch_custom_event
+from app.database.pinecone_utils import embeddings, vector_store
+from app.database.mongo import AsyncMongoDB
+from app.database.lexical_index import lexical_index
+from app.core.context_compaction import context_compactor, source_names
+from app.core import metrics
+from app.config import settings
+
+def content_filter(scope: list) -> Optional[dict]:
+    # Vectors are keyed by content hash; documents ingested before deduplication
+    # still carry their own doc_id. None when the user has nothing to search.
+    hashes = sorted({d["content_hash"] for d in scope if d.get("content_hash")})
+    legacy = [d["doc_id"] for d in scope if not d.get("content_hash")]
+    clauses = []
+    if hashes:
+        clauses.append({"content_hash": {"$in": hashes}})
+    if legacy:
+        clauses.append({"doc_id": {"$in": legacy}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+def namespace_filters(scope: list) -> Dict[str, dict]:
+    # Vector namespace -> filter of the scope's documents in it; documents not yet migrated
+    # to a per-user namespace are still in the default one ("")
+    groups: Dict[str, list] = {}
+    for doc in scope:
+        groups.setdefault(doc.get("vector_namespace") or "", []).append(doc)
+    return {namespace: content_filter(docs) for namespace, docs in groups.items()}
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    # Each list is ranked best first; an ID scores 1 / (k + rank) per list it appears in
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+async def retrieve(query: str, scope: list, top_k: int = None, hybrid: bool = None,
+                   vector: List[float] = None) -> List[dict]:
+    """Top chunks for a query within a search scope: dense matches fused with BM25 keyword matches."""
+    top_k = top_k or settings.SEARCH_TOP_K
+    hybrid = settings.HYBRID_SEARCH_ENABLED if hybrid is None else hybrid
+    filters = namespace_filters(scope)
+    if not filters:
+        return []
+    depth = max(top_k, settings.HYBRID_CANDIDATES) if hybrid else top_k
+
+    async def dense():
+        query_vector = vector
+        if query_vector is None:
+            with metrics.span("search.embed"):
+                query_vector = await embeddings.aembed_query(query)
+        # The vector store API is sync, so keep it off the event loop; normally a single namespace
+        with metrics.span("search.vector"):
+            results = await asyncio.gather(*[
+                asyncio.to_thread(vector_store.namespace(ns).query, query_vector, top_k=depth, filter=f)
+                for ns, f in filters.items()
+            ])
+        matches = [m for result in results for m in result]
+        return sorted(matches, key=lambda m: m.score, reverse=True)[:depth] if len(results) > 1 else matches
+
+    async def lexical():
+        if not hybrid:
+            return []
+        hashes = sorted({d["content_hash"] for d in scope if d.get("content_hash")})
+        with metrics.span("search.lexical"):
+            return await lexical_index.search(hashes, query, top_k=depth)
+
+    # Keyword search runs while the query is being embedded
+    dense_matches, lexical_matches = await asyncio.gather(dense(), lexical())
+    if not lexical_matches:
+        return [{"id": m.id, "text": m.metadata.get("text", ""), "metadata": m.metadata} for m in dense_matches[:top_k]]
+
+    chunks = {m["id"]: m for m in lexical_matches}
+    chunks.update({m.id: {"id": m.id, "text": m.metadata.get("text", ""), "metadata": m.metadata} for m in dense_matches})
+    fused = reciprocal_rank_fusion(
+        [[m.id for m in dense_matches], [m["id"] for m in lexical_matches]], k=settings.HYBRID_RRF_K
+    )
+    return [chunks[i] for i in fused[:top_k]]
+
+async def retrieve_many(queries: List[str], scope: list, top_k: int = None) -> List[tuple]:
+    """
+    Fan-out search: all queries embedded in one batch, searched concurrently.
+    Returns [(query, chunks)] with every chunk ID kept only under the first query that found it.
+    """
+    queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+    if not queries or not namespace_filters(scope):
+        return [(q, []) for q in queries]
+    with metrics.span("search.embed_batch"):
+        vectors = await embeddings.aembed_queries(queries)
+    results = await asyncio.gather(*[
+        retrieve(q, scope, top_k=top_k, vector=v) for q, v in zip(queries, vectors)
+    ])
+    seen = set()
+    merged = []
+    for query, chunks in zip(queries, results):
+        unique = [c for c in chunks if c["id"] not in seen]
+        seen.update(c["id"] for c in unique)
+        merged.append((query, unique))
+    return merged
 
 @tool
-def search_documents(
+async def search_documents(
     query: str,
     user_id: Annotated[str, InjectedToolArg],
     doc_ids: Annotated[Optional[list[str]], InjectedToolArg] = None
 ) -> str:
     """Retrieve relevant document chunks based on user query."""
+    # Progress event for streaming clients (no-op when nobody is listening)
+    await adispatch_custom_event("search_started", {"query": query})
+
+    # Search only the documents this user may read (optionally narrowed to doc_ids)
+    with metrics.span("search.scope"):
+        scope = await AsyncMongoDB.get_search_scope(user_id, doc_ids)
+    chunks = await retrieve(query, scope)
 
-    # Embed the user query to a vector
-    vector = embeddings.embed_query(query)
+    # Merge overlapping/adjacent chunks into source-tagged blocks within the token budget
+    with metrics.span("search.compact"):
+        content, report = context_compactor.compact(chunks, source_names(scope))
+    metrics.count("chunks_retrieved", report["chunks"])
+    metrics.count("context_tokens", report["tokens"])
+    await adispatch_custom_event("search_results", {"query": query, **report})
 
-    # Build filter for Pinecone query (by user and optional doc_ids)
-    filter = {"user_id": user_id}
-    if doc_ids:
-        filter["doc_id"] = {"$in": doc_ids}
+    return content
 
-    # Query Pinecone for top matches
-    response = index.query(vector=vector, filter=filter, top_k=10, include_metadata=True)
-    matches = response.matches or []
+@tool
+async def search_documents_multi(
+    queries: list[str],
+    user_id: Annotated[str, InjectedToolArg],
+    doc_ids: Annotated[Optional[list[str]], InjectedToolArg] = None
+) -> str:
+    """Retrieve relevant document chunks for several focused sub-queries in one call."""
+    queries = queries[:settings.MULTI_SEARCH_MAX_QUERIES]
+    await adispatch_custom_event("search_started", {"tool": "search_documents_multi", "queries": queries})
 
-    # Combine matching document texts into a single string
-    content = "\n\n".join([m.metadata.get("text", "") for m in matches])
+    with metrics.span("search.scope"):
+        scope = await AsyncMongoDB.get_search_scope(user_id, doc_ids)
+    results = [(q, chunks) for q, chunks in await retrieve_many(queries, scope, top_k=settings.MULTI_SEARCH_TOP_K) if chunks]
 
-    return content
+    # One compacted section per sub-query, sharing the token budget; chunks already shown
+    # under an earlier sub-query are not repeated
+    names = source_names(scope)
+    budget = context_compactor.token_budget // max(len(results), 1)
+    sections, reports = [], []
+    with metrics.span("search.compact"):
+        for query, chunks in results:
+            content, report = context_compactor.compact(chunks, names, token_budget=budget)
+            sections.append(f"### {query}\n\n{content}")
+            reports.append(report)
+    metrics.count("chunks_retrieved", sum(r["chunks"] for r in reports))
+    metrics.count("context_tokens", sum(r["tokens"] for r in reports))
+    await adispatch_custom_event("search_results", {
+        "tool": "search_documents_multi",
+        "queries": queries,
+        "chunks": sum(r["chunks"] for r in reports),
+        "tokens": sum(r["tokens"] for r in reports),
+        "tokens_saved": sum(r["tokens_saved"] for r in reports)
+    })
+    return "\n\n".join(sections)
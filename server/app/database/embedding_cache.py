@@ -0,0 +1,268 @@
+# Bounded embedding cache shared by the query (search) and ingestion paths
+import asyncio
+from array import array
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from pymongo import UpdateOne
+from app.core import metrics
+
+
+def cache_key(model: str, kind: str, text: str) -> str:
+    # Normalize whitespace for all texts; queries are also case-folded
+    normalized = re.sub(r"\s+", " ", text).strip()
+    if kind == "query":
+        normalized = normalized.lower()
+    return hashlib.sha256(f"{model}\x00{kind}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MongoEmbeddingStore:
+    """Shared backend: one document per cache key, expired by a Mongo TTL index (created at startup)."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        docs = self.collection.find({"_id": {"$in": keys}}, {"vector": 1})
+        return {doc["_id"]: doc["vector"] for doc in docs}
+
+    def set_many(self, items: Dict[str, List[float]]):
+        # The model is part of the key (cache_key), so it is not stored separately
+        now = datetime.now(timezone.utc)
+        ops = [
+            UpdateOne({"_id": k}, {"$set": {"vector": v, "created_at": now}}, upsert=True)
+            for k, v in items.items()
+        ]
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+
+
+class DiskEmbeddingStore:
+    """Shared backend for workers on one host: a local SQLite file. Expired rows are purged on write."""
+
+    def __init__(self, path: str, ttl_seconds: float, purge_interval: float = 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB, created_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite connections are not shareable across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        if not keys:
+            return {}
+        cutoff = time.time() - self.ttl_seconds
+        placeholders = ",".join("?" * len(keys))
+        rows = self._conn().execute(
+            f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders}) AND created_at >= ?",
+            (*keys, cutoff)
+        ).fetchall()
+        return {key: json.loads(vector) for key, vector in rows}
+
+    def set_many(self, items: Dict[str, List[float]]):
+        now = time.time()
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                [(k, json.dumps(v), now) for k, v in items.items()]
+            )
+            # At most once per interval and process; other workers' purges are harmless overlaps
+            if now - self._last_purge >= self.purge_interval:
+                self._last_purge = now
+                conn.execute("DELETE FROM embeddings WHERE created_at < ?", (now - self.ttl_seconds,))
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated texts from an in-process LRU/TTL cache,
+    falling back to an optional shared store and finally the embedding model.
+    """
+
+    def __init__(self, base: Embeddings, model_name: str, max_entries: int = 10000,
+                 ttl_seconds: float = 86400, shared=None, query_batch_kwargs: Optional[dict] = None):
+        self.base = base
+        self.model_name = model_name
+        # Extra arguments that make the base model's batch call embed queries, not documents
+        # (e.g. task_type for Gemini); without them batched queries fall back to one call each
+        self.query_batch_kwargs = query_batch_kwargs
+        self.local = LRUCache(max_entries, ttl_seconds)
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        # Resolve as many keys as possible from the local cache, then the shared store
+        found = {}
+        for key in keys:
+            vector = self.local.get(key)
+            if vector is not None:
+                found[key] = vector.tolist()
+        self.hits += len(found)
+        metrics.record("embedding_cache_hits", len(found))
+
+        remaining = [k for k in dict.fromkeys(keys) if k not in found]
+        if remaining and self.shared is not None:
+            try:
+                shared = self.shared.get_many(remaining)
+            except Exception:
+                shared = {}  # the shared cache is an optimization, never a hard dependency
+            for key, vector in shared.items():
+                self.local.set(key, array("f", vector))
+            self.shared_hits += len(shared)
+            metrics.record("embedding_cache_hits", len(shared))
+            found.update(shared)
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        # Kept as float32 arrays: ~4x smaller than a list of Python floats
+        for key, vector in items.items():
+            self.local.set(key, array("f", vector))
+        if items and self.shared is not None:
+            try:
+                self.shared.set_many(items)
+            except Exception:
+                pass
+
+    async def _offload(self, func, *args):
+        # Only the shared store does I/O; purely local lookups stay on the event loop
+        if self.shared is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = cache_key(self.model_name, "query", text)
+        found = self._lookup([key])
+        if key in found:
+            return found[key]
+        self.misses += 1
+        metrics.record("embedding_cache_misses")
+        vector = self.base.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = cache_key(self.model_name, "query", text)
+        found = await self._offload(self._lookup, [key])
+        if key in found:
+            return found[key]
+        self.misses += 1
+        metrics.record("embedding_cache_misses")
+        vector = await self.base.aembed_query(text)
+        await self._offload(self._store, {key: vector})
+        return vector
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        # Several queries at once: cache misses are embedded in a single batch request
+        keys, found, missing = await self._offload(self._split, texts, "query")
+        if missing:
+            if self.query_batch_kwargs is not None:
+                vectors = await self.base.aembed_documents(list(missing.values()), **self.query_batch_kwargs)
+            else:
+                vectors = await asyncio.gather(*[self.base.aembed_query(t) for t in missing.values()])
+            computed = dict(zip(missing.keys(), vectors))
+            await self._offload(self._store, computed)
+            found.update(computed)
+        return [found[k] for k in keys]
+
+    def _split(self, texts: List[str], kind: str = "document"):
+        keys = [cache_key(self.model_name, kind, t) for t in texts]
+        found = self._lookup(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self.misses += len(missing)
+        metrics.record("embedding_cache_misses", len(missing))
+        return keys, found, missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._split(texts)
+        if missing:
+            vectors = self.base.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+        return [found[k] for k in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await self._offload(self._split, texts)
+        if missing:
+            vectors = await self.base.aembed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            await self._offload(self._store, computed)
+            found.update(computed)
+        return [found[k] for k in keys]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self.local),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0
+        }
+
+
+def build_shared_store(backend: str, ttl_seconds: float, path: Optional[str] = None):
+    # Optional cross-worker backend selected by settings
+    if backend == "mongo":
+        from app.database.mongo import sync_db
+        return MongoEmbeddingStore(sync_db.embedding_cache)
+    if backend == "disk":
+        return DiskEmbeddingStore(path, ttl_seconds)
+    return None
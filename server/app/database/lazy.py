@@ -0,0 +1,99 @@
+# Lazily created service clients (MongoDB, vector store, embeddings). Importing the app creates
+# nothing: a client is built on first use or by the lifespan warmup, and is dropped in forked
+# children so no worker reuses sockets or threads inherited from its parent.
+import os
+import threading
+import time
+import weakref
+from typing import Callable, Dict
+
+_proxies = weakref.WeakSet()
+
+
+class LazyClient:
+    """Proxy that builds the wrapped object on first attribute access (thread-safe)."""
+
+    def __init__(self, name: str, factory: Callable, child: bool = False):
+        self._lazy_name = name
+        self._lazy_child = child  # e.g. a collection of a lazy database
+        self._lazy_factory = factory
+        self._lazy_value = None
+        self._lazy_lock = threading.Lock()
+        self.init_seconds = None
+        _proxies.add(self)
+
+    def resolve(self):
+        if self._lazy_value is None:
+            with self._lazy_lock:
+                if self._lazy_value is None:
+                    start = time.perf_counter()
+                    self._lazy_value = self._lazy_factory()
+                    self.init_seconds = time.perf_counter() - start
+        return self._lazy_value
+
+    @property
+    def initialized(self) -> bool:
+        return self._lazy_value is not None
+
+    def reset(self):
+        # Forget the object without closing it (it may belong to the parent process)
+        self._lazy_value = None
+        self.init_seconds = None
+
+    def __getattr__(self, name):
+        if name.startswith("_lazy"):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __getitem__(self, key):
+        return self.resolve()[key]
+
+    def __repr__(self):
+        return f"<lazy {self._lazy_name}{'' if self.initialized else ' (not created)'}>"
+
+
+class LazyDatabase(LazyClient):
+    """
+    Lazy MongoDB database whose collections (`db.users`, `db["users"]`) are lazy as well, so
+    module-level objects can hold collection handles. Names of database methods (`command`, ...)
+    resolve the database itself.
+    """
+
+    def __init__(self, name: str, factory: Callable, database_class: type):
+        super().__init__(name, factory)
+        self._lazy_methods = frozenset(dir(database_class))
+        self._lazy_collections: Dict[str, LazyClient] = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_lazy"):
+            raise AttributeError(name)
+        if name.startswith("_") or name in self._lazy_methods:
+            return getattr(self.resolve(), name)
+        return self[name]
+
+    def __getitem__(self, name):
+        collection = self._lazy_collections.get(name)
+        if collection is None:
+            collection = self._lazy_collections.setdefault(
+                name, LazyClient(f"{self._lazy_name}.{name}", lambda: self.resolve()[name], child=True)
+            )
+        return collection
+
+
+def init_stats() -> dict:
+    # Milliseconds each created client took to build (startup time breakdown)
+    return {
+        f"{proxy._lazy_name}_init_ms": round(proxy.init_seconds * 1000, 2)
+        for proxy in list(_proxies)
+        if proxy.init_seconds is not None and not proxy._lazy_child
+    }
+
+
+def _reset_after_fork():
+    for proxy in list(_proxies):
+        proxy.reset()
+        proxy._lazy_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
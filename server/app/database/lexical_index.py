@@ -0,0 +1,185 @@
+# BM25 keyword index over document chunks, stored in MongoDB next to the vectors.
+# Like the vectors it is keyed by content hash, so identical PDFs share one set of entries
+# and a search is scoped to the content hashes of the user's documents.
+import math
+import re
+from collections import Counter
+from typing import Dict, List
+from pymongo import UpdateOne
+from app.config import settings
+from app.database.mongo import db, sync_db
+
+# Keeps section numbers, versions and identifiers whole ("3.2.1", "gpt-4", "x_1")
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was "
+    "were what when where which who why how with does do did can i you we they he she".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        # Compound tokens are also indexed by their parts ("3.2.1" also matches "3")
+        if not token.isalnum():
+            tokens.extend(p for p in re.split(r"[._\-/]", token) if p and p not in STOPWORDS)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    One document per chunk in `lexical_chunks` (_id = vector ID, unique terms with their
+    counts, length and text), per-content totals in `lexical_stats` for BM25's N and avgdl,
+    and per-content document frequencies in `lexical_terms` (one row per content and term).
+    Written from the ingestion thread (sync client), searched from request handlers (async).
+    """
+
+    TERMS_BATCH = 1000
+
+    def __init__(self, collection, stats_collection, terms_collection,
+                 sync_collection, sync_stats_collection, sync_terms_collection,
+                 k1: float = 1.2, b: float = 0.75):
+        self.collection = collection
+        self.stats_collection = stats_collection
+        self.terms_collection = terms_collection
+        self.sync_collection = sync_collection
+        self.sync_stats_collection = sync_stats_collection
+        self.sync_terms_collection = sync_terms_collection
+        self.k1 = k1
+        self.b = b
+
+    def add_chunks(self, content_hash: str, chunks: List[tuple]):
+        # chunks: (vector_id, text, metadata); upserts keep retried ingestion idempotent
+        ops = []
+        for vector_id, text, metadata in chunks:
+            counts = Counter(tokenize(text))
+            ops.append(UpdateOne({"_id": vector_id}, {"$set": {
+                "content_hash": content_hash,
+                "terms": list(counts.keys()),
+                "counts": list(counts.values()),
+                "length": sum(counts.values()),
+                "text": text,
+                "metadata": metadata
+            }}, upsert=True))
+        if ops:
+            self.sync_collection.bulk_write(ops, ordered=False)
+
+    def finish_content(self, content_hash: str, chunk_count: int):
+        # Totals and document frequencies are computed once ingestion of the content is complete
+        rows = list(self.sync_collection.aggregate([
+            {"$match": {"content_hash": content_hash}},
+            {"$group": {"_id": None, "length": {"$sum": "$length"}}}
+        ]))
+        # Rewritten as a whole, so a retried ingestion does not double count
+        self.sync_terms_collection.delete_many({"content_hash": content_hash})
+        batch = []
+        for row in self.sync_collection.aggregate([
+            {"$match": {"content_hash": content_hash}},
+            {"$unwind": "$terms"},
+            {"$group": {"_id": "$terms", "df": {"$sum": 1}}}
+        ]):
+            batch.append({"content_hash": content_hash, "term": row["_id"], "df": row["df"]})
+            if len(batch) >= self.TERMS_BATCH:
+                self.sync_terms_collection.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            self.sync_terms_collection.insert_many(batch, ordered=False)
+        self.sync_stats_collection.update_one(
+            {"_id": content_hash},
+            {"$set": {"chunks": chunk_count, "length": rows[0]["length"] if rows else 0}},
+            upsert=True
+        )
+
+    async def delete_content(self, content_hash: str):
+        await self.collection.delete_many({"content_hash": content_hash})
+        await self.terms_collection.delete_many({"content_hash": content_hash})
+        await self.stats_collection.delete_one({"_id": content_hash})
+
+    async def _document_frequencies(self, content_hashes: List[str], terms: List[str]) -> Dict[str, int]:
+        # Chunks containing each term across the given contents, from the counts kept at index time
+        df: Dict[str, int] = Counter()
+        async for row in self.terms_collection.find(
+            {"content_hash": {"$in": content_hashes}, "term": {"$in": terms}}, {"term": 1, "df": 1}
+        ):
+            df[row["term"]] += row["df"]
+        return df
+
+    async def _candidates(self, content_hashes: List[str], df: Dict[str, int]) -> List[dict]:
+        # Chunks containing at least one query term, at most LEXICAL_MAX_CANDIDATES of them.
+        # Fetched from the rarest term to the most common, so when the cap is hit the chunks
+        # left out are those matching only the most common (lowest IDF) terms.
+        limit = settings.LEXICAL_MAX_CANDIDATES
+        ordered = sorted(df, key=df.get)
+        candidates: Dict[str, dict] = {}
+        i = 0
+        while i < len(ordered) and len(candidates) < limit:
+            # As many of the next rarest terms as surely fit under the cap go in one query
+            batch, expected = [ordered[i]], df[ordered[i]]
+            i += 1
+            while i < len(ordered) and expected + df[ordered[i]] <= limit - len(candidates):
+                expected += df[ordered[i]]
+                batch.append(ordered[i])
+                i += 1
+            query = {"content_hash": {"$in": content_hashes}, "terms": {"$in": batch}}
+            if candidates:
+                query["_id"] = {"$nin": list(candidates)}
+            async for doc in self.collection.find(query, {"terms": 1, "counts": 1, "length": 1}).limit(
+                limit - len(candidates)
+            ):
+                candidates[doc["_id"]] = doc
+        return list(candidates.values())
+
+    async def search(self, content_hashes: List[str], query: str, top_k: int = 10) -> List[dict]:
+        """BM25 over the given contents; returns [{"id", "score", "text", "metadata"}] best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not content_hashes:
+            return []
+
+        n_chunks, total_length = 0, 0
+        async for row in self.stats_collection.find({"_id": {"$in": content_hashes}}):
+            n_chunks += row["chunks"]
+            total_length += row["length"]
+        if not n_chunks:
+            return []
+        avgdl = total_length / n_chunks
+
+        # IDF from the whole scope, not only from the candidates that were fetched
+        df = await self._document_frequencies(content_hashes, terms)
+        if not df:
+            return []
+        idf = {t: math.log(1 + (n_chunks - df[t] + 0.5) / (df[t] + 0.5)) for t in df}
+        candidates = await self._candidates(content_hashes, df)
+
+        scored = []
+        for doc in candidates:
+            tf = dict(zip(doc["terms"], doc["counts"]))
+            norm = self.k1 * (1 - self.b + self.b * doc["length"] / avgdl)
+            score = sum(
+                idf[t] * tf[t] * (self.k1 + 1) / (tf[t] + norm)
+                for t in terms if t in tf
+            )
+            scored.append((score, doc["_id"]))
+        scored.sort(reverse=True)
+        top = scored[:top_k]
+        if not top:
+            return []
+
+        # Fetch texts only for the winners
+        docs = {
+            d["_id"]: d async for d in self.collection.find(
+                {"_id": {"$in": [vector_id for _, vector_id in top]}}, {"text": 1, "metadata": 1}
+            )
+        }
+        return [
+            {"id": vector_id, "score": score, "text": docs[vector_id]["text"], "metadata": docs[vector_id].get("metadata", {})}
+            for score, vector_id in top if vector_id in docs
+        ]
+
+
+lexical_index = LexicalIndex(
+    db.lexical_chunks, db.lexical_stats, db.lexical_terms,
+    sync_db.lexical_chunks, sync_db.lexical_stats, sync_db.lexical_terms
+)
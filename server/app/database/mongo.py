@@ -1,42 +1,173 @@
-# MongoDB utility class for user, document, and chat history operations
-from pymongo import MongoClient
+# MongoDB data layer: async (Motor) access for request handlers and background jobs
+import logging
+from typing import Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
 from app.config import settings
+from app.database.lazy import LazyClient, LazyDatabase
 
-client = MongoClient(settings.MONGO_URI)
-db = client[settings.MONGO_DB]
+logger = logging.getLogger(__name__)
 
-class MongoDB:
+# Async pooled client used by every route and background job (created on first use)
+async_client = LazyClient("mongo", lambda: AsyncIOMotorClient(
+    settings.MONGO_URI,
+    maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+    minPoolSize=settings.MONGO_MIN_POOL_SIZE
+))
+db = LazyDatabase("mongo_db", lambda: async_client[settings.MONGO_DB], AsyncIOMotorDatabase)
+
+# Sync pooled client, only for libraries that require one (LangChain chat memory)
+# and for code that already runs in worker threads (shared embedding cache)
+client = LazyClient("mongo_sync", lambda: MongoClient(
+    settings.MONGO_URI,
+    maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+    minPoolSize=settings.MONGO_MIN_POOL_SIZE
+))
+sync_db = LazyDatabase("mongo_sync_db", lambda: client[settings.MONGO_DB], Database)
+
+
+def close_clients():
+    # Close whichever clients this process created
+    for lazy in (async_client, client):
+        if lazy.initialized:
+            lazy.close()
+            lazy.reset()
+
+
+async def _page(collection, query: dict, fields: list, limit: int, cursor: Optional[str]) -> dict:
+    # Keyset pagination, newest first: the cursor is the last _id of the previous page
+    if cursor:
+        query = {**query, "_id": {"$lt": ObjectId(cursor)}}
+    projection = {field: 1 for field in fields}
+    docs = await collection.find(query, projection).sort("_id", DESCENDING).limit(limit + 1).to_list(length=None)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return {"items": docs, "next_cursor": docs[-1]["_id"] if has_more else None}
+
+
+async def _ensure_ttl_index(collection, field: str, seconds: int):
+    # A changed TTL setting conflicts with the existing index (IndexOptionsConflict, code 85):
+    # apply the new TTL to that index instead of failing startup
+    try:
+        await collection.create_index(field, expireAfterSeconds=seconds)
+    except OperationFailure as e:
+        if e.code != 85:
+            raise
+        await db.command("collMod", collection.name, index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds})
+        logger.info("TTL of %s.%s changed to %ds", collection.name, field, seconds)
+
+
+class AsyncMongoDB:
     @staticmethod
-    def insert_user(user_data: dict) -> str:
+    async def ensure_indexes():
+        # Create all indexes once at application startup (no-op when they already exist)
+        try:
+            await db.users.create_index("email", unique=True)
+        except OperationFailure as e:
+            # Older deployments may hold duplicate emails; serve anyway rather than never becoming ready
+            logger.error(
+                "Unique index on users.email not created (%s). Remove or merge duplicate accounts, e.g. "
+                "db.users.aggregate([{$group: {_id: '$email', n: {$sum: 1}}}, {$match: {n: {$gt: 1}}}]), "
+                "then restart.", e
+            )
+        await db.documents.create_index([("user_id", ASCENDING), ("doc_id", ASCENDING)], unique=True)
+        await db.documents.create_index("doc_id")
+        await db.documents.create_index([("user_id", ASCENDING), ("_id", DESCENDING)])
+        await db.chat_histories.create_index([("SessionId", ASCENDING), ("_id", ASCENDING)])
+        await _ensure_ttl_index(db.answer_cache, "created_at", settings.ANSWER_CACHE_TTL)
+        await db.answer_cache.create_index([("user_id", ASCENDING), ("scope", ASCENDING), ("created_at", DESCENDING)])
+        await db.answer_cache.create_index([("user_id", ASCENDING), ("doc_ids", ASCENDING)])
+        await db.answer_cache.create_index([("content_key", ASCENDING), ("created_at", DESCENDING)], sparse=True)
+        await db.answer_cache.create_index("content_hashes")
+        await db.documents.create_index("content_hash", sparse=True)
+        await db.content_blobs.create_index("content_hash", sparse=True)
+        await db.content_blobs.create_index("user_id", sparse=True)
+        await db.lexical_chunks.create_index([("content_hash", ASCENDING), ("terms", ASCENDING)])
+        await db.lexical_terms.create_index([("content_hash", ASCENDING), ("term", ASCENDING)])
+        await db.ingestion_jobs.create_index([("status", ASCENDING), ("next_run_at", ASCENDING)])
+        await db.ingestion_jobs.create_index([("user_id", ASCENDING), ("status", ASCENDING)])
+        await db.ingestion_jobs.create_index([("user_id", ASCENDING), ("doc_id", ASCENDING), ("created_at", DESCENDING)])
+        await _ensure_ttl_index(db.url_cache, "fetched_at", settings.DOWNLOAD_CACHE_TTL)
+        if settings.EMBEDDING_CACHE_BACKEND == "mongo":
+            await _ensure_ttl_index(db.embedding_cache, "created_at", settings.EMBEDDING_CACHE_TTL)
+
+    @staticmethod
+    async def insert_user(user_data: dict) -> str:
         # Insert a new user document and return its ID
-        return db.users.insert_one(user_data).inserted_id
-    
+        result = await db.users.insert_one(user_data)
+        return result.inserted_id
+
     @staticmethod
-    def find_user(email: str) -> dict:
+    async def find_user(email: str) -> dict:
         # Find a user by email
-        return db.users.find_one({"email": email})
-    
+        return await db.users.find_one({"email": email})
+
     @staticmethod
-    def insert_document(doc_data: dict) -> str:
+    async def insert_document(doc_data: dict) -> str:
         # Insert a new document and return its ID
-        return db.documents.insert_one(doc_data).inserted_id
-    
-    @staticmethod
-    def get_documents(user_id: str) -> list:
-        # Get all documents for a user
-        return list(db.documents.find({"user_id": user_id}))
-    
-    @staticmethod
-    def update_chat_history(user_id: str, message: dict):
-        # Add a message to the user's chat history (upsert)
-        db.chat_histories.update_one(
-            {"session_id": str(user_id)},
-            {"$push": {"messages": message}},
-            upsert=True
-        )
-    
-    @staticmethod
-    def get_chat_history(user_id: str) -> list:
-        # Retrieve the chat history for a user
-        history = db.chat_histories.find_one({"session_id": str(user_id)})
-        return history["messages"] if history else []
+        result = await db.documents.insert_one(doc_data)
+        return result.inserted_id
+
+    @staticmethod
+    async def get_documents_page(user_id: str, fields: list, limit: int, cursor: Optional[str] = None) -> dict:
+        # One page of a user's documents (newest first), only the requested fields
+        return await _page(db.documents, {"user_id": user_id}, fields, limit, cursor)
+
+    @staticmethod
+    async def get_document(user_id: str, doc_id: str) -> dict:
+        # Get a single document record for a user
+        return await db.documents.find_one({"doc_id": doc_id, "user_id": user_id})
+
+    @staticmethod
+    async def get_search_scope(user_id: str, doc_ids: list = None) -> list:
+        # Documents a search may read: the user's own, optionally narrowed to doc_ids
+        query = {"user_id": user_id}
+        if doc_ids:
+            query["doc_id"] = {"$in": doc_ids}
+        projection = {"_id": 0, "doc_id": 1, "file_name": 1, "content_hash": 1, "vector_namespace": 1}
+        return await db.documents.find(query, projection).to_list(length=None)
+
+    @staticmethod
+    async def has_unmigrated_documents(user_id: str) -> bool:
+        # Whether any of the user's documents still has its vectors in the shared default namespace
+        query = {"user_id": user_id, "vector_namespace": {"$exists": False}}
+        return await db.documents.find_one(query, {"_id": 1}) is not None
+
+    @staticmethod
+    async def update_document(user_id: str, doc_id: str, fields: dict):
+        # Set fields (e.g. embedding_status) on a user's document
+        await db.documents.update_one({"doc_id": doc_id, "user_id": user_id}, {"$set": fields})
+
+    @staticmethod
+    async def delete_document(user_id: str, doc_id: str) -> bool:
+        # Delete a user's document record; False when it does not exist
+        result = await db.documents.delete_one({"doc_id": doc_id, "user_id": user_id})
+        return result.deleted_count > 0
+
+    @staticmethod
+    async def delete_user_documents(user_id: str) -> int:
+        # Delete all document records of a user and return how many were removed
+        result = await db.documents.delete_many({"user_id": user_id})
+        return result.deleted_count
+
+    @staticmethod
+    async def get_chat_history_page(user_id: str, fields: list, limit: int, cursor: Optional[str] = None) -> dict:
+        # One page of a user's chat messages (newest first), only the requested fields
+        return await _page(db.chat_histories, {"SessionId": str(user_id)}, fields, limit, cursor)
+
+    @staticmethod
+    async def has_chat_history(user_id: str) -> bool:
+        # Whether the user has any chat messages (a summary only exists alongside messages)
+        return await db.chat_histories.find_one({"SessionId": str(user_id)}, {"_id": 1}) is not None
+
+    @staticmethod
+    async def delete_chat_history(user_id: str) -> int:
+        # Delete all chat messages (and their summary) for a user and return how many were removed
+        result = await db.chat_histories.delete_many({"SessionId": str(user_id)})
+        await db.chat_summaries.delete_one({"_id": str(user_id)})
+        return result.deleted_count
@@ -1,11 +1,28 @@
-# Pinecone and embedding model setup utilities
+# Vector store and embedding model setup utilities
 from app.config import settings
-from pinecone import Pinecone
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from app.database.embedding_cache import CachedEmbeddings, build_shared_store
+from app.database.lazy import LazyClient
+from app.database.vector_store import build_vector_store
 
-# Initialize Pinecone client
-pc = Pinecone(api_key=settings.PINECONE_API_KEY)
 
-# Get Pinecone index and embedding model
-index = pc.Index(settings.PINECONE_INDEX)
-embeddings = GoogleGenerativeAIEmbeddings(model=settings.GEMINI_EMBEDDING_MODEL, google_api_key=settings.GEMINI_API_KEY)
+def _build_embeddings() -> CachedEmbeddings:
+    # Cached wrapper used for both query and ingestion embeddings
+    base_embeddings = GoogleGenerativeAIEmbeddings(model=settings.GEMINI_EMBEDDING_MODEL, google_api_key=settings.GEMINI_API_KEY)
+    return CachedEmbeddings(
+        base_embeddings,
+        model_name=settings.GEMINI_EMBEDDING_MODEL,
+        max_entries=settings.EMBEDDING_CACHE_SIZE,
+        ttl_seconds=settings.EMBEDDING_CACHE_TTL,
+        shared=build_shared_store(
+            settings.EMBEDDING_CACHE_BACKEND,
+            settings.EMBEDDING_CACHE_TTL,
+            settings.EMBEDDING_CACHE_PATH
+        ),
+        query_batch_kwargs={"task_type": "RETRIEVAL_QUERY"}  # what embed_query uses for Gemini
+    )
+
+
+# Vector store (Pinecone or local) and embedding model, created on first use
+vector_store = LazyClient("vector_store", lambda: build_vector_store(settings.VECTOR_STORE_BACKEND, settings.VECTOR_STORE_PATH))
+embeddings = LazyClient("embeddings", _build_embeddings)
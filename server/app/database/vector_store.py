@@ -0,0 +1,467 @@
+# Vector store abstraction used by search, ingestion and deletion.
+# Backends: Pinecone (default) and a local in-process index (NumPy arrays memory-mapped on disk).
+# Both are partitioned into namespaces; every user's vectors live in their own namespace.
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+
+@dataclass
+class VectorMatch:
+    id: str
+    score: float
+    metadata: dict = field(default_factory=dict)
+    values: Optional[List[float]] = None  # only with include_values=True
+
+
+def user_namespace(user_id: str) -> str:
+    return f"user-{user_id}"
+
+
+class VectorStore:
+    """
+    Minimal interface the app relies on. Vectors are dicts {"id", "values", "metadata"};
+    filters use Pinecone's metadata filter syntax ($eq, $ne, $in, $nin, $and, $or).
+    A store operates on one namespace (the default one unless obtained via `namespace()`).
+    """
+
+    def namespace(self, name: str) -> "VectorStore":
+        raise NotImplementedError
+
+    def delete_namespace(self, name: str):
+        raise NotImplementedError
+
+    def upsert(self, vectors: List[dict]):
+        raise NotImplementedError
+
+    def query(self, vector: List[float], top_k: int = 10, filter: Optional[dict] = None,
+              include_values: bool = False) -> List[VectorMatch]:
+        raise NotImplementedError
+
+    def fetch(self, ids: List[str]) -> Dict[str, dict]:
+        # {id: {"values", "metadata"}} for the IDs that exist
+        raise NotImplementedError
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None):
+        raise NotImplementedError
+
+
+class PineconeVectorStore(VectorStore):
+    # Pinecone accepts up to 1000 IDs per delete request; fetches go in smaller batches (URL length)
+    DELETE_BATCH = 1000
+    FETCH_BATCH = 100
+
+    def __init__(self, index, namespace: str = ""):
+        self.index = index
+        self.namespace_name = namespace
+
+    def namespace(self, name: str) -> "PineconeVectorStore":
+        return PineconeVectorStore(self.index, name)
+
+    def delete_namespace(self, name: str):
+        # Drops every vector of the namespace in one call
+        try:
+            self.index.delete(delete_all=True, namespace=name)
+        except Exception as e:
+            if getattr(e, "status", None) != 404:  # namespace never created
+                raise
+
+    def upsert(self, vectors: List[dict]):
+        self.index.upsert(vectors=vectors, namespace=self.namespace_name)
+
+    def query(self, vector: List[float], top_k: int = 10, filter: Optional[dict] = None,
+              include_values: bool = False) -> List[VectorMatch]:
+        response = self.index.query(
+            vector=vector, filter=filter, top_k=top_k, include_metadata=True,
+            include_values=include_values, namespace=self.namespace_name
+        )
+        return [
+            VectorMatch(m.id, m.score, m.metadata or {}, list(m.values) if include_values else None)
+            for m in response.matches or []
+        ]
+
+    def fetch(self, ids: List[str]) -> Dict[str, dict]:
+        found = {}
+        for start in range(0, len(ids), self.FETCH_BATCH):
+            response = self.index.fetch(ids=ids[start:start + self.FETCH_BATCH], namespace=self.namespace_name)
+            for vector_id, vector in response.vectors.items():
+                found[vector_id] = {"values": list(vector.values), "metadata": vector.metadata or {}}
+        return found
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None):
+        if ids is not None:
+            for start in range(0, len(ids), self.DELETE_BATCH):
+                self.index.delete(ids=ids[start:start + self.DELETE_BATCH], namespace=self.namespace_name)
+        elif filter is not None:
+            self.index.delete(filter=filter, namespace=self.namespace_name)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Single-host index: unit-normalized float32 vectors in a memory-mapped file (`vectors.f32`),
+    IDs and metadata in an append-only log (`log.jsonl`) replayed on open. Filters are resolved
+    with an inverted index over scalar metadata, then scored with one matrix-vector product.
+    Several processes (API workers, ingestion workers) may share a directory: writes hold an
+    exclusive file lock and every operation first catches up with the log. The default
+    namespace lives in `path` itself, every other namespace in `path/namespaces/<name>`;
+    at most `max_open_namespaces` of them stay open, the least recently used are closed.
+    """
+
+    GROW_ROWS = 1024
+    # Metadata that is returned but never filtered on (kept out of the inverted index)
+    UNINDEXED = {"text"}
+
+    def __init__(self, path: str, max_open_namespaces: int = 256):
+        self.path = path
+        self.max_open_namespaces = max_open_namespaces
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._log_path = os.path.join(path, "log.jsonl")
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._namespaces: "OrderedDict[str, LocalVectorStore]" = OrderedDict()
+        self._reset()
+
+    def _reset(self):
+        self.dim = None
+        self._matrix = None
+        self._capacity = 0
+        self._ids: List[Optional[str]] = []
+        self._metadata: List[Optional[dict]] = []
+        self._slots: Dict[str, int] = {}
+        self._free: set = set()
+        self._postings: Dict[str, Dict[object, set]] = {}
+        self._log_offset = 0
+        self._log_inode = None
+        self._log_records = 0
+
+    # --- cross-process coordination ---
+
+    def _file_lock(self, exclusive: bool):
+        store = self
+        if self._lock_file is None:
+            # Opened on first use and again after close()
+            self._lock_file = open(os.path.join(self.path, "lock"), "a+")
+
+        class _Guard:
+            def __enter__(self):
+                if fcntl:
+                    fcntl.flock(store._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+            def __exit__(self, *exc):
+                if fcntl:
+                    fcntl.flock(store._lock_file, fcntl.LOCK_UN)
+                return False
+
+        return _Guard()
+
+    def _sync(self):
+        # Replay log records written since the last call (by this or another process)
+        try:
+            stat = os.stat(self._log_path)
+        except FileNotFoundError:
+            if self._log_inode is not None:
+                self._reset()  # the namespace was cleared
+            return
+        if self._log_inode is not None and stat.st_ino != self._log_inode:
+            self._reset()  # the log was compacted: rebuild from scratch
+        self._log_inode = stat.st_ino
+        if stat.st_size > self._log_offset:
+            with open(self._log_path, "rb") as f:
+                f.seek(self._log_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # record still being written
+                    self._apply(json.loads(line))
+                    self._log_offset += len(line)
+                    self._log_records += 1
+        self._map_vectors()
+
+    def _map_vectors(self):
+        if self.dim is None or not os.path.exists(self._vectors_path):
+            return
+        rows = os.path.getsize(self._vectors_path) // (self.dim * 4)
+        if rows and rows != self._capacity:
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+            self._capacity = rows
+
+    def _apply(self, record: dict):
+        op = record["op"]
+        if op == "init":
+            self.dim = record["dim"]
+        elif op == "put":
+            slot = record["slot"]
+            old = self._slots.get(record["id"])
+            if old is not None and old != slot:
+                self._unindex(old)
+            if slot < len(self._ids) and self._ids[slot] is not None:
+                self._unindex(slot)
+            while len(self._ids) <= slot:
+                self._free.add(len(self._ids))
+                self._ids.append(None)
+                self._metadata.append(None)
+            self._free.discard(slot)
+            self._ids[slot] = record["id"]
+            self._metadata[slot] = record["metadata"]
+            self._slots[record["id"]] = slot
+            for key, value in self._indexable(record["metadata"]):
+                self._postings.setdefault(key, {}).setdefault(value, set()).add(slot)
+        elif op == "del":
+            slot = self._slots.get(record["id"])
+            if slot is not None:
+                self._unindex(slot)
+
+    def _unindex(self, slot: int):
+        for key, value in self._indexable(self._metadata[slot]):
+            slots = self._postings.get(key, {}).get(value)
+            if slots is not None:
+                slots.discard(slot)
+                if not slots:
+                    del self._postings[key][value]
+        self._slots.pop(self._ids[slot], None)
+        self._ids[slot] = None
+        self._metadata[slot] = None
+        self._free.add(slot)
+
+    def _indexable(self, metadata: dict) -> Iterable:
+        for key, value in metadata.items():
+            if key in self.UNINDEXED:
+                continue
+            if isinstance(value, (str, int, float, bool)):
+                yield key, value
+            elif isinstance(value, list):  # list fields match on any element, as in Pinecone
+                for item in value:
+                    yield key, item
+
+    def _append(self, records: List[dict]):
+        data = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        for record in records:
+            self._apply(record)
+        self._log_offset += len(data.encode("utf-8"))
+        self._log_records += len(records)
+        self._log_inode = os.stat(self._log_path).st_ino
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self._capacity:
+            return
+        target = max(rows, self._capacity * 2, self.GROW_ROWS)
+        # Grow in place so mappings held by other processes stay valid
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(target * self.dim * 4)
+        self._map_vectors()
+
+    # --- public API ---
+
+    def namespace(self, name: str) -> "LocalVectorStore":
+        if not name:
+            return self  # the default namespace lives at the root
+        with self._lock:
+            store = self._namespaces.get(name)
+            if store is None:
+                safe = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+                store = LocalVectorStore(os.path.join(self.path, "namespaces", safe))
+                self._namespaces[name] = store
+                while len(self._namespaces) > self.max_open_namespaces:
+                    self._namespaces.popitem(last=False)[1].close()
+            else:
+                self._namespaces.move_to_end(name)
+            return store
+
+    def delete_namespace(self, name: str):
+        self.namespace(name).clear()
+
+    def close(self):
+        # Release the lock file, memory map and in-memory index (of every open namespace too).
+        # The store stays usable: the next operation reopens it and replays the log.
+        with self._lock:
+            while self._namespaces:
+                self._namespaces.popitem()[1].close()
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+            self._reset()
+
+    def clear(self):
+        # Remove every vector; other processes notice the missing log and reset
+        with self._lock, self._file_lock(exclusive=True):
+            for file_path in (self._log_path, self._vectors_path):
+                if os.path.exists(file_path):
+                    os.unlink(file_path)
+            self._reset()
+
+    def upsert(self, vectors: List[dict]):
+        if not vectors:
+            return
+        # An ID repeated within the batch is written once, with its last values (as in Pinecone)
+        vectors = list({v["id"]: v for v in vectors}.values())
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync()
+            if self.dim is None:
+                self._append([{"op": "init", "dim": len(vectors[0]["values"])}])
+
+            records, next_slot = [], len(self._ids)
+            free = sorted(self._free, reverse=True)  # reuse the lowest slots first
+            for v in vectors:
+                if len(v["values"]) != self.dim:
+                    raise ValueError(f"Vector dimension {len(v['values'])} does not match index dimension {self.dim}")
+                slot = self._slots.get(v["id"])
+                if slot is None:
+                    if free:
+                        slot = free.pop()
+                    else:
+                        slot, next_slot = next_slot, next_slot + 1
+                records.append({"op": "put", "slot": slot, "id": v["id"], "metadata": v.get("metadata") or {}})
+
+            self._ensure_capacity(next_slot)
+            values = np.asarray([v["values"] for v in vectors], dtype=np.float32)
+            norms = np.linalg.norm(values, axis=1, keepdims=True)
+            values /= np.where(norms == 0, 1, norms)
+            # Vectors first, then the log record that makes them visible
+            self._matrix[[r["slot"] for r in records]] = values
+            self._matrix.flush()
+            self._append(records)
+            self._maybe_compact()
+
+    def query(self, vector: List[float], top_k: int = 10, filter: Optional[dict] = None,
+              include_values: bool = False) -> List[VectorMatch]:
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync()
+            if self.dim is None or not self._slots:
+                return []
+            if filter:
+                slots = np.fromiter(self._match(filter), dtype=np.int64)
+            else:
+                slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+            if slots.size == 0:
+                return []
+
+            q = np.asarray(vector, dtype=np.float32)
+            q /= np.linalg.norm(q) or 1.0
+            scores = self._matrix[slots] @ q
+            k = min(top_k, slots.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                VectorMatch(
+                    self._ids[slots[i]], float(scores[i]), dict(self._metadata[slots[i]]),
+                    self._matrix[slots[i]].tolist() if include_values else None
+                )
+                for i in top
+            ]
+
+    def fetch(self, ids: List[str]) -> Dict[str, dict]:
+        # Values come back unit-normalized (what is stored); fine for a cosine index
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync()
+            return {
+                i: {"values": self._matrix[self._slots[i]].tolist(), "metadata": dict(self._metadata[self._slots[i]])}
+                for i in ids if i in self._slots
+            }
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None):
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync()
+            if ids is None and filter is not None:
+                ids = [self._ids[s] for s in self._match(filter)]
+            records = [{"op": "del", "id": i} for i in ids or [] if i in self._slots]
+            if records:
+                self._append(records)
+                self._maybe_compact()
+
+    def count(self) -> int:
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync()
+            return len(self._slots)
+
+    # --- filters ---
+
+    def _match(self, filter: dict) -> set:
+        result = None
+        for key, condition in filter.items():
+            if key == "$and":
+                slots = set.intersection(*[self._match(f) for f in condition]) if condition else self._all()
+            elif key == "$or":
+                slots = set().union(*[self._match(f) for f in condition])
+            else:
+                slots = self._match_field(key, condition)
+            result = slots if result is None else result & slots
+        return self._all() if result is None else result
+
+    def _all(self) -> set:
+        return set(self._slots.values())
+
+    def _match_field(self, key: str, condition) -> set:
+        postings = self._postings.get(key, {})
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        result = None
+        for op, value in condition.items():
+            if op == "$eq":
+                slots = set(postings.get(value, ()))
+            elif op == "$in":
+                slots = set().union(*[postings.get(v, ()) for v in value])
+            elif op == "$ne":
+                slots = self._all() - postings.get(value, set())
+            elif op == "$nin":
+                slots = self._all() - set().union(*[postings.get(v, ()) for v in value])
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                compare = {
+                    "$gt": lambda a: a > value, "$gte": lambda a: a >= value,
+                    "$lt": lambda a: a < value, "$lte": lambda a: a <= value
+                }[op]
+                slots = set().union(*[
+                    s for v, s in postings.items()
+                    if isinstance(v, (int, float)) and not isinstance(v, bool) and compare(v)
+                ])
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            result = slots if result is None else result & slots
+        return result
+
+    # --- maintenance ---
+
+    def _maybe_compact(self):
+        # Rewrite the log once deleted/overwritten records dominate it
+        live = len(self._slots)
+        if self._log_records < 2 * live + 10000:
+            return
+        records = [{"op": "init", "dim": self.dim}] + [
+            {"op": "put", "slot": slot, "id": self._ids[slot], "metadata": self._metadata[slot]}
+            for slot in self._slots.values()
+        ]
+        tmp_path = self._log_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._log_path)
+        stat = os.stat(self._log_path)
+        self._log_inode, self._log_offset, self._log_records = stat.st_ino, stat.st_size, len(records)
+
+
+def build_vector_store(backend: str, path: Optional[str] = None) -> VectorStore:
+    # Backend selected by settings; Pinecone is only imported when used
+    if backend == "local":
+        from app.config import settings
+        return LocalVectorStore(path, max_open_namespaces=settings.VECTOR_STORE_MAX_OPEN_NAMESPACES)
+    if backend == "pinecone":
+        from pinecone import Pinecone
+        from app.config import settings
+        pc = Pinecone(api_key=settings.PINECONE_API_KEY)
+        return PineconeVectorStore(pc.Index(settings.PINECONE_INDEX))
+    raise ValueError(f"Unknown vector store backend: {backend}")
@@ -1,11 +1,40 @@
-# FastAPI application entry point and router setup
+# FastAPI application entry point and router setup.
+# Importing this module creates no clients; they are set up by the lifespan handler below.
+# Production: `python -m app.serve` (multiple worker processes).
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.routes import document, chat
 from app.auth import router
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
+from app.config import settings
+from app.core.lifecycle import lifecycle
+from app.core.metrics import MetricsMiddleware, registry
+from app.utils.download import close_http_client
+from app.auth.passwords import shutdown_executor
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Indexes, clients and (optionally) warmup before serving traffic; timings in /ready
+    await lifecycle.startup()
+    if settings.METRICS_ENABLED and settings.METRICS_MULTIPROCESS_DIR:
+        registry.enable_multiprocess(settings.METRICS_MULTIPROCESS_DIR, settings.METRICS_SNAPSHOT_INTERVAL)
+
+    # Optionally drain the ingestion queue in-process (small deployments / development)
+    pool = None
+    if settings.INGEST_RUN_IN_API:
+        from app.workers.ingestion import IngestionWorkerPool
+        pool = IngestionWorkerPool(settings.INGEST_WORKERS)
+        await pool.start()
+    yield
+    if pool:
+        await pool.stop()
+    await close_http_client()
+    shutdown_executor()
+    await lifecycle.shutdown()
+    registry.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Allow CORS for all origins (customize as needed)
 app.add_middleware(
@@ -21,6 +50,31 @@ app.include_router(router.router, prefix="/auth")
 app.include_router(document.router, prefix="/documents")
 app.include_router(chat.router, prefix="/chat")
 
-# Run the app with Uvicorn if executed directly
+# Prometheus metrics (latency per route and stage, counters, component stats) of this process,
+# or of all workers of the server in multiprocess mode
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+# Liveness: the process is up and serving (no dependency checks)
+@app.get("/health", include_in_schema=False)
+async def health():
+    return {"status": "ok"}
+
+# Readiness: startup finished and MongoDB reachable; 503 until then (load balancers, rollouts)
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    checks = await lifecycle.check()
+    ok = all(value == "ok" for value in checks.values())
+    return JSONResponse(
+        {"ready": ok, "checks": checks, **lifecycle.stats(), "startup_steps_ms": lifecycle.steps},
+        status_code=200 if ok else 503
+    )
+
+# Run the production launcher if executed directly
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    from app.serve import main
+    main()
\ No newline at end of file
@@ -0,0 +1,119 @@
+# One-off migration of vectors from the shared default namespace into per-user namespaces.
+# Run from the server directory, with ingestion workers stopped:
+#   python -m app.migrations.user_namespaces [--dry-run]
+# Safe to re-run: every step is idempotent and a crash leaves the old data in place.
+#
+# - Shared content records (keyed by the bare hash, refs "user:doc") are split into one record per
+#   user; their vectors are copied into each user's namespace, then deleted from the default one.
+# - Documents from before deduplication (vectors with random IDs and a doc_id field) are moved in
+#   pages found with a filtered query, recording the vector IDs on the document as they move.
+# Until a document is migrated, search keeps using the default namespace for it and deleting it is refused.
+import argparse
+import asyncio
+import logging
+from app.core.content_store import content_blob_id
+from app.database.mongo import AsyncMongoDB, db
+from app.database.pinecone_utils import embeddings, vector_store
+from app.database.vector_store import user_namespace
+from app.utils.document import content_vector_ids, copy_content_vectors
+
+logger = logging.getLogger(__name__)
+
+# Pinecone returns at most 1000 matches per query when values are included
+MOVE_PAGE = 1000
+
+
+async def migrate_shared_content(blob: dict, dry_run: bool) -> int:
+    content_hash = blob["_id"]
+    owners = {}
+    for ref in blob.get("refs", []):
+        user_id, _, doc_id = ref.partition(":")
+        owners.setdefault(user_id, []).append(doc_id)
+    if dry_run:
+        logger.info("Content %s: %d users, status %s", content_hash, len(owners), blob["status"])
+        return len(owners)
+
+    if blob["status"] == "complete":
+        chunk_count = blob["chunk_count"]
+        for user_id, doc_ids in owners.items():
+            namespace = user_namespace(user_id)
+            await asyncio.to_thread(copy_content_vectors, content_hash, chunk_count, "", namespace)
+            await db.content_blobs.update_one(
+                {"_id": content_blob_id(user_id, content_hash)},
+                {
+                    "$addToSet": {"refs": {"$each": doc_ids}},
+                    "$set": {
+                        "user_id": user_id,
+                        "content_hash": content_hash,
+                        "namespace": namespace,
+                        "status": "complete",
+                        "chunk_count": chunk_count,
+                        "page_count": blob.get("page_count")
+                    }
+                },
+                upsert=True
+            )
+            await db.documents.update_many(
+                {"user_id": user_id, "doc_id": {"$in": doc_ids}},
+                {"$set": {"vector_namespace": namespace, "vector_ids": content_vector_ids(content_hash, chunk_count)}}
+            )
+        shared = vector_store.namespace("")
+        await asyncio.to_thread(shared.delete, ids=content_vector_ids(content_hash, chunk_count))
+    else:
+        # Never finished: the documents' next ingestion attempt embeds into their own namespace
+        shared = vector_store.namespace("")
+        await asyncio.to_thread(shared.delete, filter={"content_hash": content_hash})
+    await db.content_blobs.delete_one({"_id": content_hash})
+    return len(owners)
+
+
+def _move_page(doc_id: str, probe: list, namespace: str) -> list:
+    shared, target = vector_store.namespace(""), vector_store.namespace(namespace)
+    matches = shared.query(probe, top_k=MOVE_PAGE, filter={"doc_id": doc_id}, include_values=True)
+    target.upsert([{"id": m.id, "values": m.values, "metadata": m.metadata} for m in matches])
+    return [m.id for m in matches]
+
+
+async def migrate_legacy_document(doc: dict, probe: list, dry_run: bool) -> int:
+    namespace = user_namespace(doc["user_id"])
+    if dry_run:
+        logger.info("Document %s -> %s", doc["doc_id"], namespace)
+        return 0
+    moved = 0
+    while True:
+        ids = await asyncio.to_thread(_move_page, doc["doc_id"], probe, namespace)
+        if not ids:
+            break
+        # Record the IDs before removing the originals, so a crash never loses track of them
+        await db.documents.update_one({"_id": doc["_id"]}, {"$addToSet": {"vector_ids": {"$each": ids}}})
+        await asyncio.to_thread(vector_store.namespace("").delete, ids=ids)
+        moved += len(ids)
+    await db.documents.update_one({"_id": doc["_id"]}, {"$set": {"vector_namespace": namespace}})
+    return moved
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Move vectors into per-user namespaces")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be migrated")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    await AsyncMongoDB.ensure_indexes()
+
+    blobs = await db.content_blobs.find({"user_id": {"$exists": False}}).to_list(length=None)
+    for blob in blobs:
+        await migrate_shared_content(blob, args.dry_run)
+    logger.info("Shared content records: %d", len(blobs))
+
+    legacy = await db.documents.find(
+        {"vector_namespace": {"$exists": False}, "content_hash": {"$exists": False}}, {"_id": 1, "user_id": 1, "doc_id": 1}
+    ).to_list(length=None)
+    # Any vector of the right dimension: with a doc_id filter the query just pages through matches
+    probe = await embeddings.aembed_query("document") if legacy and not args.dry_run else None
+    moved = 0
+    for doc in legacy:
+        moved += await migrate_legacy_document(doc, probe, args.dry_run)
+    logger.info("Pre-deduplication documents: %d (%d vectors moved)", len(legacy), moved)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,17 +1,120 @@
 # FastAPI chat routes for querying, deleting, and retrieving chat history
-from fastapi import APIRouter, Depends, Body, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Body, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from app.auth.bearer import JWTBearer
-from app.core.agent import create_agent
+from app.core.agent import create_agent, agent_factory
+from app.core.concurrency import chat_admission
 from typing import Dict, Any, Optional, List
 from pydantic import BaseModel
-from app.database.mongo import db
+from app.database.mongo import AsyncMongoDB
+from app.database.pinecone_utils import embeddings
+from app.core.answer_cache import answer_cache
+from app.core.context_compaction import context_compactor
+from app.core.memory import memory_summarizer
+from app.core import metrics
+from app.config import settings
+from app.utils.pagination import page_params
+from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
+from contextlib import AsyncExitStack
+import json
+import time
 
 router = APIRouter()
 
+class SlotStreamingResponse(StreamingResponse):
+    """StreamingResponse that releases the admission slot held in `stack` however the response ends."""
+
+    def __init__(self, content, stack: AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.stack = stack
+
+    async def __call__(self, scope, receive, send):
+        # Starlette skips background tasks on client disconnect, so release here instead
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.stack.aclose()
+
+# Component statistics of this worker, exported as /metrics gauges (operators only, never per user)
+COMPONENT_STATS = {
+    "admission": chat_admission.stats,
+    "agent_factory": agent_factory.stats,
+    "embedding_cache": lambda: embeddings.stats(),  # without creating the client at import
+    "answer_cache": answer_cache.stats,
+    "context_compaction": context_compactor.stats,
+    "memory": memory_summarizer.stats
+}
+for component, stats in COMPONENT_STATS.items():
+    metrics.registry.register_stats(component, stats)
+
 class QueryRequest(BaseModel):
     query: str  # User's chat query
     doc_ids: Optional[List[str]] = None  # Optional list of document IDs to search
+    bypass_cache: bool = False  # Skip the semantic answer cache for this request
+    timings: bool = False  # Include a per-stage latency breakdown in the response
+
+def _tool_calls(intermediate_steps) -> List[Dict[str, Any]]:
+    # Summarize the agent's tool invocations for the client
+    tool_calls = []
+    for action, _ in intermediate_steps:
+        tool_calls.append({
+            "tool": getattr(action, "tool", None),
+            "input": getattr(action, "tool_input", {})
+        })
+    return tool_calls
+
+def _sse(event: str, data: Any) -> str:
+    # Format a single Server-Sent Event frame
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _token_text(chunk) -> str:
+    # Gemini chunks carry either a plain string or a list of content parts
+    content = getattr(chunk, "content", "")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+async def _check_answer_cache(body: QueryRequest, user_id: str):
+    # Returns (query_vector, cached_hit); the vector is reused to store the fresh answer
+    if not settings.ANSWER_CACHE_ENABLED or body.bypass_cache:
+        return None, None
+    try:
+        with metrics.span("answer_cache.embed"):
+            vector = await embeddings.aembed_query(body.query)
+        with metrics.span("answer_cache.lookup"):
+            hit = await answer_cache.lookup(user_id, body.doc_ids, vector)
+        metrics.record("answer_cache_hits" if hit else "answer_cache_misses")
+        return vector, hit
+    except Exception:
+        return None, None  # the cache must never fail a chat request
+
+async def _serve_cached(body: QueryRequest, user_id: str, hit: dict):
+    # Keep the conversation history consistent even when the agent is skipped
+    await agent_factory.history(user_id).aadd_messages([
+        HumanMessage(content=body.query),
+        AIMessage(content=hit["answer"])
+    ])
+
+async def _shareable(user_id: str, vector) -> bool:
+    # Answers may be shared with other users only when no earlier conversation was in the prompt;
+    # checked before the agent runs (it saves the new turn)
+    if vector is None or not settings.ANSWER_CACHE_SHARED:
+        return False
+    try:
+        return not await AsyncMongoDB.has_chat_history(user_id)
+    except Exception:
+        return False
+
+async def _remember_answer(body: QueryRequest, user_id: str, vector, answer: str, tool_calls: list,
+                           shareable: bool = False):
+    # Only document-grounded answers are cached; general chat depends too much on history
+    if vector is None or not answer or not tool_calls:
+        return
+    try:
+        await answer_cache.store(user_id, body.doc_ids, body.query, vector, answer, tool_calls, shareable)
+    except Exception:
+        pass
 
 @router.post("/query")
 async def chat_query(
@@ -19,37 +122,132 @@ async def chat_query(
     user_id: str = Depends(JWTBearer())
 ) -> Dict[str, Any]:
     """Handle chat query and return agent's response and tool calls."""
-    try:
-        agent = create_agent(user_id=user_id, doc_ids=body.doc_ids)
+    # Every stage below records its span into this request's timings (and /metrics)
+    with metrics.track_request() as timings:
+        result = await _answer_query(body, user_id)
+    if body.timings and isinstance(result, dict):
+        result["timings"] = timings.report()
+    return result
+
+async def _answer_query(body: QueryRequest, user_id: str):
+    # Serve near-identical questions over the same documents from the answer cache
+    vector, hit = await _check_answer_cache(body, user_id)
+    if hit:
+        await _serve_cached(body, user_id, hit)
+        return {"response": {"answer": hit["answer"], "tool_calls": hit["tool_calls"], "cached": True}}
 
-        response = agent.invoke({"input": body.query})
+    # Admission control: bounded concurrent agent runs, 429/503 when overloaded
+    waiting = time.perf_counter()
+    async with chat_admission.slot():
+        metrics.observe("chat.admission_wait", time.perf_counter() - waiting)
+        try:
+            shareable = await _shareable(user_id, vector)
+            # Cheap per-request bind on the process-wide agent factory
+            agent = create_agent(user_id=user_id, doc_ids=body.doc_ids)
 
-        answer = response.get("output", "")
-        intermediate_steps = response.get("intermediate_steps", [])
+            # Async execution: LLM calls, tool calls and memory reads/writes all yield to the loop
+            with metrics.span("agent.run"):
+                response = await agent.ainvoke({"input": body.query})
 
-        tool_calls = []
-        for action, _ in intermediate_steps:
-            tool_calls.append({
-                "tool": getattr(action, "tool", None),
-                "input": getattr(action, "tool_input", {})
-            })
+            answer = response.get("output", "")
+            tool_calls = _tool_calls(response.get("intermediate_steps", []))
+            await _remember_answer(body, user_id, vector, answer, tool_calls, shareable)
 
-        return {
-            "response": {
-                "answer": answer,
-                "tool_calls": tool_calls
+            return {
+                "response": {
+                    "answer": answer,
+                    "tool_calls": tool_calls,
+                    "cached": False
+                }
             }
-        }
 
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": str(e)})
+
+@router.post("/stream")
+async def chat_stream(
+    body: QueryRequest,
+    user_id: str = Depends(JWTBearer())
+):
+    """
+    Stream the agent's progress as Server-Sent Events.
+    Emits `tool_start`/`tool_end` while searching, `token` for answer tokens,
+    then `done` with the full answer and tool calls (or `error`).
+    """
+    # The response is streamed from this request's context, so the timings follow it
+    timings = metrics.attach_request()
+
+    def done(payload: dict) -> str:
+        if body.timings:
+            payload["timings"] = timings.report()
+        return _sse("done", payload)
+
+    vector, hit = await _check_answer_cache(body, user_id)
+    if hit:
+        async def cached_stream():
+            try:
+                await _serve_cached(body, user_id, hit)
+                yield done({"answer": hit["answer"], "tool_calls": hit["tool_calls"], "cached": True})
+            except Exception as e:
+                yield _sse("error", {"error": str(e)})
+        return StreamingResponse(
+            cached_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    # Take the admission slot before the response starts so overload still maps to 429/503;
+    # it is released when the stream finishes, the client disconnects or the response fails.
+    stack = AsyncExitStack()
+    with metrics.span("chat.admission_wait"):
+        await stack.enter_async_context(chat_admission.slot())
+
+    async def event_stream():
+        try:
+            shareable = await _shareable(user_id, vector)
+            agent = create_agent(user_id=user_id, doc_ids=body.doc_ids)
+
+            # Run through ainvoke (async memory load/save persists the turn to chat_histories)
+            # and observe nested LLM/tool runs through the event stream.
+            runnable = RunnableLambda(agent.ainvoke).with_config(run_name="chat_stream")
+
+            async for event in runnable.astream_events({"input": body.query}, version="v2"):
+                kind = event["event"]
+                if kind == "on_custom_event" and event["name"] == "search_started":
+                    yield _sse("tool_start", {"tool": "search_documents", **event["data"]})
+                elif kind == "on_custom_event" and event["name"] == "search_results":
+                    yield _sse("tool_end", {"tool": "search_documents", **event["data"]})
+                elif kind == "on_chat_model_stream":
+                    text = _token_text(event["data"]["chunk"])
+                    if text:
+                        yield _sse("token", {"text": text})
+                elif kind == "on_chain_end" and event["name"] == "chat_stream":
+                    output = event["data"]["output"]
+                    answer = output.get("output", "")
+                    tool_calls = _tool_calls(output.get("intermediate_steps", []))
+                    yield done({"answer": answer, "tool_calls": tool_calls, "cached": False})
+                    await _remember_answer(body, user_id, vector, answer, tool_calls, shareable)
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+        finally:
+            await stack.aclose()
+
+    try:
+        return SlotStreamingResponse(
+            event_stream(),
+            stack,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except BaseException:
+        await stack.aclose()
+        raise
 
 @router.delete("/delete")
 async def delete_chat(user_id: str = Depends(JWTBearer())):
     """Delete all chat history for the authenticated user."""
     try:
-        result = db.chat_histories.delete_many({"SessionId": str(user_id)})
-        deleted_count = result.deleted_count
+        deleted_count = await AsyncMongoDB.delete_chat_history(user_id)
         if deleted_count == 0:
             return {"status": "not_found", "message": "No chat history found for user."}
         return {"status": "success", "message": f"Deleted {deleted_count} chat history records."}
@@ -57,15 +255,18 @@ async def delete_chat(user_id: str = Depends(JWTBearer())):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/all")
-async def get_all_chats(user_id: str = Depends(JWTBearer())):
+async def get_all_chats(
+    limit: Optional[int] = Query(None, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields: History, SessionId"),
+    user_id: str = Depends(JWTBearer())
+):
     """
-    Get all chat history records for the authenticated user.
-    Returns a list of chat documents.
+    Get one page of chat history records for the authenticated user, newest first.
+    Pass `next_cursor` back as `cursor` to fetch older messages.
     """
+    limit, cursor, projection = page_params(limit, cursor, fields, {"History", "SessionId"}, default=["History"])
     try:
-        chats = list(db.chat_histories.find({"SessionId": str(user_id)}))
-        for chat in chats:
-            chat["_id"] = str(chat["_id"])
-        return chats
+        return await AsyncMongoDB.get_chat_history_page(user_id, projection, limit, cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
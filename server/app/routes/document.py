@@ -1,94 +1,138 @@
 # FastAPI routes for document upload, URL upload, listing, and deletion
-from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from typing import Optional
 from app.auth.bearer import JWTBearer
-from app.utils.document import process_pdf_background, delete_document_util, download_pdf_async
-from app.database.mongo import MongoDB
+from app.utils.document import delete_document_util, delete_all_documents_util, content_vector_ids
+from app.database.mongo import AsyncMongoDB
+from app.core.ingestion_queue import ingestion_queue
+from app.core.content_store import content_store
+from app.core.spool import spool_path
+from app.core.answer_cache import answer_cache
+from app.database.vector_store import user_namespace
+from app.utils.pagination import page_params
 from urllib.parse import urlparse
 from fastapi import UploadFile
 import aiofiles
-import asyncio
+import hashlib
 import os
 import uuid
-from bson import ObjectId
 
 router = APIRouter()
 
-def serialize_doc(doc):
-    # Convert ObjectId fields to strings for JSON serialization
-    doc = dict(doc)
-    for k, v in doc.items():
-        if isinstance(v, ObjectId):
-            doc[k] = str(v)
-    return doc
+# Fields a client may request from GET /documents
+DOCUMENT_FIELDS = {"user_id", "doc_id", "file_name", "embedding_status", "content_hash", "url", "error"}
 
 @router.post("/upload")
 async def upload_document(
     file: UploadFile,
-    background_tasks: BackgroundTasks,
     user_id: str = Depends(JWTBearer())
 ):
-    # Handle PDF upload, save to temp, and queue background processing
+    # Handle PDF upload, save to the spool directory, and enqueue an ingestion job
     doc_id = str(uuid.uuid4())
-    tmp_path = f"/tmp/{doc_id}.pdf"
+    spool_name = f"{doc_id}.pdf"
+    tmp_path = spool_path(spool_name)
     file_name = file.filename or f"upload_{doc_id}.pdf"
 
-    # Stream write file to disk
+    # Stream write file to disk, hashing the content on the way
+    digest = hashlib.sha256()
     async with aiofiles.open(tmp_path, "wb") as f:
         while chunk := await file.read(1024 * 1024):  # 1MB chunks
+            digest.update(chunk)
             await f.write(chunk)
+    content_hash = digest.hexdigest()
 
-    MongoDB.insert_document({
+    namespace = user_namespace(user_id)
+    await AsyncMongoDB.insert_document({
         "user_id": user_id,
         "doc_id": doc_id,
         "file_name": file_name,
+        "content_hash": content_hash,
+        "vector_namespace": namespace,
         "embedding_status": "pending"
     })
-    background_tasks.add_task(process_pdf_background, tmp_path, user_id, doc_id, file_name)
+
+    # The user already has identical content embedded: reference its vectors and finish immediately
+    blob = await content_store.acquire(user_id, content_hash, namespace, doc_id)
+    if blob["status"] == "complete":
+        os.unlink(tmp_path)
+        await AsyncMongoDB.update_document(user_id, doc_id, {
+            "embedding_status": "complete",
+            "vector_ids": content_vector_ids(content_hash, blob["chunk_count"])
+        })
+        await answer_cache.invalidate_document(user_id, doc_id)
+        return {"status": "complete", "document_id": doc_id, "deduplicated": True}
+
+    await ingestion_queue.enqueue(
+        user_id, doc_id, file_name,
+        {"type": "file", "name": spool_name, "content_hash": content_hash}
+    )
     return {"status": "queued", "document_id": doc_id}
 
 
 @router.post("/upload_url")
 async def upload_from_url(
     url: str,
-    background_tasks: BackgroundTasks,
     user_id: str = Depends(JWTBearer())
 ):
     """Queue a PDF document upload from a URL for the authenticated user."""
     try:
         parsed_url = urlparse(url)
+        if parsed_url.scheme not in ("http", "https"):
+            raise ValueError("Only http(s) URLs can be ingested")
         file_name = os.path.basename(parsed_url.path)
         if not file_name or not file_name.lower().endswith(".pdf"):
             raise ValueError("URL does not point to a valid PDF file")
         doc_id = str(uuid.uuid4())
 
-        MongoDB.insert_document({
+        await AsyncMongoDB.insert_document({
             "user_id": user_id,
             "doc_id": doc_id,
             "url": url,
             "file_name": file_name,
+            "vector_namespace": user_namespace(user_id),
             "embedding_status": "pending"
         })
 
-        # Sync wrapper for BackgroundTasks to run async download and processing
-        def download_and_process():
-            # Run async download + processing inside thread-safe loop
-            asyncio.run(_download_and_process(url, user_id, doc_id, file_name))
-        background_tasks.add_task(download_and_process)
+        # The ingestion worker downloads and processes the file
+        await ingestion_queue.enqueue(user_id, doc_id, file_name, {"type": "url", "url": url})
 
         return {"status": "queued", "document_id": doc_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Helper for background download and processing
-async def _download_and_process(url: str, user_id: str, doc_id: str, file_name: str):
-    tmp_path = await download_pdf_async(url)
-    await process_pdf_background(tmp_path, user_id, doc_id, file_name)
-
 @router.get("/documents")
-async def get_documents(user_id: str = Depends(JWTBearer())):
-    """Get all documents for the authenticated user."""
-    docs = MongoDB.get_documents(user_id)
-    return [serialize_doc(doc) for doc in docs] if docs else []
+async def get_documents(
+    limit: Optional[int] = Query(None, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields, e.g. file_name,embedding_status"),
+    user_id: str = Depends(JWTBearer())
+):
+    """Get one page of the authenticated user's documents, newest first."""
+    limit, cursor, projection = page_params(
+        limit, cursor, fields, DOCUMENT_FIELDS, default=["doc_id", "file_name", "embedding_status"]
+    )
+    return await AsyncMongoDB.get_documents_page(user_id, projection, limit, cursor)
+
+@router.get("/status/{doc_id}")
+async def get_document_status(doc_id: str, user_id: str = Depends(JWTBearer())):
+    """Get ingestion status and per-stage progress for a document."""
+    doc = await AsyncMongoDB.get_document(user_id, doc_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found or not authorized")
+    job = await ingestion_queue.latest(user_id, doc_id)
+    return {
+        "doc_id": doc_id,
+        "embedding_status": doc.get("embedding_status"),
+        "job": {
+            "status": job["status"],
+            "attempts": job["attempts"],
+            "max_attempts": job["max_attempts"],
+            "progress": job.get("progress", {}),
+            "metrics": job.get("metrics"),
+            "error": job.get("error"),
+            "next_run_at": job.get("next_run_at")
+        } if job else None
+    }
 
 @router.delete("/document/{doc_id}")
 async def delete_document(doc_id: str, user_id: str = Depends(JWTBearer())):
@@ -100,3 +144,11 @@ async def delete_document(doc_id: str, user_id: str = Depends(JWTBearer())):
         return {"status": "success", "message": "Document deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/documents/all")
+async def delete_all_documents(user_id: str = Depends(JWTBearer())):
+    """Delete all documents of the authenticated user, dropping their vector namespace."""
+    result = await delete_all_documents_util(user_id)
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result["message"])
+    return {"status": "success", "deleted": result["deleted"]}
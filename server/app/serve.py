@@ -0,0 +1,70 @@
+# Production entry point: runs app.main:app in several uvicorn worker processes.
+#   python -m app.serve [--workers N] [--host 0.0.0.0] [--port 8000]
+# Workers are spawned fresh (not forked from a process holding clients) and each builds its
+# own clients in the lifespan handler. The time until the first worker reports ready is logged.
+import argparse
+import glob
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+import uvicorn
+from app.config import settings
+
+logger = logging.getLogger("app.serve")
+
+
+def _report_ready(port: int, started: float, timeout: float = 300.0):
+    # Poll GET /ready on this host and log the measured startup time
+    url = f"http://127.0.0.1:{port}/ready"
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    logger.info("Ready after %.2fs", time.perf_counter() - started)
+                    return
+        except Exception:
+            pass
+        time.sleep(0.25)
+    logger.warning("Not ready after %.0fs, check the worker logs", timeout)
+
+
+def _prepare_metrics_dir(workers: int):
+    # Workers share metric snapshots, so /metrics covers the whole server whichever worker answers
+    if not settings.METRICS_ENABLED or (workers < 2 and not settings.METRICS_MULTIPROCESS_DIR):
+        return
+    directory = settings.METRICS_MULTIPROCESS_DIR or tempfile.mkdtemp(prefix="studyai_metrics_")
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+        os.unlink(path)  # counters start over with the server, as they would in a single process
+    os.environ["METRICS_MULTIPROCESS_DIR"] = directory  # inherited by the spawned workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the StudyAI API with multiple workers")
+    parser.add_argument("--host", default=settings.APP_HOST)
+    parser.add_argument("--port", type=int, default=settings.APP_PORT)
+    parser.add_argument("--workers", type=int, default=settings.APP_WORKERS or os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    started = time.perf_counter()
+    _prepare_metrics_dir(args.workers)
+    logger.info("Starting %d worker(s) on %s:%d", args.workers, args.host, args.port)
+    threading.Thread(target=_report_ready, args=(args.port, started), daemon=True).start()
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        proxy_headers=True,
+        timeout_graceful_shutdown=30
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,185 @@
-# Utilities for processing, embedding, and deleting PDF documents asynchronously
-from app.database.mongo import db
-from app.database.pinecone_utils import embeddings, index
-from langchain_community.document_loaders import PyPDFLoader
+# Utilities for processing, embedding, and deleting PDF documents
+from app.database.mongo import AsyncMongoDB
+from app.database.pinecone_utils import embeddings, vector_store
+from app.database.vector_store import user_namespace
+from app.database.lexical_index import lexical_index
+from app.core.answer_cache import answer_cache
+from app.core.ingestion_queue import ingestion_queue, PermanentIngestionError
+from app.core.content_store import content_store, content_blob_id
+from app.config import settings
+from app.utils.pdf_parse import iter_page_ranges
+from app.utils.ingest_engine import EmbeddingUpsertEngine
+from app.core import metrics
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_pinecone import PineconeVectorStore
-import uuid
-import os
+from concurrent.futures import ProcessPoolExecutor
+from pypdf.errors import PdfReadError
+import multiprocessing
+import threading
+import time
 import asyncio
-import httpx
-import aiofiles
 
-# Synchronous function to parse, chunk, embed, and store PDF in Pinecone and MongoDB
-def _process_pdf_sync(file_path: str, user_id: str, doc_id: str, file_name: str):
-    vector_store = PineconeVectorStore(index=index, embedding=embeddings)
-    loader = PyPDFLoader(file_path)
-    docs = loader.load()
+# Process pool for CPU-bound PDF text extraction, shared by all jobs in this process
+_parse_executor = None
+_parse_executor_lock = threading.Lock()
 
+def _get_parse_executor():
+    global _parse_executor
+    if settings.INGEST_PARSE_PROCESSES <= 0:
+        return None
+    with _parse_executor_lock:
+        if _parse_executor is None:
+            # spawn: never fork a process that already runs client threads
+            _parse_executor = ProcessPoolExecutor(
+                max_workers=settings.INGEST_PARSE_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+    return _parse_executor
+
+# Synchronous streaming pipeline: parse page ranges (process pool) -> split per page ->
+# batched, concurrent embedding and upserts (EmbeddingUpsertEngine), plus the BM25 keyword
+# index entries of each page range. Parsing stops ahead of
+# a slow embedding stage (bounded in-flight batches), so memory stays flat regardless of
+# document size. Vectors are keyed by content hash and written to the user's namespace, shared
+# by all of that user's documents with the same bytes; ownership lives in `content_blobs`.
+# `progress` (optional) receives stage counters: pages_parsed, chunks_total, chunks_embedded,
+# vectors_upserted. Returns the engine's throughput metrics plus page/chunk totals, with the
+# seconds spent per stage (parse, split, index, embed, upsert) in `stage_seconds`.
+def _process_pdf_sync(file_path: str, content_hash: str, namespace: str, progress=None) -> dict:
+    progress = progress or (lambda **fields: None)
     splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    docs = splitter.split_documents(docs)
+    executor = _get_parse_executor()
+    pages_parsed = 0
+    chunks_total = 0
+    stage_seconds = {"parse": 0.0, "split": 0.0, "index": 0.0}
 
-    for doc in docs:
-        doc.metadata.update({
-            "text": doc.page_content,
-            "user_id": user_id,
-            "doc_id": doc_id,
-            "source": file_name,
-            "page": (doc.metadata.get("page") or 0) + 1
-        })
+    def timed(stage, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            stage_seconds[stage] += elapsed
+            metrics.observe(f"ingest.{stage}", elapsed)
 
-    vector_store.add_documents(docs)
-    db.documents.update_one(
-        {"doc_id": doc_id, "user_id": user_id},
-        {"$set": {"embedding_status": "complete"}}
-    )
+    store = vector_store.namespace(namespace)
+    with EmbeddingUpsertEngine(embeddings, store, progress=progress) as engine:
+        try:
+            page_ranges = iter_page_ranges(
+                file_path,
+                executor=executor,
+                pages_per_task=settings.INGEST_PAGES_PER_TASK,
+                window=max(settings.INGEST_PARSE_PROCESSES, 1) * 2
+            )
+            # Parse time is what this thread waits for the next page range
+            while (pages := timed("parse", next, page_ranges, None)) is not None:
+                lexical = []
+                for page_number, text in pages:
+                    for chunk in timed("split", splitter.split_text, text):
+                        # Deterministic vector IDs make a retried job overwrite instead of duplicating chunks
+                        vector_id = content_vector_id(content_hash, chunks_total)
+                        metadata = {"content_hash": content_hash, "page": page_number + 1}
+                        engine.add(chunk, {"text": chunk, **metadata}, vector_id)
+                        lexical.append((vector_id, chunk, metadata))
+                        chunks_total += 1
+                timed("index", lexical_index.add_chunks, content_hash, lexical)
+                pages_parsed += len(pages)
+                progress(pages_parsed=pages_parsed, chunks_total=chunks_total)
+                if engine.error():
+                    break  # stop parsing; the failure is raised when the engine closes
+        except PdfReadError as e:
+            # A file that cannot be parsed will not parse on retry either
+            raise PermanentIngestionError(f"Could not parse PDF: {e}")
 
-# Async wrapper for background PDF processing
-async def process_pdf_background(file_path: str, user_id: str, doc_id: str, file_name: str):
-    """Run PDF processing in a background thread and update status in MongoDB."""
-    try:
-        await asyncio.to_thread(_process_pdf_sync, file_path, user_id, doc_id, file_name)
-    except Exception as e:
-        db.documents.update_one(
-            {"doc_id": doc_id, "user_id": user_id},
-            {"$set": {"embedding_status": "failed", "error": str(e)}}
+    timed("index", lexical_index.finish_content, content_hash, chunks_total)
+    result = {**engine.metrics(), "pages": pages_parsed, "chunks_total": chunks_total}
+    result["stage_seconds"] = {**{k: round(v, 3) for k, v in stage_seconds.items()}, **result["stage_seconds"]}
+    return result
+
+# Vector ID of the i-th chunk of a content hash
+def content_vector_id(content_hash: str, i: int) -> str:
+    return f"{content_hash}#{i}"
+
+# IDs of all vectors of a content hash
+def content_vector_ids(content_hash: str, chunk_count: int) -> list:
+    return [content_vector_id(content_hash, i) for i in range(chunk_count)]
+
+# Copy the vectors of a content hash from another user's namespace (identical PDF),
+# so the embedding model is not called again
+def copy_content_vectors(content_hash: str, chunk_count: int, source: str, target: str) -> dict:
+    source_store, target_store = vector_store.namespace(source), vector_store.namespace(target)
+    ids = content_vector_ids(content_hash, chunk_count)
+    copied = 0
+    for start in range(0, len(ids), settings.INGEST_UPSERT_BATCH_SIZE):
+        found = source_store.fetch(ids[start:start + settings.INGEST_UPSERT_BATCH_SIZE])
+        target_store.upsert([{"id": i, **v} for i, v in found.items()])
+        copied += len(found)
+    if copied < len(ids):
+        raise RuntimeError(f"Only {copied} of {len(ids)} vectors found in namespace {source}")
+    return {"vectors_copied": copied}
+
+# Drop a document's reference to content in its user's namespace; the last one removes the vectors by ID
+async def release_user_content(user_id: str, doc_id: str, content_hash: str, namespace: str, vector_ids=None):
+    blob_id = content_blob_id(user_id, content_hash)
+    purge = await content_store.release(blob_id, doc_id)
+    # No record at all means the user's content was dropped meanwhile (delete all)
+    if not purge and await content_store.exists(blob_id):
+        return
+    store = vector_store.namespace(namespace)
+    chunk_count = purge.get("chunk_count") if purge else None
+    if vector_ids is None and chunk_count is not None:
+        vector_ids = content_vector_ids(content_hash, chunk_count)
+    if vector_ids is not None:
+        await asyncio.to_thread(store.delete, ids=vector_ids)
+    else:
+        # Partially ingested content: IDs unknown, but the filter only scans this user's namespace
+        await asyncio.to_thread(store.delete, filter={"content_hash": content_hash})
+    if purge:
+        await content_store.finish_purge(blob_id)
+    if not await content_store.is_referenced(content_hash):
+        await lexical_index.delete_content(content_hash)
+
+async def _release_document(user_id: str, doc: dict):
+    if doc.get("content_hash"):
+        await release_user_content(
+            user_id, doc["doc_id"], doc["content_hash"], doc["vector_namespace"], doc.get("vector_ids")
         )
-    finally:
-        os.unlink(file_path)
+    elif doc.get("vector_ids"):
+        # Migrated pre-deduplication document: its own vectors
+        store = vector_store.namespace(doc["vector_namespace"])
+        await asyncio.to_thread(store.delete, ids=doc["vector_ids"])
+    # else: URL upload not downloaded yet, the worker cleans up when it finds the document gone
 
-# Download a PDF asynchronously and save to a temp file
-async def download_pdf_async(url: str) -> str:
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        tmp_path = f"/tmp/{uuid.uuid4()}.pdf"
-        async with aiofiles.open(tmp_path, "wb") as f:
-            await f.write(response.content)
-        return tmp_path
-    
-# Download and process a PDF from a URL (helper for background tasks)
-async def download_and_process(url: str, user_id: str, doc_id: str, file_name: str):
-    tmp_path = await download_pdf_async(url)
-    await process_pdf_background(tmp_path, user_id, doc_id, file_name)
+# Vectors of documents from before per-user namespaces are still in the shared default namespace;
+# they are only deleted once `app.migrations.user_namespaces` has moved them
+UNMIGRATED = "Documents from before per-user namespaces cannot be deleted until app.migrations.user_namespaces has run"
 
-# Delete a document from MongoDB and Pinecone
+# Delete a document from MongoDB and the vector store
 async def delete_document_util(doc_id: str, user_id: str) -> dict:
     try:
-        result = db.documents.delete_one({"doc_id": doc_id, "user_id": user_id})
-        if result.deleted_count == 0:
+        doc = await AsyncMongoDB.get_document(user_id, doc_id)
+        if doc and not doc.get("vector_namespace"):
+            return {"success": False, "message": UNMIGRATED}
+        if not doc or not await AsyncMongoDB.delete_document(user_id, doc_id):
             return {"success": False, "message": "Document not found or not authorized"}
-        vector_store = PineconeVectorStore(index=index, embedding=embeddings)
-        await asyncio.to_thread(vector_store.delete, filter={"doc_id": doc_id})
+        await ingestion_queue.cancel(user_id, doc_id)
+        await _release_document(user_id, doc)
+        await answer_cache.invalidate_document(user_id, doc_id)
         return {"success": True}
     except Exception as e:
         return {"success": False, "message": str(e)}
+
+# Delete all of a user's documents: their vectors go with one namespace delete
+async def delete_all_documents_util(user_id: str) -> dict:
+    try:
+        if await AsyncMongoDB.has_unmigrated_documents(user_id):
+            return {"success": False, "message": UNMIGRATED}
+        deleted = await AsyncMongoDB.delete_user_documents(user_id)
+        await ingestion_queue.cancel(user_id)
+        await asyncio.to_thread(vector_store.delete_namespace, user_namespace(user_id))
+        for content_hash in await content_store.drop_user(user_id):
+            if not await content_store.is_referenced(content_hash):
+                await lexical_index.delete_content(content_hash)
+        await answer_cache.invalidate_user(user_id)
+        return {"success": True, "deleted": deleted}
+    except Exception as e:
+        return {"success": False, "message": str(e)}
@@ -0,0 +1,228 @@
+# URL ingestion: PDFs are streamed to the spool directory through one pooled HTTP client per
+# process, hashed on the way, with size and time limits. The ETag/Last-Modified of every fetched
+# URL is remembered, so a re-submitted URL whose content is already embedded is only revalidated.
+# Redirects are followed by hand so every hop is checked to be http(s); connections are only opened
+# to public addresses, checked at connect time on the very address connected to.
+import asyncio
+import hashlib
+import ipaddress
+import os
+import socket
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+import aiofiles
+import httpcore
+import httpx
+from app.config import settings
+from app.core import metrics
+from app.core.content_store import content_store
+from app.core.ingestion_queue import PermanentIngestionError
+from app.core.spool import spool_path
+from app.database.mongo import db
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+async def _resolve(host: str, port: int) -> list:
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return list(dict.fromkeys(info[4][0] for info in infos))
+
+
+class _PublicAddressBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend that resolves the host itself and connects to the checked address, so a
+    second DNS answer (rebinding) cannot send the connection elsewhere. TLS still uses the
+    hostname (SNI, certificate check) and the request keeps its Host header.
+    """
+
+    def __init__(self, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self._backend = backend or httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            addresses = await _resolve(host, port)
+        except socket.gaierror as e:
+            raise httpcore.ConnectError(f"Cannot resolve {host}: {e}") from e
+        if not settings.DOWNLOAD_ALLOW_PRIVATE_HOSTS:
+            # Internal services (cloud metadata, the database, the admin network) are never reached
+            for address in addresses:
+                if not ipaddress.ip_address(address.split("%")[0]).is_global:
+                    raise PermanentIngestionError(f"Download host {host} resolves to a non-public address")
+        error = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error or httpcore.ConnectError(f"No address for {host}")
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        raise httpcore.ConnectError("Unix sockets are not used for downloads")
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+class _PublicAddressTransport(httpx.AsyncHTTPTransport):
+    # httpx takes no network backend, so the connection pool is built here with the checking one
+    def __init__(self, limits: httpx.Limits, network_backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        super().__init__(limits=limits)
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=_PublicAddressBackend(network_backend)
+        )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    # Created on first use, closed by close_http_client() at shutdown
+    global _client
+    if _client is None or _client.is_closed:
+        limits = httpx.Limits(
+            max_connections=settings.DOWNLOAD_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.DOWNLOAD_MAX_CONNECTIONS
+        )
+        _client = httpx.AsyncClient(
+            transport=_PublicAddressTransport(limits),
+            trust_env=False,  # an environment proxy would resolve hosts itself, unchecked
+            follow_redirects=False,  # see _open
+            timeout=httpx.Timeout(settings.DOWNLOAD_READ_TIMEOUT, connect=settings.DOWNLOAD_CONNECT_TIMEOUT),
+            headers={"User-Agent": "StudyAI/1.0"}
+        )
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class UrlCache:
+    """Validators and content hash of the last successful download of each URL (`url_cache`)."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, url: str) -> Optional[dict]:
+        return await self.collection.find_one({"_id": url})
+
+    async def put(self, url: str, content_hash: str, size: int, etag: Optional[str], last_modified: Optional[str]):
+        await self.collection.update_one(
+            {"_id": url},
+            {"$set": {
+                "content_hash": content_hash,
+                "size": size,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched_at": datetime.now(timezone.utc)
+            }},
+            upsert=True
+        )
+
+    async def touch(self, url: str):
+        await self.collection.update_one({"_id": url}, {"$set": {"fetched_at": datetime.now(timezone.utc)}})
+
+
+url_cache = UrlCache(db.url_cache)
+
+
+async def _conditional_headers(url: str) -> Tuple[dict, Optional[dict]]:
+    # Only worth revalidating when the cached content is still embedded somewhere
+    cached = await url_cache.get(url)
+    if not cached or not (cached.get("etag") or cached.get("last_modified")):
+        return {}, None
+    if not await content_store.find_complete(cached["content_hash"]):
+        return {}, None
+    headers = {}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    return headers, cached
+
+
+async def _stream_to_spool(response: httpx.Response) -> Tuple[str, str, int]:
+    declared = response.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > settings.DOWNLOAD_MAX_BYTES:
+        raise PermanentIngestionError(f"Remote file is larger than {settings.DOWNLOAD_MAX_BYTES} bytes")
+    digest = hashlib.sha256()
+    size = 0
+    path = spool_path(f"{uuid.uuid4()}.pdf")
+    try:
+        async with aiofiles.open(path, "wb") as f:
+            async for chunk in response.aiter_bytes(64 * 1024):
+                size += len(chunk)
+                # Content-Length may be missing or wrong: the limit applies to the bytes received
+                if size > settings.DOWNLOAD_MAX_BYTES:
+                    raise PermanentIngestionError(f"Remote file is larger than {settings.DOWNLOAD_MAX_BYTES} bytes")
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.unlink(path)
+        raise
+    return path, digest.hexdigest(), size
+
+
+def _check_url(url: httpx.URL):
+    # Only http(s); the address is checked when the connection is opened (_PublicAddressBackend)
+    if url.scheme not in ("http", "https"):
+        raise PermanentIngestionError(f"Unsupported URL scheme: {url.scheme or 'none'}")
+    if not url.host:
+        raise PermanentIngestionError("Download URL has no host")
+
+
+async def _open(url: str, headers: dict) -> httpx.Response:
+    # Streamed GET that follows up to DOWNLOAD_MAX_REDIRECTS redirects, checking every hop
+    client = get_http_client()
+    target = httpx.URL(url)
+    for _ in range(settings.DOWNLOAD_MAX_REDIRECTS + 1):
+        _check_url(target)
+        response = await client.send(client.build_request("GET", target, headers=headers), stream=True)
+        if not response.is_redirect:
+            return response
+        await response.aclose()
+        target = response.url.join(response.headers["location"])
+    raise PermanentIngestionError(f"More than {settings.DOWNLOAD_MAX_REDIRECTS} redirects")
+
+
+async def _download(url: str, conditional: bool) -> Tuple[Optional[str], str]:
+    headers, cached = await _conditional_headers(url) if conditional else ({}, None)
+    response = await _open(url, headers)
+    try:
+        if response.status_code == 304 and cached:
+            metrics.count("url_not_modified")
+            await url_cache.touch(url)
+            return None, cached["content_hash"]
+        if 400 <= response.status_code < 500:
+            raise PermanentIngestionError(f"Download failed with HTTP {response.status_code}")
+        response.raise_for_status()
+        path, content_hash, size = await _stream_to_spool(response)
+    finally:
+        await response.aclose()
+    metrics.count("url_downloads")
+    metrics.count("url_download_bytes", size)
+    await url_cache.put(url, content_hash, size, response.headers.get("etag"), response.headers.get("last-modified"))
+    return path, content_hash
+
+
+async def download_pdf_async(url: str, conditional: bool = True) -> Tuple[Optional[str], str]:
+    """
+    Fetch a PDF into the spool directory and return (path, sha256). When the URL is unchanged
+    since an earlier download whose content is still embedded, returns (None, sha256) instead.
+    """
+    with metrics.span("ingest.download"):
+        try:
+            return await asyncio.wait_for(_download(url, conditional), timeout=settings.DOWNLOAD_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Covers slow-drip servers that never trip the per-read timeout; retried later
+            raise TimeoutError(f"Download took longer than {settings.DOWNLOAD_TIMEOUT}s")
+        except httpx.InvalidURL as e:
+            raise PermanentIngestionError(f"Invalid download URL: {e}")
@@ -0,0 +1,207 @@
+# Ingestion-side embedding + vector upsert engine: tunable batches, bounded concurrency,
+# adaptive backoff on rate limits and per-batch retries
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from app.config import settings
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def is_rate_limited(error: Exception) -> bool:
+    # Gemini surfaces 429 as RESOURCE_EXHAUSTED, Pinecone as an HTTP 429 status
+    status = getattr(error, "status", None) or getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status == 429:
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message or "rate limit" in message.lower()
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Thread-safe AIMD limiter: the allowed concurrency halves on every rate-limit
+    response and creeps back up by one slot per `recovery` successful calls.
+    """
+
+    def __init__(self, max_limit: int, recovery: int = 10):
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.recovery = recovery
+        self.active = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.active >= max(int(self.limit), 1):
+                self._cond.wait()
+            self.active += 1
+
+    def release(self, success: bool = True):
+        with self._cond:
+            self.active -= 1
+            if success:
+                self.limit = min(self.max_limit, self.limit + 1 / self.recovery)
+            self._cond.notify_all()
+
+    def throttle(self):
+        with self._cond:
+            self.limit = max(1.0, self.limit / 2)
+
+
+# Rate limits are per API key, so limiters are shared by every job in the process
+embedding_limiter = AdaptiveConcurrencyLimiter(settings.INGEST_EMBED_CONCURRENCY)
+upsert_limiter = AdaptiveConcurrencyLimiter(settings.INGEST_UPSERT_CONCURRENCY)
+
+
+class EmbeddingUpsertEngine:
+    """
+    Accepts chunks as they are produced, embeds them in batches of INGEST_EMBED_BATCH_SIZE
+    and upserts the vectors in parallel batches of INGEST_UPSERT_BATCH_SIZE. A failed batch
+    is retried on its own; only a batch that exhausts its retries fails the document.
+    Usage: `with EmbeddingUpsertEngine(...) as engine: engine.add(...)`, then `engine.metrics()`.
+    """
+
+    def __init__(self, embeddings, store, progress=None):
+        self.embeddings = embeddings
+        self.store = store
+        self.progress = progress or (lambda **fields: None)
+        self.embed_batch_size = settings.INGEST_EMBED_BATCH_SIZE
+        self.upsert_batch_size = settings.INGEST_UPSERT_BATCH_SIZE
+        self.max_retries = settings.INGEST_BATCH_MAX_RETRIES
+
+        self._embed_pool = ThreadPoolExecutor(max_workers=settings.INGEST_EMBED_CONCURRENCY)
+        self._upsert_pool = ThreadPoolExecutor(max_workers=settings.INGEST_UPSERT_CONCURRENCY)
+        # Bounds memory: the producer blocks while this many embedding batches are pending
+        self._in_flight = threading.BoundedSemaphore(settings.INGEST_EMBED_CONCURRENCY * 2)
+        self._futures = []
+        self._pending = ([], [], [])
+        self._lock = threading.Lock()
+
+        self.chunks_embedded = 0
+        self.vectors_upserted = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.stage_seconds = {"embed": 0.0, "upsert": 0.0}  # time inside the API calls
+        self._started = time.perf_counter()
+        self._finished = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._shutdown()
+        return False
+
+    def add(self, text: str, metadata: dict, vector_id: str):
+        texts, metadatas, ids = self._pending
+        texts.append(text)
+        metadatas.append(metadata)
+        ids.append(vector_id)
+        if len(texts) >= self.embed_batch_size:
+            self._submit()
+
+    def error(self):
+        # First failure among finished batches (None when all is well)
+        return next((f.exception() for f in self._futures if f.done() and f.exception()), None)
+
+    def close(self):
+        # Flush the last partial batch, wait for everything and raise the first failure
+        if self._pending[0] and not self.error():
+            self._submit()
+        self._shutdown()
+        self._finished = time.perf_counter()
+        error = self.error()
+        if error:
+            raise error
+        totals = self.metrics()
+        logger.info(
+            "Embedded %d chunks, upserted %d vectors in %.1fs (%.1f chunks/s, %d retries, %d rate-limited)",
+            self.chunks_embedded, self.vectors_upserted, totals["seconds"],
+            totals["chunks_per_sec"], self.retries, self.rate_limited
+        )
+
+    def metrics(self) -> dict:
+        elapsed = (self._finished or time.perf_counter()) - self._started
+        return {
+            "chunks_embedded": self.chunks_embedded,
+            "vectors_upserted": self.vectors_upserted,
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(self.chunks_embedded / elapsed, 2) if elapsed > 0 else 0.0,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "stage_seconds": {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()}
+        }
+
+    def _shutdown(self):
+        self._embed_pool.shutdown(wait=True)
+        self._upsert_pool.shutdown(wait=True)
+
+    def _submit(self):
+        batch = self._pending
+        self._pending = ([], [], [])
+        self._in_flight.acquire()
+        self._futures.append(self._embed_pool.submit(self._embed_and_upsert, *batch))
+
+    def _with_retry(self, limiter: AdaptiveConcurrencyLimiter, func, *args):
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            try:
+                result = func(*args)
+            except Exception as e:
+                limiter.release(success=False)
+                if attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                if is_rate_limited(e):
+                    with self._lock:
+                        self.rate_limited += 1
+                    limiter.throttle()
+                # Exponential backoff with jitter before retrying just this batch
+                time.sleep(settings.INGEST_BATCH_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+                continue
+            limiter.release(success=True)
+            return result
+
+    def _timed(self, stage: str, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stage_seconds[stage] += elapsed
+            metrics.observe(f"ingest.{stage}", elapsed)
+
+    def _upsert(self, vectors: List[dict]):
+        self._timed("upsert", self.store.upsert, vectors)
+
+    def _embed_and_upsert(self, texts: List[str], metadatas: List[dict], ids: List[str]):
+        try:
+            values = self._with_retry(embedding_limiter, self._timed, "embed", self.embeddings.embed_documents, texts)
+            with self._lock:
+                self.chunks_embedded += len(texts)
+                embedded = self.chunks_embedded
+            self.progress(chunks_embedded=embedded)
+
+            vectors = [
+                {"id": vector_id, "values": vector, "metadata": metadata}
+                for vector_id, vector, metadata in zip(ids, values, metadatas)
+            ]
+            batches = [vectors[i:i + self.upsert_batch_size] for i in range(0, len(vectors), self.upsert_batch_size)]
+            upserts = [self._upsert_pool.submit(self._with_retry, upsert_limiter, self._upsert, b) for b in batches]
+            for future, batch in zip(upserts, batches):
+                future.result()
+                with self._lock:
+                    self.vectors_upserted += len(batch)
+                    upserted = self.vectors_upserted
+                self.progress(vectors_upserted=upserted)
+        finally:
+            self._in_flight.release()
@@ -0,0 +1,20 @@
+# Query parameter handling shared by the cursor-paginated listing endpoints
+from typing import Optional
+from bson import ObjectId
+from fastapi import HTTPException
+from app.config import settings
+
+
+def page_params(limit: Optional[int], cursor: Optional[str], fields: Optional[str],
+                allowed: set, default: list) -> tuple:
+    # Validate limit/cursor and turn `fields=a,b` into a projection list (always with _id)
+    limit = settings.PAGE_DEFAULT_LIMIT if limit is None else limit
+    if not 1 <= limit <= settings.PAGE_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.PAGE_MAX_LIMIT}")
+    if cursor and not ObjectId.is_valid(cursor):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    requested = [f.strip() for f in fields.split(",") if f.strip()] if fields else default
+    unknown = set(requested) - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return limit, cursor, ["_id", *requested]
@@ -0,0 +1,41 @@
+# PDF text extraction that runs inside a process pool; keep this module's imports light
+from collections import deque
+from typing import Iterator, List, Tuple
+from pypdf import PdfReader
+
+
+def count_pages(file_path: str) -> int:
+    return len(PdfReader(file_path).pages)
+
+
+def extract_pages(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    # Extract text for pages [start, end); returns (0-based page number, text) pairs
+    reader = PdfReader(file_path)
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def iter_page_ranges(file_path: str, executor=None, pages_per_task: int = 8,
+                     window: int = 4) -> Iterator[List[Tuple[int, str]]]:
+    """
+    Yield extracted pages in order, one page range at a time. With an executor, up to
+    `window` ranges are parsed ahead in parallel; nothing beyond that is held in memory.
+    """
+    total = count_pages(file_path)
+    ranges = iter([(s, min(s + pages_per_task, total)) for s in range(0, total, pages_per_task)])
+
+    if executor is None:
+        for start, end in ranges:
+            yield extract_pages(file_path, start, end)
+        return
+
+    pending = deque()
+    for start, end in ranges:
+        pending.append(executor.submit(extract_pages, file_path, start, end))
+        if len(pending) >= window:
+            break
+    while pending:
+        pages = pending.popleft().result()
+        next_range = next(ranges, None)
+        if next_range:
+            pending.append(executor.submit(extract_pages, file_path, *next_range))
+        yield pages
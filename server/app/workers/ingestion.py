@@ -0,0 +1,217 @@
+# Ingestion worker pool: drains the durable ingestion queue, separate from the API workers.
+# Run standalone with `python -m app.workers.ingestion`.
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from app.config import settings
+from app.core.answer_cache import answer_cache
+from app.core import metrics
+from app.core.ingestion_queue import ingestion_queue, PermanentIngestionError
+from app.database.mongo import AsyncMongoDB, close_clients
+from app.core.content_store import content_store, content_blob_id, sha256_file
+from app.core.spool import check_spool_dir, spool_path
+from app.database.vector_store import user_namespace
+from app.utils.document import _process_pdf_sync, copy_content_vectors, content_vector_ids, release_user_content
+from app.utils.download import download_pdf_async, close_http_client
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionWorkerPool:
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._tasks = []
+        self._stopping = asyncio.Event()
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker_loop(n)) for n in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._reaper_loop()))
+        logger.info("Ingestion worker %s started with %d slots", self.worker_id, self.concurrency)
+
+    async def stop(self):
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _sleep(self, seconds: float):
+        # Sleep that wakes up early on shutdown
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _reaper_loop(self):
+        # Requeue jobs abandoned by crashed workers
+        while not self._stopping.is_set():
+            try:
+                requeued, failed = await ingestion_queue.requeue_expired()
+                if requeued:
+                    logger.warning("Requeued %d ingestion jobs with expired leases", requeued)
+                for job in failed:
+                    logger.error("Ingestion of %s failed: %s", job["doc_id"], job["error"])
+                    await AsyncMongoDB.update_document(
+                        job["user_id"], job["doc_id"], {"embedding_status": "failed", "error": job["error"]}
+                    )
+                    if job["source"]["type"] == "file":
+                        self._cleanup(spool_path(job["source"]["name"]))
+            except Exception:
+                logger.exception("Lease reaper failed")
+            await self._sleep(settings.INGEST_LEASE_SECONDS / 2)
+
+    async def _worker_loop(self, slot: int):
+        while not self._stopping.is_set():
+            try:
+                job = await ingestion_queue.claim(f"{self.worker_id}/{slot}")
+            except Exception:
+                logger.exception("Failed to claim ingestion job")
+                job = None
+            if job is None:
+                await self._sleep(settings.INGEST_POLL_INTERVAL)
+                continue
+            try:
+                await self.run_job(job)
+            except Exception:
+                # e.g. MongoDB unreachable while recording a failure; the lease reaper retries the job
+                logger.exception("Ingestion job %s crashed", job["_id"])
+
+    async def _heartbeat(self, job: dict, claim: dict):
+        # Extends the job lease (and the content claim) while the job runs, including long
+        # stages that report no progress
+        while True:
+            await asyncio.sleep(settings.INGEST_LEASE_SECONDS / 3)
+            try:
+                if not await ingestion_queue.update_progress(job):
+                    logger.warning("Ingestion job %s is no longer held by this worker", job["_id"])
+                    return
+                if claim.get("blob_id"):
+                    await content_store.extend_claim(claim["blob_id"], str(job["_id"]))
+            except Exception:
+                logger.exception("Heartbeat of ingestion job %s failed", job["_id"])
+
+    async def run_job(self, job: dict):
+        claim = {}
+        heartbeat = asyncio.create_task(self._heartbeat(job, claim))
+        try:
+            await self._run_job(job, claim)
+        finally:
+            heartbeat.cancel()
+
+    async def _run_job(self, job: dict, claim: dict):
+        user_id, doc_id = job["user_id"], job["doc_id"]
+        source = job["source"]
+        loop = asyncio.get_running_loop()
+
+        # Called from the processing thread; hand the write back to the event loop
+        def progress(**fields):
+            asyncio.run_coroutine_threadsafe(ingestion_queue.update_progress(job, fields), loop)
+
+        started = time.perf_counter()
+        file_path = None
+        content_hash = None
+        try:
+            await AsyncMongoDB.update_document(user_id, doc_id, {"embedding_status": "processing"})
+            if source["type"] == "file":
+                file_path = spool_path(source["name"])
+                content_hash = source.get("content_hash") or await asyncio.to_thread(sha256_file, file_path)
+            else:
+                # Hashed while streaming; no file at all when the URL is unchanged and already embedded
+                file_path, content_hash = await download_pdf_async(source["url"])
+
+            # Reference the content in the user's namespace; identical bytes already embedded are reused as-is
+            namespace = user_namespace(user_id)
+            blob_id = content_blob_id(user_id, content_hash)
+            blob = await content_store.acquire(user_id, content_hash, namespace, doc_id)
+            await AsyncMongoDB.update_document(
+                user_id, doc_id, {"content_hash": content_hash, "vector_namespace": namespace}
+            )
+            if blob["status"] == "complete":
+                job_metrics = {"deduplicated": True, "pages": blob.get("page_count"), "chunks_total": blob["chunk_count"]}
+            elif not await content_store.claim_ingestion(blob_id, str(job["_id"])):
+                # Another job is embedding the same content right now; check back later
+                await ingestion_queue.defer(job, settings.INGEST_DEDUP_WAIT)
+                if source["type"] == "url":
+                    self._cleanup(file_path)
+                return
+            else:
+                claim["blob_id"] = blob_id
+                try:
+                    # Another user already has this content: copy their vectors instead of embedding
+                    other = await content_store.find_complete(content_hash)
+                    if other and other.get("namespace") and other["namespace"] != namespace:
+                        copied = await asyncio.to_thread(
+                            copy_content_vectors, content_hash, other["chunk_count"], other["namespace"], namespace
+                        )
+                        job_metrics = {**copied, "copied": True, "pages": other.get("page_count"), "chunks_total": other["chunk_count"]}
+                    else:
+                        if file_path is None:
+                            # The embedded copy was deleted since the revalidation: fetch the bytes after all
+                            file_path, fetched_hash = await download_pdf_async(source["url"], conditional=False)
+                            if fetched_hash != content_hash:
+                                raise RuntimeError("URL content changed during ingestion")
+                        job_metrics = await asyncio.to_thread(_process_pdf_sync, file_path, content_hash, namespace, progress)
+                except Exception:
+                    await content_store.mark_failed(blob_id)
+                    raise
+                await content_store.mark_complete(blob_id, job_metrics["chunks_total"], job_metrics["pages"])
+
+            vector_ids = content_vector_ids(content_hash, job_metrics["chunks_total"])
+            # The document may have been deleted while it was being processed
+            if not await AsyncMongoDB.get_document(user_id, doc_id):
+                await release_user_content(user_id, doc_id, content_hash, namespace, vector_ids)
+            else:
+                await AsyncMongoDB.update_document(
+                    user_id, doc_id, {"embedding_status": "complete", "vector_ids": vector_ids}
+                )
+                # New or re-ingested content makes cached answers for this scope stale; freshly
+                # embedded content also invalidates other users' shared answers over it
+                reused = job_metrics.get("deduplicated") or job_metrics.get("copied")
+                await answer_cache.invalidate_document(user_id, doc_id, None if reused else content_hash)
+            if not await ingestion_queue.complete(job, job_metrics):
+                logger.warning("Ingestion job %s finished after its lease was lost", job["_id"])
+            metrics.observe("ingest.job", time.perf_counter() - started)
+            metrics.count("ingest_jobs_completed")
+            self._cleanup(file_path)
+        except Exception as e:
+            metrics.count("ingest_jobs_failed")
+            permanent = isinstance(e, PermanentIngestionError)
+            retrying = await ingestion_queue.fail(job, str(e), permanent=permanent)
+            logger.warning("Ingestion of %s failed (attempt %d, retrying=%s): %s", doc_id, job["attempts"], retrying, e)
+            if retrying:
+                # Keep an uploaded file for the next attempt; URL sources are downloaded again
+                if source["type"] == "url":
+                    self._cleanup(file_path)
+            else:
+                await AsyncMongoDB.update_document(user_id, doc_id, {"embedding_status": "failed", "error": str(e)})
+                self._cleanup(file_path)
+
+    @staticmethod
+    def _cleanup(file_path):
+        if file_path and os.path.exists(file_path):
+            os.unlink(file_path)
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO)
+    await AsyncMongoDB.ensure_indexes()
+    # Uploaded files are read from the spool directory the API writes to
+    await check_spool_dir()
+    pool = IngestionWorkerPool(settings.INGEST_WORKERS)
+    await pool.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await pool.stop()
+        await close_http_client()
+        close_clients()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,222 @@
+# Deterministic local stand-ins for Gemini (chat + embeddings), Pinecone and MongoDB, so the
+# FastAPI app can be benchmarked offline. `install()` may run before or after `app` is imported,
+# but before the app starts (lifespan) or serves a request: it swaps the client classes in the
+# libraries and in already imported app modules, reloads the settings and drops the clients the
+# lazy proxies created so far, so they are built again from the stand-ins on next use.
+import asyncio
+import hashlib
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import uuid
+from typing import List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Feature-hashed bag of words: texts sharing words get similar vectors, so retrieval and
+    the semantic caches behave roughly like with a real model. `latency` is per request.
+    """
+
+    def __init__(self, dimensions: int = 768, latency: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in WORD_RE.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            slot = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[slot] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str, **kwargs) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str, **kwargs) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Tool-calling chat model with configurable latency: for a new question it calls
+    `search_documents` with the question, once results are back it answers from them.
+    Any other prompt (e.g. the memory summarizer's) gets a short canned reply.
+    """
+
+    latency: float = 0.5  # seconds per call
+    jitter: float = 0.2  # +/- fraction of latency
+    answer_words: int = 120
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self  # always "knows" the app's tools
+
+    def _delay(self) -> float:
+        return max(self.latency * (1 + random.uniform(-self.jitter, self.jitter)), 0.0)
+
+    def _respond(self, messages) -> AIMessage:
+        question = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+        if question is None or str(question.content).startswith("Progressively summarize"):
+            return AIMessage(content="The user asked about their documents and got answers from them.")
+        tool_results = [m for m in messages if isinstance(m, ToolMessage)]
+        if not tool_results:
+            return AIMessage(content="", tool_calls=[{
+                "name": "search_documents",
+                "args": {"__arg1": str(question.content)},
+                "id": f"call_{uuid.uuid4().hex[:12]}"
+            }])
+        context = " ".join(str(m.content) for m in tool_results)
+        words = (context or "No relevant documents were found.").split()
+        return AIMessage(content=" ".join(words[:self.answer_words]))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+
+def _patch_mongomock_bulk():
+    # pymongo >= 4.11 passes `sort` to bulk update builders, which mongomock does not accept yet
+    from mongomock.collection import BulkOperationBuilder
+    original = BulkOperationBuilder.add_update
+    if getattr(original, "_bench_patched", False):
+        return
+
+    def add_update(self, selector, doc, multi=False, upsert=False, collation=None,
+                   array_filters=None, hint=None, sort=None):
+        return original(self, selector, doc, multi=multi, upsert=upsert, collation=collation,
+                        array_filters=array_filters, hint=hint)
+
+    add_update._bench_patched = True
+    BulkOperationBuilder.add_update = add_update
+
+
+def install(llm_latency: float = 0.5, embed_latency: float = 0.02, mongo_uri: Optional[str] = None,
+            workdir: Optional[str] = None) -> dict:
+    """
+    Point the app at local stand-ins. Without `mongo_uri` MongoDB is mongomock (one in-memory
+    server shared by the async and sync clients); with it, a real (local) MongoDB is used.
+    Returns the fake objects so the caller can inspect them.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="studyai_bench_")
+    os.makedirs(os.path.join(workdir, "spool"), exist_ok=True)
+    env = {
+        "MONGO_URI": mongo_uri or "mongodb://localhost:27017",
+        "MONGO_DB": f"studyai_bench_{uuid.uuid4().hex[:8]}",
+        "GEMINI_API_KEY": "bench",
+        "JWT_SECRET": "bench-secret",
+        "VECTOR_STORE_BACKEND": "local",
+        "VECTOR_STORE_PATH": os.path.join(workdir, "vectors"),
+        "INGEST_SPOOL_DIR": os.path.join(workdir, "spool"),
+        "INGEST_RUN_IN_API": "true",
+        "INGEST_POLL_INTERVAL": "0.1",
+        "INGEST_PARSE_PROCESSES": "0",
+        "EMBEDDING_CACHE_BACKEND": "memory"
+    }
+    os.environ.update(env)
+
+    replacements = {}
+    if mongo_uri is None:
+        import mongomock
+        import mongomock_motor
+        import motor.motor_asyncio
+        import pymongo
+        _patch_mongomock_bulk()
+        server = mongomock.MongoClient()
+        replacements["AsyncIOMotorClient"] = lambda *a, **k: mongomock_motor.AsyncMongoMockClient(mock_mongo_client=server)
+        replacements["MongoClient"] = lambda *a, **k: server
+        motor.motor_asyncio.AsyncIOMotorClient = replacements["AsyncIOMotorClient"]
+        pymongo.MongoClient = replacements["MongoClient"]
+
+    embeddings = FakeEmbeddings(latency=embed_latency)
+    import langchain_google_genai
+    replacements["GoogleGenerativeAIEmbeddings"] = lambda *a, **k: embeddings
+    replacements["ChatGoogleGenerativeAI"] = lambda *a, **k: FakeChatModel(latency=llm_latency)
+    langchain_google_genai.GoogleGenerativeAIEmbeddings = replacements["GoogleGenerativeAIEmbeddings"]
+    langchain_google_genai.ChatGoogleGenerativeAI = replacements["ChatGoogleGenerativeAI"]
+    _repoint_app(replacements)
+    return {"workdir": workdir, "embeddings": embeddings, "env": env}
+
+
+def _repoint_app(replacements: dict):
+    # App modules bind the client classes and read the settings at import
+    config = sys.modules.get("app.config")
+    if config is not None:
+        fresh = type(config.settings)()
+        for name in type(fresh).model_fields:
+            setattr(config.settings, name, getattr(fresh, name))
+    for name, module in list(sys.modules.items()):
+        if module is not None and (name == "app" or name.startswith("app.")):
+            for attr, replacement in replacements.items():
+                if attr in vars(module):
+                    setattr(module, attr, replacement)
+    lazy = sys.modules.get("app.database.lazy")
+    if lazy is not None:
+        for proxy in list(lazy._proxies):
+            proxy.reset()
+
+
+def sample_pdf(path: str, pages: int, seed: int, words_per_page: int = 400) -> str:
+    # Minimal text PDF (Helvetica, one content stream per page) with reproducible content
+    rng = random.Random(seed)
+    vocabulary = SAMPLE_VOCABULARY
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>",
+               f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(pages))}] /Count {pages} >>"]
+    for page in range(pages):
+        text = f"Document {seed} page {page + 1}. " + " ".join(rng.choice(vocabulary) for _ in range(words_per_page))
+        lines = [text[i:i + 90] for i in range(0, len(text), 90)]
+        stream = "".join(f"BT /F1 9 Tf 36 {760 - n * 11} Td ({line}) Tj ET\n" for n, line in enumerate(lines[:65]))
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * page} 0 R "
+                       "/Resources << /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >> >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}endstream")
+    out, offsets = "%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n" + "".join(f"{o:010d} 00000 n \n" for o in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(path, "w", encoding="latin-1") as f:
+        f.write(out)
+    return path
+
+
+SAMPLE_VOCABULARY = (
+    "entropy enthalpy energy temperature pressure volume equilibrium reaction catalyst kinetics "
+    "protein enzyme membrane cell nucleus mitochondria photosynthesis respiration genome mutation "
+    "algorithm complexity graph tree sorting hashing recursion matrix vector eigenvalue gradient "
+    "market demand supply inflation interest policy revenue margin growth capital labour "
+    "theorem proof lemma integral derivative series limit function topology manifold "
+    "the of and to in is for with on as by that this from are be which an"
+).split()
@@ -0,0 +1,278 @@
+# Offline load test: boots the FastAPI app from app/main.py in-process against the local
+# stand-ins in bench/fakes.py (fake Gemini chat model and embeddings, local vector index,
+# mongomock or a local MongoDB) and drives a weighted mix of requests.
+# Run from the server directory:
+#   python -m bench.load_test --duration 30 --concurrency 16 --out results.json [--baseline previous.json]
+#
+# Per endpoint it reports throughput and p50/p95/p99 latency; results are written as JSON so runs
+# can be compared. With --baseline the run is compared to an earlier results file, and with
+# --max-regression the exit status is 1 when p95 latency or throughput regress by more than that.
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from bench import fakes
+
+DEFAULT_MIX = "login=1,upload=1,query=4,documents=3,history=1"
+QUESTIONS = [
+    "What does the document say about {0}?",
+    "Explain the relation between {0} and {1}.",
+    "Summarize the section on {0}.",
+    "How is {0} defined, and where is {1} mentioned?",
+    "List the key points about {0}."
+]
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def percentile(values: list, p: float) -> float:
+    # Nearest-rank percentile of sorted values
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(math.ceil(p / 100 * len(values)) - 1, 0))]
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    latencies = sorted(s[1] for s in samples)
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for _, _, status in samples if status == "error" or status >= 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0
+        },
+        "status": statuses
+    }
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    # Relative change per endpoint: positive latency / negative throughput = slower
+    changes = {}
+    for name, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        change = {}
+        for p in ("p50", "p95", "p99"):
+            old = before["latency_ms"][p]
+            change[f"{p}_change"] = round((now["latency_ms"][p] - old) / old, 4) if old else None
+        old_rps = before["throughput_rps"]
+        change["throughput_change"] = round((now["throughput_rps"] - old_rps) / old_rps, 4) if old_rps else None
+        changes[name] = change
+    return changes
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class LoadTest:
+    def __init__(self, client, args, rng: random.Random):
+        self.client = client
+        self.args = args
+        self.rng = rng
+        self.users = []  # {"email", "password", "token"}
+        self.samples = {}  # endpoint -> [(started, seconds, status)]
+        self.uploads = 0
+
+    async def _request(self, endpoint: str, method: str, url: str, record: bool = True, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status = response.status_code
+        except Exception:
+            response, status = None, "error"
+        if record:
+            self.samples.setdefault(endpoint, []).append((start, time.perf_counter() - start, status))
+        return response
+
+    def _auth(self, user: dict) -> dict:
+        return {"Authorization": f"Bearer {user['token']}"}
+
+    def _pdf(self) -> bytes:
+        # Unique content per upload, so every upload is really ingested (no deduplication)
+        self.uploads += 1
+        path = os.path.join(self.args.workdir, f"upload_{self.uploads}.pdf")
+        fakes.sample_pdf(path, self.args.pages, seed=self.args.seed * 100000 + self.uploads)
+        with open(path, "rb") as f:
+            data = f.read()
+        os.unlink(path)
+        return data
+
+    # --- operations ---
+
+    async def login(self, user: dict):
+        await self._request("POST /auth/login", "POST", "/auth/login",
+                            params={"email": user["email"], "password": user["password"]})
+
+    async def upload(self, user: dict, record: bool = True):
+        await self._request("POST /documents/upload", "POST", "/documents/upload", record=record,
+                            headers=self._auth(user), files={"file": ("bench.pdf", self._pdf(), "application/pdf")})
+
+    async def query(self, user: dict):
+        words = self.rng.sample(fakes.SAMPLE_VOCABULARY[:50], 2)
+        question = self.rng.choice(QUESTIONS).format(*words)
+        await self._request("POST /chat/query", "POST", "/chat/query",
+                            headers=self._auth(user), json={"query": question})
+
+    async def documents(self, user: dict):
+        await self._request("GET /documents/documents", "GET", "/documents/documents",
+                            headers=self._auth(user), params={"limit": 50})
+
+    async def history(self, user: dict):
+        await self._request("GET /chat/all", "GET", "/chat/all", headers=self._auth(user), params={"limit": 50})
+
+    # --- phases ---
+
+    async def setup(self):
+        # Users and their initial documents; not part of the measurement
+        for n in range(self.args.users):
+            user = {"email": f"bench{n}@example.com", "password": f"password-{n}"}
+            response = await self.client.post("/auth/register", params=user)
+            response.raise_for_status()
+            user["token"] = response.json()["access_token"]
+            self.users.append(user)
+        for user in self.users:
+            for _ in range(self.args.docs_per_user):
+                await self.upload(user, record=False)
+        await self.wait_for_ingestion()
+
+    async def wait_for_ingestion(self, timeout: float = 300.0):
+        deadline = time.monotonic() + timeout
+        for user in self.users:
+            while True:
+                response = await self.client.get("/documents/documents", headers=self._auth(user),
+                                                 params={"limit": 200, "fields": "embedding_status"})
+                statuses = [d.get("embedding_status") for d in response.json()["items"]]
+                if all(s in ("complete", "failed") for s in statuses):
+                    break
+                if time.monotonic() > deadline:
+                    raise SystemExit("Timed out waiting for the initial documents to be ingested")
+                await asyncio.sleep(0.2)
+
+    async def virtual_user(self, slot: int, weights: dict, deadline: float):
+        user = self.users[slot % len(self.users)]
+        names, values = list(weights), list(weights.values())
+        while time.perf_counter() < deadline:
+            operation = self.rng.choices(names, values)[0]
+            await getattr(self, operation)(user)
+
+    async def run(self, weights: dict) -> float:
+        start = time.perf_counter()
+        deadline = start + self.args.duration
+        await asyncio.gather(*[self.virtual_user(n, weights, deadline) for n in range(self.args.concurrency)])
+        return time.perf_counter() - start
+
+
+OPERATIONS = ("login", "upload", "query", "documents", "history")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the StudyAI API")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of measured load")
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users sending requests back to back")
+    parser.add_argument("--users", type=int, default=8, help="accounts the virtual users are spread over")
+    parser.add_argument("--docs-per-user", type=int, default=2, help="documents ingested before the run")
+    parser.add_argument("--pages", type=int, default=5, help="pages per generated PDF")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake chat model call")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="seconds per fake embedding request")
+    parser.add_argument("--mongo-uri", default=None, help="use this MongoDB instead of mongomock")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="fail when p95 latency grows or throughput drops by more than this fraction")
+    args = parser.parse_args()
+    weights = parse_mix(args.mix)
+
+    installed = fakes.install(args.llm_latency, args.embed_latency, args.mongo_uri)
+    args.workdir = installed["workdir"]
+    import httpx
+    from app.main import app
+    from app.routes.chat import COMPONENT_STATS
+
+    rng = random.Random(args.seed)
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                test = LoadTest(client, args, rng)
+                await test.setup()
+                elapsed = await test.run(weights)
+                # In-process, so the component stats are read directly (they are not a user endpoint)
+                stats = {component: stats() for component, stats in COMPONENT_STATS.items()}
+    finally:
+        shutil.rmtree(args.workdir, ignore_errors=True)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("workdir", "out", "baseline", "max_regression")}
+    results = {
+        "run": {
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "elapsed_s": round(elapsed, 3),
+            "config": config
+        },
+        "endpoints": {name: summarize(samples, elapsed) for name, samples in sorted(test.samples.items())},
+        "total": summarize([s for samples in test.samples.values() for s in samples], elapsed),
+        "fakes": {"embedding_requests": installed["embeddings"].calls},
+        "app_stats": stats
+    }
+
+    failed = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            results["comparison"] = compare(results, json.load(f))
+        if args.max_regression is not None:
+            for name, change in results["comparison"].items():
+                if (change["p95_change"] or 0) > args.max_regression or (change["throughput_change"] or 0) < -args.max_regression:
+                    failed.append(name)
+            results["regressions"] = failed
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, default=str)
+
+    print(f"{'endpoint':<28}{'req':>7}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in list(results["endpoints"].items()) + [("total", results["total"])]:
+        latency = row["latency_ms"]
+        print(f"{name:<28}{row['requests']:>7}{row['errors']:>6}{row['throughput_rps']:>9}"
+              f"{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}")
+    print(f"Results written to {args.out}")
+    if failed:
+        print(f"Regressions beyond {args.max_regression:.0%}: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
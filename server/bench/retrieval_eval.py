@@ -0,0 +1,69 @@
+# Retrieval quality on a recorded query set: dense-only vs hybrid (dense + BM25, fused).
+# Run from the server directory: `python -m bench.retrieval_eval queries.jsonl [--top-k 10]`
+#
+# One JSON object per line:
+#   {"user_id": "...", "query": "...", "doc_ids": ["..."], "expected": ["text that answers it", ...]}
+# `doc_ids` is optional. A result list is a hit when any chunk contains one of the `expected`
+# snippets (case-insensitive); "first-try hit" means the first search already finds the answer,
+# i.e. the agent does not need another search iteration.
+import argparse
+import asyncio
+import json
+import time
+from app.core.tools import retrieve
+from app.database.mongo import AsyncMongoDB
+
+
+def first_hit_rank(chunks: list, expected: list) -> int:
+    # 1-based rank of the first chunk containing an expected snippet, 0 when none does
+    snippets = [e.lower() for e in expected]
+    for rank, chunk in enumerate(chunks, start=1):
+        text = chunk["text"].lower()
+        if any(s in text for s in snippets):
+            return rank
+    return 0
+
+
+def _report(ranks: list, latencies: list, top_k: int) -> dict:
+    n = len(ranks) or 1
+    latencies = sorted(latencies)
+    return {
+        "queries": len(ranks),
+        f"hit@{top_k}": round(sum(rank > 0 for rank in ranks) / n, 4),
+        "hit@1": round(sum(rank == 1 for rank in ranks) / n, 4),
+        "mrr": round(sum(1 / rank for rank in ranks if rank) / n, 4),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else 0.0
+    }
+
+
+async def evaluate(cases: list, top_k: int) -> dict:
+    # Both modes run per query, in alternating order: whichever runs second finds the query
+    # embedding (and MongoDB/vector store pages) warm, so neither mode gets that advantage throughout
+    modes = {"dense": False, "hybrid": True}
+    ranks = {mode: [] for mode in modes}
+    latencies = {mode: [] for mode in modes}
+    for n, case in enumerate(cases):
+        scope = await AsyncMongoDB.get_search_scope(case["user_id"], case.get("doc_ids"))
+        order = list(modes) if n % 2 == 0 else list(reversed(modes))
+        for mode in order:
+            start = time.perf_counter()
+            chunks = await retrieve(case["query"], scope, top_k=top_k, hybrid=modes[mode])
+            latencies[mode].append(time.perf_counter() - start)
+            ranks[mode].append(first_hit_rank(chunks, case["expected"]))
+    return {mode: _report(ranks[mode], latencies[mode], top_k) for mode in modes}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality of dense-only vs hybrid search on a recorded query set")
+    parser.add_argument("queries", help="JSONL file with recorded queries")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    print(json.dumps(await evaluate(cases, args.top_k), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,11 @@
+# Settings that have no default; tests never reach these services
+import os
+
+for name, value in {
+    "MONGO_URI": "mongodb://localhost:27017",
+    "MONGO_DB": "studyai_test",
+    "GEMINI_API_KEY": "test",
+    "JWT_SECRET": "test-secret",
+    "INGEST_SPOOL_DIR": "/tmp",
+}.items():
+    os.environ.setdefault(name, value)
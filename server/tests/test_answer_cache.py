@@ -0,0 +1,88 @@
+# Semantic answer cache: per-user hits, and sharing between users only for history-free answers
+import asyncio
+import pytest
+from app.core.answer_cache import AnswerCache
+from app.database.mongo import AsyncMongoDB
+from app.routes import chat
+
+mongomock_motor = pytest.importorskip("mongomock_motor")  # pip install -r bench/requirements.txt
+
+# Both users uploaded the same syllabus (same content hash) under their own doc ids
+SCOPES = {
+    "alice": [{"doc_id": "a1", "content_hash": "syllabus"}],
+    "bob": [{"doc_id": "b1", "content_hash": "syllabus"}],
+}
+VECTOR = [1.0, 0.0, 0.0]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    async def get_search_scope(user_id, doc_ids=None):
+        return SCOPES.get(user_id, [])
+
+    monkeypatch.setattr(AsyncMongoDB, "get_search_scope", staticmethod(get_search_scope))
+    return AnswerCache(mongomock_motor.AsyncMongoMockClient().db.answer_cache, threshold=0.95, max_candidates=50)
+
+
+def test_own_answers_are_reused(cache):
+    async def run():
+        await cache.store("bob", None, "what is due?", VECTOR, "essay", [{"tool": "search_documents"}])
+        return await cache.lookup("bob", None, VECTOR)
+    assert asyncio.run(run())["answer"] == "essay"
+
+
+def test_only_history_free_answers_are_shared(cache):
+    async def run():
+        await cache.store("bob", None, "what is due?", VECTOR, "with history", [{}], shareable=False)
+        missed = await cache.lookup("alice", None, VECTOR)
+        await cache.store("bob", None, "what is due?", VECTOR, "fresh", [{}], shareable=True)
+        return missed, await cache.lookup("alice", None, VECTOR)
+    missed, hit = asyncio.run(run())
+    assert missed is None
+    assert hit["answer"] == "fresh"
+    assert cache.shared_hits == 1
+
+
+def test_users_with_different_histories_do_not_share_answers(cache, monkeypatch):
+    # Through the chat route: bob has an earlier conversation, alice has none
+    histories = {"bob": True, "alice": False}
+    runs = []
+
+    class Agent:
+        def __init__(self, user_id):
+            self.user_id = user_id
+
+        async def ainvoke(self, inputs):
+            runs.append(self.user_id)
+            step = (type("Action", (), {"tool": "search_documents", "tool_input": {}})(), "")
+            return {"output": f"answer for {self.user_id}", "intermediate_steps": [step]}
+
+    class Embeddings:
+        async def aembed_query(self, text):
+            return VECTOR
+
+    async def has_chat_history(user_id):
+        return histories[user_id]
+
+    async def serve_cached(body, user_id, hit):
+        pass
+
+    monkeypatch.setattr(chat, "answer_cache", cache)
+    monkeypatch.setattr(chat, "embeddings", Embeddings())
+    monkeypatch.setattr(chat, "create_agent", lambda user_id, doc_ids: Agent(user_id))
+    monkeypatch.setattr(chat, "_serve_cached", serve_cached)
+    monkeypatch.setattr(AsyncMongoDB, "has_chat_history", staticmethod(has_chat_history))
+
+    async def ask(user_id):
+        return (await chat._answer_query(chat.QueryRequest(query="what is due?"), user_id))["response"]
+
+    async def run():
+        return [await ask(user) for user in ("bob", "alice", "bob", "alice")]
+
+    bob, alice, bob_again, alice_again = asyncio.run(run())
+    # bob's answer was generated with his history in the prompt: alice gets her own
+    assert alice["answer"] == "answer for alice" and not alice["cached"]
+    assert alice_again["cached"] and alice_again["answer"] == "answer for alice"
+    # alice's history-free answer may be served to bob
+    assert bob_again["cached"]
+    assert runs == ["bob", "alice"]
@@ -0,0 +1,26 @@
+# Deletion only ever runs against per-user namespaces; unmigrated documents are refused
+import asyncio
+import pytest
+from app.database import mongo
+from app.utils import document
+
+mongomock_motor = pytest.importorskip("mongomock_motor")  # pip install -r bench/requirements.txt
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient().db
+    monkeypatch.setattr(mongo, "db", database)
+    return database
+
+
+def test_unmigrated_document_is_kept(database):
+    async def run():
+        await database.documents.insert_one({"user_id": "u", "doc_id": "d", "content_hash": "h"})
+        result = await document.delete_document_util("d", "u")
+        assert result == {"success": False, "message": document.UNMIGRATED}
+        result = await document.delete_all_documents_util("u")
+        assert result == {"success": False, "message": document.UNMIGRATED}
+        assert await database.documents.count_documents({"user_id": "u"}) == 1
+
+    asyncio.run(run())
@@ -0,0 +1,136 @@
+# URL downloads: redirects are followed by hand and every connection must go to a public address
+import asyncio
+import httpcore
+import httpx
+import pytest
+from app.config import settings
+from app.core.ingestion_queue import PermanentIngestionError
+from app.utils import download
+
+PUBLIC = "http://93.184.216.34"
+
+
+class Stream(httpcore.AsyncNetworkStream):
+    # Answers each request written to it from `routes` (path -> (status, headers))
+    def __init__(self, network, address):
+        self.network, self.address = network, address
+        self.buffer, self.pending = b"", b""
+
+    async def write(self, buffer, timeout=None):
+        self.buffer += buffer
+        while b"\r\n\r\n" in self.buffer:
+            head, self.buffer = self.buffer.split(b"\r\n\r\n", 1)
+            lines = head.decode().split("\r\n")
+            path = lines[0].split()[1]
+            host = next(line.split(":", 1)[1].strip() for line in lines[1:] if line.lower().startswith("host:"))
+            self.network.requests.append((self.address, host, path))
+            status, headers = self.network.routes.get(path, (404, {}))
+            fields = "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+            self.pending += f"HTTP/1.1 {status} X\r\n{fields}Content-Length: 8\r\n\r\n%PDF-1.4".encode()
+
+    async def read(self, max_bytes, timeout=None):
+        data, self.pending = self.pending[:max_bytes], self.pending[max_bytes:]
+        return data
+
+    async def start_tls(self, ssl_context, server_hostname=None, timeout=None):
+        self.network.tls_hostnames.append(server_hostname)
+        return self
+
+    async def aclose(self):
+        pass
+
+
+class Network(httpcore.AsyncNetworkBackend):
+    # Stands in for the sockets below the real download transport
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []  # (address connected to, Host header, path)
+        self.tls_hostnames = []
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        return Stream(self, host)
+
+    async def sleep(self, seconds):
+        pass
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    # Real transport over a fake network; hostnames resolve through `dns` (IP literals to themselves)
+    def install(routes: dict, dns: dict = None):
+        async def resolve(host, port):
+            return (dns or {}).get(host, [host])
+
+        network = Network(routes)
+        monkeypatch.setattr(download, "_resolve", resolve)
+        limits = httpx.Limits(max_connections=5)
+        transport = download._PublicAddressTransport(limits, network_backend=network)
+        monkeypatch.setattr(download, "_client", httpx.AsyncClient(transport=transport))
+        return network
+
+    return install
+
+
+def _open(url):
+    async def run():
+        response = await download._open(url, {})
+        await response.aclose()
+        return response.status_code
+    return asyncio.run(run())
+
+
+def test_follows_redirects_to_public_hosts(serve):
+    network = serve({"/a.pdf": (302, {"location": "/b.pdf"}), "/b.pdf": (200, {})})
+    assert _open(f"{PUBLIC}/a.pdf") == 200
+    assert [path for _, _, path in network.requests] == ["/a.pdf", "/b.pdf"]
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/a.pdf",
+    "http://10.0.0.5/a.pdf",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/a.pdf",
+    "http://[::ffff:127.0.0.1]/a.pdf",
+    "file:///etc/passwd",
+])
+def test_rejects_non_public_targets(serve, url):
+    network = serve({})
+    with pytest.raises(PermanentIngestionError):
+        _open(url)
+    assert network.requests == []
+
+
+def test_rejects_hostnames_resolving_to_internal_addresses(serve):
+    network = serve({}, dns={"metadata.attacker.example": ["169.254.169.254"]})
+    with pytest.raises(PermanentIngestionError, match="non-public"):
+        _open("http://metadata.attacker.example/latest/meta-data")
+    assert network.requests == []
+
+
+def test_connects_to_the_checked_address_keeping_host_and_sni(serve):
+    # The address checked is the one connected to: no second lookup that DNS rebinding could answer
+    network = serve({"/a.pdf": (200, {})}, dns={"docs.example": ["93.184.216.34"]})
+    assert _open("https://docs.example/a.pdf") == 200
+    assert network.requests == [("93.184.216.34", "docs.example", "/a.pdf")]
+    assert network.tls_hostnames == ["docs.example"]
+
+
+def test_rejects_redirects_to_internal_hosts(serve):
+    network = serve({"/a.pdf": (301, {"location": "http://169.254.169.254/latest/meta-data"})})
+    with pytest.raises(PermanentIngestionError, match="non-public"):
+        _open(f"{PUBLIC}/a.pdf")
+    assert [path for _, _, path in network.requests] == ["/a.pdf"]
+
+
+def test_redirect_limit(serve, monkeypatch):
+    monkeypatch.setattr(settings, "DOWNLOAD_MAX_REDIRECTS", 2)
+    network = serve({"/loop.pdf": (307, {"location": "/loop.pdf"})})
+    with pytest.raises(PermanentIngestionError, match="redirects"):
+        _open(f"{PUBLIC}/loop.pdf")
+    assert len(network.requests) == 3
+
+
+def test_private_hosts_can_be_allowed_for_development(serve, monkeypatch):
+    monkeypatch.setattr(settings, "DOWNLOAD_ALLOW_PRIVATE_HOSTS", True)
+    serve({"/a.pdf": (200, {})})
+    assert _open("http://127.0.0.1/a.pdf") == 200
@@ -0,0 +1,29 @@
+# bench.fakes.install() also works when the app was imported first (in a fresh interpreter)
+import os
+import subprocess
+import sys
+import pytest
+
+pytest.importorskip("mongomock_motor")  # pip install -r bench/requirements.txt
+
+SCRIPT = """
+import mongomock
+from app.main import app
+from app.config import settings
+from app.database import mongo, pinecone_utils
+from bench import fakes
+
+installed = fakes.install(llm_latency=0, embed_latency=0)
+assert settings.VECTOR_STORE_BACKEND == "local"
+assert settings.INGEST_SPOOL_DIR == installed["env"]["INGEST_SPOOL_DIR"]
+assert isinstance(mongo.client.resolve(), mongomock.MongoClient)
+assert mongo.sync_db.name == installed["env"]["MONGO_DB"]
+pinecone_utils.embeddings.embed_query("entropy")
+assert installed["embeddings"].calls == 1
+"""
+
+
+def test_install_after_the_app_was_imported():
+    server = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", SCRIPT], cwd=server, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
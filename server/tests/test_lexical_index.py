@@ -0,0 +1,67 @@
+# BM25 keyword index on mongomock: document frequencies kept at index time, capped candidates
+import asyncio
+import pytest
+from app.config import settings
+from app.database.lexical_index import LexicalIndex, tokenize
+
+mongomock = pytest.importorskip("mongomock")  # pip install -r bench/requirements.txt
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def index():
+    from bench.fakes import _patch_mongomock_bulk
+    _patch_mongomock_bulk()
+    server = mongomock.MongoClient()
+    sync_db = server.db
+    db = mongomock_motor.AsyncMongoMockClient(mock_mongo_client=server).db
+    return LexicalIndex(
+        db.lexical_chunks, db.lexical_stats, db.lexical_terms,
+        sync_db.lexical_chunks, sync_db.lexical_stats, sync_db.lexical_terms
+    )
+
+
+def _ingest(index, content_hash, texts):
+    index.add_chunks(content_hash, [(f"{content_hash}-{i}", text, {"page": i}) for i, text in enumerate(texts)])
+    index.finish_content(content_hash, len(texts))
+
+
+def _search(index, hashes, query, top_k=10):
+    return asyncio.run(index.search(hashes, query, top_k=top_k))
+
+
+def test_tokenize_keeps_compounds_and_drops_stopwords():
+    assert tokenize("What is Section 3.2 of the GPT-4 paper?") == ["section", "3.2", "3", "2", "gpt-4", "gpt", "4", "paper"]
+
+
+def test_rare_terms_rank_first(index):
+    _ingest(index, "h1", ["entropy of a gas", "the gas laws", "ideal gas", "gas pressure"])
+    results = _search(index, ["h1"], "entropy gas")
+    assert results[0]["id"] == "h1-0"
+    assert results[0]["metadata"] == {"page": 0}
+    assert len(results) == 4
+
+
+def test_search_is_scoped_to_content_hashes(index):
+    _ingest(index, "h1", ["entropy"])
+    _ingest(index, "h2", ["entropy and enthalpy"])
+    assert [r["id"] for r in _search(index, ["h2"], "entropy")] == ["h2-0"]
+    assert _search(index, ["h3"], "entropy") == []
+
+
+def test_document_frequencies_are_kept_per_content(index):
+    _ingest(index, "h1", ["gas", "gas gas", "entropy"])
+    # A retried ingestion rewrites the counts instead of adding to them
+    index.finish_content("h1", 3)
+    rows = {r["term"]: r["df"] for r in index.sync_terms_collection.find({"content_hash": "h1"})}
+    assert rows == {"gas": 2, "entropy": 1}
+    asyncio.run(index.delete_content("h1"))
+    assert index.sync_terms_collection.count_documents({}) == 0
+
+
+def test_capped_candidates_keep_chunks_with_rare_terms(index, monkeypatch):
+    monkeypatch.setattr(settings, "LEXICAL_MAX_CANDIDATES", 3)
+    _ingest(index, "h1", ["gas"] * 10 + ["entropy gas"])
+    results = _search(index, ["h1"], "gas entropy", top_k=1)
+    assert [r["id"] for r in results] == ["h1-10"]
+
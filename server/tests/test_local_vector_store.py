@@ -0,0 +1,115 @@
+# LocalVectorStore: round trips, filters, log replay across instances and namespace eviction
+import numpy as np
+from app.database.vector_store import LocalVectorStore
+
+
+def _vec(*values):
+    return list(values) + [0.0] * (4 - len(values))
+
+
+def _fill(store):
+    store.upsert([
+        {"id": "a", "values": _vec(1, 0), "metadata": {"content_hash": "h1", "page": 1, "text": "alpha"}},
+        {"id": "b", "values": _vec(0, 1), "metadata": {"content_hash": "h1", "page": 2, "text": "beta"}},
+        {"id": "c", "values": _vec(1, 1), "metadata": {"content_hash": "h2", "page": 3, "text": "gamma"}},
+    ])
+
+
+def test_upsert_query_delete_round_trip(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    _fill(store)
+    matches = store.query(_vec(1, 0), top_k=2)
+    assert [m.id for m in matches] == ["a", "c"]
+    assert matches[0].score == np.float32(1.0)
+    assert matches[0].metadata["text"] == "alpha"
+
+    store.delete(ids=["a"])
+    assert [m.id for m in store.query(_vec(1, 0), top_k=3)] == ["c", "b"]
+    assert store.count() == 2
+    assert set(store.fetch(["a", "b"])) == {"b"}
+
+
+def test_overwrite_reuses_slot_and_updates_metadata(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    _fill(store)
+    store.upsert([{"id": "a", "values": _vec(0, 0, 1), "metadata": {"content_hash": "h3"}}])
+    assert store.count() == 3
+    assert [m.id for m in store.query(_vec(0, 0, 1), top_k=1)] == ["a"]
+    assert [m.id for m in store.query(_vec(1, 0), filter={"content_hash": "h1"})] == ["b"]
+
+
+
+def test_duplicate_ids_in_one_batch_keep_the_last(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([
+        {"id": "a", "values": _vec(1, 0), "metadata": {"content_hash": "h1"}},
+        {"id": "a", "values": _vec(0, 1), "metadata": {"content_hash": "h2"}},
+    ])
+    assert store.count() == 1
+    assert len(store._ids) == 1  # one slot, none left behind for the first copy
+    assert store.fetch(["a"])["a"]["metadata"] == {"content_hash": "h2"}
+    assert [m.id for m in store.query(_vec(1, 0), filter={"content_hash": "h1"})] == []
+    store.delete(ids=["a"])
+    assert store.query(_vec(1, 1), top_k=3) == []
+    assert LocalVectorStore(str(tmp_path)).count() == 0
+
+def test_filters(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    _fill(store)
+
+    def ids(filter):
+        return sorted(m.id for m in store.query(_vec(1, 1), top_k=10, filter=filter))
+
+    assert ids({"content_hash": {"$in": ["h2"]}}) == ["c"]
+    assert ids({"content_hash": {"$ne": "h2"}}) == ["a", "b"]
+    assert ids({"page": {"$gte": 2}}) == ["b", "c"]
+    assert ids({"$or": [{"page": 1}, {"content_hash": "h2"}]}) == ["a", "c"]
+    assert ids({"$and": [{"content_hash": "h1"}, {"page": {"$lt": 2}}]}) == ["a"]
+    store.delete(filter={"content_hash": "h1"})
+    assert ids(None) == ["c"]
+
+
+def test_log_replay_in_a_new_instance(tmp_path):
+    writer = LocalVectorStore(str(tmp_path))
+    _fill(writer)
+    writer.delete(ids=["b"])
+
+    reader = LocalVectorStore(str(tmp_path))
+    assert reader.count() == 2
+    assert [m.id for m in reader.query(_vec(0, 1), top_k=1)] == ["c"]
+
+    # Later writes by one instance are picked up by the other on its next operation
+    writer.upsert([{"id": "d", "values": _vec(0, 0, 0, 1), "metadata": {}}])
+    assert [m.id for m in reader.query(_vec(0, 0, 0, 1), top_k=1)] == ["d"]
+    writer.clear()
+    assert reader.count() == 0
+
+
+def test_namespaces_are_isolated(tmp_path):
+    root = LocalVectorStore(str(tmp_path))
+    root.namespace("user-1").upsert([{"id": "a", "values": _vec(1), "metadata": {}}])
+    assert root.namespace("user-2").count() == 0
+    assert root.count() == 0
+    root.delete_namespace("user-1")
+    assert root.namespace("user-1").count() == 0
+
+
+def test_least_recently_used_namespaces_are_closed(tmp_path):
+    root = LocalVectorStore(str(tmp_path), max_open_namespaces=2)
+    first = root.namespace("user-1")
+    first.upsert([{"id": "a", "values": _vec(1), "metadata": {}}])
+    root.namespace("user-2")
+    root.namespace("user-1")  # most recently used again
+    root.namespace("user-3")
+
+    assert list(root._namespaces) == ["user-1", "user-3"]
+    assert first._lock_file is not None
+
+    evicted = root.namespace("user-2")
+    root.namespace("user-4")
+    assert "user-1" not in root._namespaces
+    assert first._lock_file is None and first._matrix is None
+    # A closed store reopens on use, and the namespace is reopened with its data
+    assert first.count() == 1
+    assert root.namespace("user-1").query(_vec(1), top_k=1)[0].id == "a"
+    assert evicted.count() == 0
@@ -0,0 +1,66 @@
+# Chat memory: turns the token budget leaves out of the window are folded into the summary
+import asyncio
+import json
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, messages_to_dict
+from app.config import settings
+from app.core import memory
+
+mongomock_motor = pytest.importorskip("mongomock_motor")  # pip install -r bench/requirements.txt
+
+
+class Model:
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        return AIMessage(content="summary")
+
+
+def _history(session_id: str, turns: int, words: int) -> list:
+    docs = []
+    for n in range(turns):
+        for message in (HumanMessage(content=f"question {n} " + "word " * words), AIMessage(content=f"answer {n}")):
+            docs.append({"_id": len(docs) + 1, "SessionId": session_id, "History": json.dumps(messages_to_dict([message])[0])})
+    return docs
+
+
+def test_turns_trimmed_by_the_token_budget_are_summarized(monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_TOKEN_BUDGET", 300)
+    database = mongomock_motor.AsyncMongoMockClient().db
+    monkeypatch.setattr(memory, "db", database)
+    summarizer = memory.MemorySummarizer(keep_messages=12, batch_size=20)
+    summarizer._model = Model()
+    monkeypatch.setattr(memory, "memory_summarizer", summarizer)
+
+    async def run():
+        # 4 long turns fit the 6-turn window but not the token budget
+        await database.chat_histories.insert_many(_history("s", turns=4, words=150))
+        history = memory.WindowedChatHistory("s")
+        messages = await history.aget_messages()
+        assert [str(m.content).split()[:2] for m in messages] == [["question", "3"], ["answer", "3"]]
+        await summarizer._tasks["s"]
+
+        summary = await database.chat_summaries.find_one({"_id": "s"})
+        assert summary["covered_until"] == 6  # everything before the kept exchange
+        messages = await history.aget_messages()
+        assert isinstance(messages[0], SystemMessage)
+        assert "s" not in summarizer._tasks  # nothing left out any more
+
+    asyncio.run(run())
+
+
+def test_window_within_the_budget_schedules_nothing(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient().db
+    monkeypatch.setattr(memory, "db", database)
+    summarizer = memory.MemorySummarizer(keep_messages=12, batch_size=20)
+    monkeypatch.setattr(memory, "memory_summarizer", summarizer)
+
+    async def run():
+        await database.chat_histories.insert_many(_history("s", turns=3, words=5))
+        messages = await memory.WindowedChatHistory("s").aget_messages()
+        assert len(messages) == 6
+        assert summarizer._tasks == {}
+
+    asyncio.run(run())
@@ -0,0 +1,91 @@
+# Prometheus exposition of the in-house registry, per process and across worker processes
+import json
+import os
+import subprocess
+import sys
+from app.core.metrics import Registry
+
+
+def _registry():
+    registry = Registry()
+    events = registry.counter("events_total", "Events", ["event"])
+    seconds = registry.histogram("stage_seconds", "Stages", ["stage"], buckets=(0.1, 1.0))
+    return registry, events, seconds
+
+
+def test_render_single_process():
+    registry, events, seconds = _registry()
+    events.inc(2, event="llm_calls")
+    seconds.observe(0.05, stage="agent.run")
+    seconds.observe(0.5, stage="agent.run")
+    registry.register_stats("cache", lambda: {"hits": 3, "enabled": True, "model": "x"})
+    text = registry.render()
+    assert 'studyai_events_total{event="llm_calls"} 2' in text
+    assert 'studyai_stage_seconds_bucket{stage="agent.run",le="0.1"} 1' in text
+    assert 'studyai_stage_seconds_bucket{stage="agent.run",le="+Inf"} 2' in text
+    assert 'studyai_stage_seconds_count{stage="agent.run"} 2' in text
+    assert "studyai_cache_hits 3" in text
+    assert "studyai_cache_enabled 1" in text
+    assert "studyai_cache_model" not in text
+
+
+def _exited_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_multiprocess_sums_workers_and_keeps_exited_counts(tmp_path):
+    registry, events, seconds = _registry()
+    registry.register_stats("cache", lambda: {"hits": 3})
+    registry.enable_multiprocess(str(tmp_path), interval=3600)
+    try:
+        events.inc(2, event="llm_calls")
+        seconds.observe(0.05, stage="agent.run")
+
+        # Snapshots of two other workers: one still running (our parent), one that has exited
+        for pid in (os.getppid(), _exited_pid()):
+            with open(tmp_path / f"metrics-{pid}.json", "w") as f:
+                json.dump({
+                    "pid": pid,
+                    "metrics": {
+                        "studyai_events_total": [[["llm_calls"], 5], [["tool_calls"], 1]],
+                        "studyai_stage_seconds": [[["agent.run"], [0, 1, 0, 0.5, 1]]]
+                    },
+                    "gauges": {"studyai_cache_hits": 10}
+                }, f)
+
+        text = registry.render()
+        assert 'studyai_events_total{event="llm_calls"} 12' in text
+        assert 'studyai_events_total{event="tool_calls"} 2' in text
+        assert 'studyai_stage_seconds_bucket{stage="agent.run",le="0.1"} 1' in text
+        assert 'studyai_stage_seconds_count{stage="agent.run"} 3' in text
+        # Gauges only for live workers, one series each
+        assert f'studyai_cache_hits{{pid="{os.getpid()}"}} 3' in text
+        assert f'studyai_cache_hits{{pid="{os.getppid()}"}} 10' in text
+        assert text.count("studyai_cache_hits{") == 2
+        assert (tmp_path / f"metrics-{os.getpid()}.json").exists()
+    finally:
+        registry.close()
+
+
+def test_route_label_is_the_template_even_when_a_value_equals_a_segment(monkeypatch):
+    from fastapi import APIRouter, FastAPI
+    from fastapi.testclient import TestClient
+    from app.core import metrics
+
+    router = APIRouter()
+
+    @router.get("/document/{doc_id}")
+    def get_document(doc_id: str):
+        return {}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/documents")
+    app.add_middleware(metrics.MetricsMiddleware)
+    routes = []
+    monkeypatch.setattr(metrics.HTTP_SECONDS, "observe", lambda value, **labels: routes.append(labels["route"]))
+    client = TestClient(app)
+    client.get("/documents/document/document")
+    client.get("/documents/missing")
+    assert routes == ["/documents/document/{doc_id}", "unmatched"]
@@ -0,0 +1,42 @@
+# Startup indexes: a changed TTL setting is applied to the existing index instead of failing
+import asyncio
+import pytest
+from pymongo.errors import OperationFailure
+from app.database import mongo
+
+
+class Collection:
+    name = "answer_cache"
+
+    def __init__(self, error=None):
+        self.error = error
+
+    async def create_index(self, field, **options):
+        if self.error:
+            raise self.error
+
+
+class Database:
+    def __init__(self):
+        self.commands = []
+
+    async def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+
+def test_changed_ttl_is_applied_with_collmod(monkeypatch):
+    database = Database()
+    monkeypatch.setattr(mongo, "db", database)
+    conflict = OperationFailure("IndexOptionsConflict", code=85)
+    asyncio.run(mongo._ensure_ttl_index(Collection(conflict), "created_at", 600))
+    assert database.commands == [
+        (("collMod", "answer_cache"), {"index": {"keyPattern": {"created_at": 1}, "expireAfterSeconds": 600}})
+    ]
+
+
+def test_other_index_errors_still_fail_startup(monkeypatch):
+    database = Database()
+    monkeypatch.setattr(mongo, "db", database)
+    with pytest.raises(OperationFailure):
+        asyncio.run(mongo._ensure_ttl_index(Collection(OperationFailure("boom", code=67)), "created_at", 600))
+    assert database.commands == []
@@ -0,0 +1,17 @@
+# Reciprocal rank fusion of dense and keyword rankings
+from app.core.tools import reciprocal_rank_fusion
+
+
+def test_items_in_both_rankings_come_first():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d", "a"]])
+    assert fused[:2] == ["a", "c"]
+    assert set(fused) == {"a", "b", "c", "d"}
+
+
+def test_rank_decides_between_single_list_items():
+    assert reciprocal_rank_fusion([["a", "b"], []]) == ["a", "b"]
+    assert reciprocal_rank_fusion([["x"], ["y"]], k=1) in (["x", "y"], ["y", "x"])
+
+
+def test_empty():
+    assert reciprocal_rank_fusion([]) == []
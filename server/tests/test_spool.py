@@ -0,0 +1,43 @@
+# Startup check of the upload spool: every process must see the same (shared) directory
+import asyncio
+import pytest
+from app.config import settings
+from app.core import spool
+
+mongomock_motor = pytest.importorskip("mongomock_motor")  # pip install -r bench/requirements.txt
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient().db
+    monkeypatch.setattr(spool, "db", database)
+    return database
+
+
+def test_processes_sharing_the_directory_start(monkeypatch, tmp_path, database):
+    monkeypatch.setattr(settings, "INGEST_SPOOL_DIR", str(tmp_path))
+    asyncio.run(spool.check_spool_dir())
+    asyncio.run(spool.check_spool_dir())  # e.g. a worker on another host with the same volume
+    assert (tmp_path / spool.MARKER_FILE).exists()
+
+
+def test_host_local_directory_fails_startup(monkeypatch, tmp_path, database):
+    api_dir, worker_dir = tmp_path / "api", tmp_path / "worker"
+    api_dir.mkdir()
+    worker_dir.mkdir()
+    monkeypatch.setattr(settings, "INGEST_SPOOL_DIR", str(api_dir))
+    asyncio.run(spool.check_spool_dir())
+    monkeypatch.setattr(settings, "INGEST_SPOOL_DIR", str(worker_dir))
+    with pytest.raises(spool.SpoolDirError):
+        asyncio.run(spool.check_spool_dir())
+
+
+def test_missing_directory_fails_startup(monkeypatch, tmp_path, database):
+    monkeypatch.setattr(settings, "INGEST_SPOOL_DIR", str(tmp_path / "missing"))
+    with pytest.raises(spool.SpoolDirError):
+        asyncio.run(spool.check_spool_dir())
+
+
+def test_spooled_files_are_named_relative_to_the_directory(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "INGEST_SPOOL_DIR", str(tmp_path))
+    assert spool.spool_path("../etc/passwd") == str(tmp_path / "passwd")